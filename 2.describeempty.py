@@ -3,12 +3,17 @@ import sys
 import time
 import os
 from pygame.locals import *
+import fonts
+from idle import IdleScheduler
+import scene_loop
 from datetime import datetime
+from regions import RegionMask, region_at, region_rect, save_selection
+import map_files
 
 # ================= 字体配置 =================  
 FONT_PATH = "C:/Windows/Fonts/simhei.ttf"  
 def get_font(size):  
-    return pygame.font.Font(FONT_PATH, size)  
+    return fonts.get_font(FONT_PATH, size)  # 全局字体注册表，文字渲染结果带 LRU 缓存  
 
 # ================= 全局配置 =================  
 
@@ -38,13 +43,7 @@ COLORS = {
     'selected': (169, 169, 169)  # Color for the selected regions
 }  
 
-POINTS = {  
-    'start': (7, 42),  
-    'close 1': (20, 18),  
-    'close 2': (31, 29),  
-    'far 1': (5, 1),  
-    'far 2': (48, 44)  
-}  
+POINTS = map_files.read_source('empty')['points']  # 起点和目标点定义在 map_data/empty.json  
 
 # ================= 游戏核心类 =================  
 class PathGame:
@@ -54,11 +53,13 @@ class PathGame:
         self.clock = pygame.time.Clock()
         self.font = get_font(20)
 
-        self.selected_regions = []  # To store selected regions
+        self.selected_regions = RegionMask()  # Selected regions as a 7x7 bitmask
+        self.idle = IdleScheduler()
+        self.running = True
         self.reset_game()
 
     def reset_game(self):
-        self.selected_regions = []  # Reset the selection
+        self.selected_regions = RegionMask()  # Reset the selection
 
     def convert_coords(self, x, y):
         """坐标转换（逻辑坐标 → 屏幕坐标）"""
@@ -71,11 +72,9 @@ class PathGame:
 
     def draw_selected_regions(self):
         """Draw the selected regions in gray."""
-        for region in self.selected_regions:
-            x, y = region
-            rect_x, rect_y = self.convert_coords(x, y)
-            pygame.draw.rect(self.screen, COLORS['selected'], 
-                             (rect_x, rect_y, REGION_SIZE * CELL_SIZE, REGION_SIZE * CELL_SIZE))
+        for region_x, region_y in self.selected_regions:
+            pygame.draw.rect(self.screen, COLORS['selected'],
+                             region_rect(region_x, region_y, REGION_SIZE * CELL_SIZE, GRID_SIZE * CELL_SIZE))
 
     def draw_control_panel(self):
         panel_x = GRID_SIZE * CELL_SIZE
@@ -107,30 +106,27 @@ class PathGame:
             pygame.draw.circle(self.screen, COLORS[point], 
                                (x * CELL_SIZE + CELL_SIZE // 2, (GRID_SIZE - y) * CELL_SIZE + CELL_SIZE // 2), 5)
 
-    def handle_input(self):
-        for event in pygame.event.get():
+    def hover_state(self):
+        panel_x = GRID_SIZE * CELL_SIZE
+        button_rect = pygame.Rect(panel_x + 50, HEIGHT // 2 - 25, 100, 50)
+        return button_rect.collidepoint(pygame.mouse.get_pos())
+
+    def handle_input(self, events=None):
+        for event in (pygame.event.get() if events is None else events):
             if event.type == QUIT:
-                pygame.quit()
-                sys.exit()
+                self.running = False  # 只结束本阶段，由调用方决定是否退出 pygame
 
             if event.type == MOUSEBUTTONDOWN:
                 x, y = event.pos
                 if x < GRID_SIZE * CELL_SIZE and y < GRID_SIZE * CELL_SIZE:
-                    # Convert to grid coordinates
-                    region_x = x // (REGION_SIZE * CELL_SIZE)
-                    region_y = (GRID_SIZE - y) // (REGION_SIZE * CELL_SIZE)
-
-                    # Toggle the selection of the region
-                    if (region_x, region_y) in self.selected_regions:
-                        self.selected_regions.remove((region_x, region_y))
-                    else:
-                        self.selected_regions.append((region_x, region_y))
+                    # Convert to region coordinates (counted from the bottom) and toggle
+                    region_x, region_y = region_at(x, y, REGION_SIZE * CELL_SIZE, GRID_SIZE * CELL_SIZE)
+                    self.selected_regions.toggle(region_x, region_y)
 
             if event.type == MOUSEBUTTONDOWN and 200 <= event.pos[0] <= 300 and HEIGHT // 2 - 25 <= event.pos[1] <= HEIGHT // 2 + 25:
                 # When clicking on the confirm button, save the selected regions as an image
                 self.save_selected_regions()
-                pygame.quit()  # Exit the game after saving
-                sys.exit()  # Ensure the program exits
+                self.running = False  # Finish this stage after saving
 
     def save_selected_regions(self):
         folder = "selected_regions"  # Folder to save images
@@ -147,7 +143,9 @@ class PathGame:
         # Save the image
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         image_path = os.path.join(folder, f"selected_regions_{timestamp}.png")
+        surface.blit(self.screen, (0, 0), (0, 0, GRID_SIZE * CELL_SIZE, HEIGHT))
         pygame.image.save(surface, image_path)
+        save_selection(os.path.join(folder, f"selected_regions_{timestamp}.json"), self.selected_regions, 'empty', timestamp)
         print(f"保存成功: {image_path}")
 
     def update(self):
@@ -161,21 +159,35 @@ class PathGame:
 
         pygame.display.flip()
 
-    def run(self):
-        while True:
-            self.handle_input()
+    def frame(self):
+        events = self.idle.poll()
+        self.handle_input(events)
+        if self.idle.should_redraw(events, self.hover_state()):
             self.update()
-            self.clock.tick(30)
+
+    def run(self):
+        scene_loop.run(self)
 
 
 # ================= 主程序 =================  
-def main():
+def open_window():
     pygame.init()
     screen = pygame.display.set_mode(SCREEN_SIZE)
     pygame.display.set_caption("区域选择游戏")
+    return screen
 
-    game = PathGame(screen)
-    game.run()
+def run_stage():
+    """在当前窗口中运行区域选择阶段，结束后返回而不退出 pygame"""
+    PathGame(open_window()).run()
+
+async def run_stage_async():
+    """网页版：同一阶段的协作式版本，每帧把控制权交还浏览器"""
+    await scene_loop.run_async(PathGame(open_window()))
+
+def main():
+    run_stage()
+    pygame.quit()
+    sys.exit()
 
 if __name__ == "__main__":
     main()
@@ -4,8 +4,16 @@ import math
 import json  
 import os  # To get the current directory for saving files
 from datetime import datetime  
-import pandas as pd  # Import pandas for DataFrame and Excel functionality
 from pygame.locals import *  
+import fonts  
+from idle import IdleScheduler  
+from archive_writer import get_writer  
+import event_log  
+from trajectory import ARCHIVE_EXTENSIONS, MAP_IDS, image_path, save_sidecar, unique_path  
+from render_cache import shared_layer, DirtyRenderer, PathTracker, PathLayer, circle_rect  
+from frame_timing import FrameTimer  
+import scene_loop  
+import map_files  
 
 # ================= 配置参数 =================  
 FONT_PATH = "C:/Windows/Fonts/simhei.ttf"  
@@ -14,6 +22,10 @@ CELL_SIZE = 15
 PANEL_WIDTH = 200  # 右侧面板宽度  
 WIDTH = GRID_SIZE * CELL_SIZE + PANEL_WIDTH  
 HEIGHT = GRID_SIZE * CELL_SIZE  
+DIRTY_RENDERING = True  # 缓存静态图层，每帧只重绘变化的区域  
+INFO_RECT = (0, 0, 200, 60)  # 左上角转弯次数/暂停提示区域  
+FINISH_SCREEN_MS = 2000  # 完成提示显示时长，按任意键可提前结束  
+TRAJECTORY_MAP_ID = MAP_IDS['empty']  # 二进制轨迹文件头中的地图编号  
 
 COLORS = {  
     'background': (255, 255, 255),  
@@ -30,16 +42,13 @@ COLORS = {
     'far 2': (0, 0, 0)   
 }  
 
-POINTS = {  
-    'start': (7, 42),  
-    'close 1': (20, 18),  
-    'close 2': (31, 29),  
-    'far 1': (5, 1),  
-    'far 2': (48, 44)  
-}  
+# 起点和目标点定义在 map_data/empty.json，与 2.describeempty.py 和 experiment.py 的迷宫阶段共用  
+MAP_NAME = 'empty'  
+MAP_SOURCE = map_files.read_source(MAP_NAME)  
+POINTS = MAP_SOURCE['points']  
 
 def get_font(size):  
-    return pygame.font.Font(FONT_PATH, size)  
+    return fonts.get_font(FONT_PATH, size)  # 全局字体注册表，文字渲染结果带 LRU 缓存  
 
 class PathGame:  
     def __init__(self):  
@@ -48,6 +57,17 @@ class PathGame:
         pygame.display.set_caption("路径迷宫")  
         self.clock = pygame.time.Clock()  
         self.font = get_font(20)  
+        self.dirty_rendering = DIRTY_RENDERING  
+        self.compiled_map = map_files.load(MAP_NAME, CELL_SIZE, COLORS, (WIDTH, HEIGHT), 6)  # 首次运行时编译，之后直接 mmap  
+        self.background = shared_layer('empty.background', (WIDTH, HEIGHT), self.draw_static)  
+        self.renderer = DirtyRenderer(self.screen, self.background)  
+        self.path_tracker = PathTracker()  
+        self.idle = IdleScheduler()  
+        self.archive_writer = get_writer()  
+        self.event_log = event_log.EventLog(writer=self.archive_writer)  # 逐事件高精度日志  
+        self.frame_timer = FrameTimer()  # F3 显示分阶段帧耗时  
+        self.path_layer = PathLayer((WIDTH, HEIGHT), self.convert_coords, COLORS['path'], 2)  
+        self.occupancy = self.compiled_map.occupancy  # 空地图，只用于越界检查  
         self.reset_game()  
 
     def reset_game(self):  
@@ -62,36 +82,53 @@ class PathGame:
         self.game_started = False    
         self.previous_direction = None  
         self.turn_times = []  
+        self.step_times = [0]  # 每一步相对开始的毫秒数，与 path 一一对应  
         self.pause_start = 0  
+        self.last_info = None  
+        self.last_panel = None  
+        self.finish_message = None  
+        self.finish_deadline = 0  
+        self.renderer.invalidate()  
 
     def convert_coords(self, x, y):  
         """坐标转换（逻辑坐标 → 屏幕坐标）"""  
         return (x * CELL_SIZE, (GRID_SIZE - y) * CELL_SIZE)  
 
-    def draw_grid(self):  
+    def draw_grid(self, surface=None):  
         """绘制网格系统"""  
+        surface = surface or self.screen  
         for i in range(GRID_SIZE + 1):  
-            pygame.draw.line(self.screen, COLORS['grid'],  
+            pygame.draw.line(surface, COLORS['grid'],  
                             (i * CELL_SIZE, 0), (i * CELL_SIZE, HEIGHT))  
-            pygame.draw.line(self.screen, COLORS['grid'],  
+            pygame.draw.line(surface, COLORS['grid'],  
                             (0, i * CELL_SIZE), (WIDTH, i * CELL_SIZE))  
 
-    def draw_points(self):  
-        """绘制所有关键点"""  
+    def draw_static(self, surface):  
+        """绘制静态背景图层：网格和关键点，直接贴编译地图里预渲染好的图层"""  
+        surface.blit(self.compiled_map.layer(), (0, 0))  
+
+    def draw_key_points(self, surface=None):  
+        """绘制起点和目标点"""  
+        surface = surface or self.screen  
         for name, (x, y) in POINTS.items():  
             pos = self.convert_coords(x, y)  
             color = COLORS.get(name, (0,0,0))  
-            pygame.draw.circle(self.screen, color, pos, 6)  
-        
-        # 绘制当前位置（红色点）  
-        pygame.draw.circle(self.screen, COLORS['current'],  
-                          self.convert_coords(*self.current_pos), 6)  
+            pygame.draw.circle(surface, color, pos, 6)  
+
+    def draw_current(self):  
+        """绘制当前位置（红色点）"""  
+        return pygame.draw.circle(self.screen, COLORS['current'],  
+                                  self.convert_coords(*self.current_pos), 6)  
+
+    def draw_points(self):  
+        """绘制所有关键点"""  
+        self.draw_key_points()  
+        self.draw_current()  
 
     def draw_path(self):  
-        """绘制玩家路径"""  
-        if len(self.path) > 1:  
-            points = [self.convert_coords(x, y) for x, y in self.path]  
-            pygame.draw.lines(self.screen, COLORS['path'], False, points, 2)  
+        """绘制玩家路径（增量图层，每帧开销与路径长度无关）"""  
+        self.path_layer.sync(self.path)  
+        self.path_layer.draw(self.screen)  
 
     def calculate_angle(self, p1, p2, p3):  
         """计算路径夹角"""  
@@ -103,9 +140,9 @@ class PathGame:
         cos_angle = dot_product / (magnitude_v1 * magnitude_v2)  
         return math.degrees(math.acos(cos_angle))  
 
-    def handle_input(self):  
-        """处理输入事件"""  
-        for event in pygame.event.get():  
+    def handle_input(self, events=None):  
+        """处理输入事件；events 为空时自行从事件队列读取"""  
+        for event in (pygame.event.get() if events is None else events):  
             if event.type == QUIT:  
                 self.running = False  
             
@@ -116,14 +153,18 @@ class PathGame:
                     HEIGHT//2 - 25 < event.pos[1] < HEIGHT//2 + 25):  
                     self.game_started = True  
                     self.start_time = time.time()  
+                    self.event_log.open(event_log.log_path(TRAJECTORY_MAP_ID, os.path.dirname(os.path.abspath(__file__))), TRAJECTORY_MAP_ID)  
+                    self.event_log.record(event_log.START, *self.current_pos)  
 
             if event.type == KEYDOWN:  
                 # 暂停逻辑（仅在游戏开始后生效）  
                 if self.game_started and event.key == K_ESCAPE:  
                     if not self.paused:  
                         self.pause_start = time.time()  
+                        self.event_log.record(event_log.PAUSE, *self.current_pos)  
                     else:  
                         self.start_time += time.time() - self.pause_start  
+                        self.event_log.record(event_log.RESUME, *self.current_pos)  
                     self.paused = not self.paused  
                 
                 # 游戏操作（仅在开始且非暂停状态）  
@@ -132,7 +173,9 @@ class PathGame:
                     if event.key == K_BACKSPACE:  
                         if len(self.path) > 1:  
                             self.path.pop()  
+                            self.step_times.pop()  
                             self.current_pos = list(self.path[-1])  
+                            self.event_log.record(event_log.UNDO, *self.current_pos)  
                     
                     # 移动控制  
                     dx, dy = 0, 0  
@@ -147,10 +190,9 @@ class PathGame:
                     new_y = self.current_pos[1] + dy  
                     
                     # 移动验证  
-                    if not (0 <= new_x <= GRID_SIZE and 0 <= new_y <= GRID_SIZE):  
-                        return  
                     # 移除之前的检查，允许重复走过的路径
-                    if abs(new_x - self.current_pos[0]) + abs(new_y - self.current_pos[1]) != 1:  
+                    if not self.occupancy.is_valid_move(self.current_pos, (new_x, new_y)):  
+                        self.event_log.record(event_log.REJECT, new_x, new_y)  # 记录被拒绝的目标格  
                         return  
                     
                     # 转弯检测  
@@ -164,6 +206,8 @@ class PathGame:
                     # 更新状态  
                     self.current_pos = [new_x, new_y]  
                     self.path.append(tuple(self.current_pos))  
+                    self.step_times.append(int((time.time() - self.start_time) * 1000))  
+                    self.event_log.record(event_log.MOVE, *self.current_pos)  
                     self.previous_direction = (dx, dy)  
 
     def check_finish(self):  
@@ -186,7 +230,8 @@ class PathGame:
                 "steps": len(self.path) - 1,  
                 "turns": self.turn_count  
             },  
-            "path": self.path,  
+            "path": list(self.path),  
+            "step_times": list(self.step_times),  
             "turn_events": [{"turn": t[0], "time": t[1]} for t in self.turn_times]  
         }  
 
@@ -195,7 +240,8 @@ class PathGame:
         # 获取当前脚本目录路径
         current_directory = os.path.dirname(os.path.abspath(__file__))
         
-        # 使用pandas保存为Excel文件
+        # 使用pandas保存为Excel文件（只在保存时才需要，延迟导入以加快启动）
+        import pandas as pd
         df_path = pd.DataFrame(archive_data["path"], columns=["x", "y"])  
         df_turns = pd.DataFrame(archive_data["turn_events"])  
 
@@ -208,16 +254,20 @@ class PathGame:
         df_summary = pd.DataFrame(summary_data)
 
         # Save to Excel in the current directory
-        excel_filename = os.path.join(current_directory, f"archive_{archive_data['meta']['timestamp']}.xlsx")
+        excel_filename = unique_path(os.path.join(current_directory, f"archive_{archive_data['meta']['timestamp']}.xlsx"), ARCHIVE_EXTENSIONS)
         with pd.ExcelWriter(excel_filename) as writer:
             df_summary.to_excel(writer, sheet_name="Summary", index=False)
             df_path.to_excel(writer, sheet_name="Path", index=False)
             df_turns.to_excel(writer, sheet_name="Turns", index=False)  
 
-        # 生成路径图片  
-        self.save_path_image(archive_data['meta']['timestamp'])  
+        # 紧凑的二进制轨迹（逐步毫秒时间），批量分析时用 trajectory.open_trajectory 读取  
+        save_sidecar(excel_filename, archive_data["path"], archive_data["step_times"], TRAJECTORY_MAP_ID, archive_data["path"][-1])  
+        self.event_log.link(excel_filename)  # 事件日志文件头记下所属存档  
 
-    def save_path_image(self, timestamp):  
+        # 生成路径图片（与存档同名主干）  
+        self.save_path_image(image_path(excel_filename))  
+
+    def save_path_image(self, path_image_filename):  
         """生成带标记的路径图"""  
         surface = pygame.Surface((WIDTH, HEIGHT))  
         surface.fill(COLORS['background'])  
@@ -246,7 +296,6 @@ class PathGame:
                     pygame.draw.circle(surface, color, points[idx], 6)  # 黄色，蓝色，红色标记30%，50%，70%位置
         
         # 保存图片  
-        path_image_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"path_{timestamp}.png")
         pygame.image.save(surface, path_image_filename)
 
 
@@ -280,46 +329,131 @@ class PathGame:
         btn_text = self.font.render("开始游戏" if not self.game_started else "进行中", True, (255,255,255))  
         self.screen.blit(btn_text, (panel_x + 65, HEIGHT//2 - 10))  
 
-    def run(self):  
-        """主游戏循环"""  
-        while self.running:  
-            self.screen.fill(COLORS['background'])  
-            self.handle_input()  
+    def info_texts(self):  
+        """转弯次数和暂停状态"""  
+        if not self.game_started:  
+            return []  
+        return [  
+            f"转弯次数: {self.turn_count}",  
+            "暂停中" if self.paused else ""  
+        ]  
 
-            # 绘制游戏地图  
-            self.draw_grid()  
-            self.draw_points()  
-            self.draw_path()  
+    def draw_info(self):  
+        for i, text in enumerate(self.info_texts()):  
+            if text:  
+                text_surface = self.font.render(text, True, (0,0,0))  
+                self.screen.blit(text_surface, (10, 10 + i*25))  
 
-            # 绘制右侧控制面板  
-            self.draw_control_panel()  
+    def render_full(self):  
+        """整屏重绘"""  
+        self.screen.fill(COLORS['background'])  
 
-            # 显示转弯次数和暂停状态  
-            if self.game_started:  
-                info_texts = [  
-                    f"转弯次数: {self.turn_count}",  
-                    "暂停中" if self.paused else ""  
-                ]  
-                for i, text in enumerate(info_texts):  
-                    if text:  
-                        text_surface = self.font.render(text, True, (0,0,0))  
-                        self.screen.blit(text_surface, (10, 10 + i*25))  
-
-            # 完成检测  
-            if self.game_started and not self.paused and self.check_finish():  
-                finish_text = self.font.render("任务完成！", True, (0,0,255))  
-                self.screen.blit(finish_text, (WIDTH//2-50, HEIGHT//2))  
-                
-                archive_data = self.generate_archive()  
-                self.save_archive(archive_data)  
-                pygame.time.wait(2000)  
-                self.running = False  
+        # 绘制游戏地图  
+        self.draw_grid()  
+        self.draw_points()  
+        self.draw_path()  
+
+        # 绘制右侧控制面板  
+        self.draw_control_panel()  
 
+        # 显示转弯次数和暂停状态  
+        self.draw_info()  
+
+    def render_dirty(self):  
+        """脏矩形模式：背景取自缓存图层，只重绘光标、路径末段、文字和面板中变化的部分"""  
+        renderer = self.renderer  
+        info = self.info_texts()  
+        panel_x = GRID_SIZE * CELL_SIZE  
+        panel = self.panel_state()  
+
+        changed = self.path_tracker.changes(self.path)  
+        if renderer.full_redraw or changed is None:  
+            renderer.invalidate()  
+            renderer.reset()  
+            self.draw_path()  
+            self.draw_control_panel()  
+            self.draw_info()  
+        else:  
+            if changed:  
+                area = circle_rect(self.convert_coords(*changed[0]), 6)  
+                for point in changed[1:]:  
+                    area.union_ip(circle_rect(self.convert_coords(*point), 6))  
+                renderer.restore(area, self.draw_path)  
+            if info != self.last_info:  
+                renderer.restore(INFO_RECT, self.draw_path)  
+                self.draw_info()  
+            if panel != self.last_panel:  
+                self.draw_control_panel()  
+                renderer.mark((panel_x, 0, PANEL_WIDTH, HEIGHT))  
+        renderer.mark(self.draw_current())  
+        self.last_info = info  
+        self.last_panel = panel  
+
+    def panel_state(self):  
+        """面板上会变化的状态：按钮悬停、是否已开始"""  
+        panel_x = GRID_SIZE * CELL_SIZE  
+        button_rect = pygame.Rect(panel_x + 50, HEIGHT//2 - 25, 100, 50)  
+        return (button_rect.collidepoint(pygame.mouse.get_pos()), self.game_started)  
+
+    def frame(self):  
+        """一帧：取事件、更新、绘制；限帧和让出控制权由 scene_loop 负责"""  
+        events = self.idle.poll()  
+        if self.frame_timer.handle(self, events):  
+            self.renderer.invalidate()  # 叠加层显示/隐藏后整屏重绘一次  
+        self.handle_input(events)  
+        if not self.idle.should_redraw(events, self.panel_state()):  
+            return  
+        if self.dirty_rendering:  
+            self.render_dirty()  
+        else:  
+            self.render_full()  
+
+        # 完成检测  
+        if self.finish_message and (pygame.time.get_ticks() >= self.finish_deadline or  
+                                    any(e.type in (KEYDOWN, MOUSEBUTTONDOWN) for e in events)):  
+            self.running = False  
+        if not self.finish_message and self.game_started and not self.paused and self.check_finish():  
+            # 存档和路径图交给后台线程写入，完成提示期间主循环照常运行  
+            self.finish_message = "任务完成！"  
+            self.finish_deadline = pygame.time.get_ticks() + FINISH_SCREEN_MS  
+            self.archive_writer.submit(self.save_archive, self.generate_archive())  
+            self.event_log.record(event_log.FINISH, *self.current_pos)  
+            self.event_log.close()  
+        if self.finish_message:  
+            finish_text = self.font.render(self.finish_message, True, (0,0,255))  
+            self.renderer.mark(self.screen.blit(finish_text, (WIDTH//2-50, HEIGHT//2)))  
+            self.idle.request_redraw()  # 空闲模式下也要按时结束完成提示  
+
+        if self.frame_timer.overlay:  
+            self.renderer.mark(self.frame_timer.draw(self.screen))  
+            self.idle.request_redraw()  
+        self.present()  
+
+    def present(self):  
+        """把本帧送上屏幕：脏矩形模式只更新变化的区域"""  
+        if self.dirty_rendering:  
+            self.renderer.present()  
+        else:  
             pygame.display.flip()  
-            self.clock.tick(30)  
-            
-        pygame.quit()  
+
+    def close(self):  
+        self.event_log.close()  # 中途退出时也写出缓冲区里剩余的事件  
+        self.frame_timer.close()  # 恢复被计时包装的方法，有样本时写出 CSV  
+
+    def run(self):  
+        """主游戏循环"""  
+        scene_loop.run(self)  
+
+def run_stage():  
+    """在当前窗口中运行本阶段，结束后返回而不退出 pygame"""  
+    PathGame().run()  
+
+async def run_stage_async():  
+    """网页版：同一阶段的协作式版本，每帧把控制权交还浏览器"""  
+    await scene_loop.run_async(PathGame())  
 
 if __name__ == "__main__":  
     game = PathGame()  
-    game.run()
+    game.run()  
+    game.archive_writer.flush()  # 确保存档写完再退出 pygame  
+    pygame.quit()
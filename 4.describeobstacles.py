@@ -4,12 +4,16 @@ from datetime import datetime
 
 import pygame  
 from pygame.locals import *  
+import fonts  
+from idle import IdleScheduler  
+import scene_loop  
+from regions import RegionMask, region_at, region_rect, save_selection  
 
 
 # ================= 字体配置 =================  
 FONT_PATH = "C:/Windows/Fonts/simhei.ttf"  
 def get_font(size):  
-    return pygame.font.Font(FONT_PATH, size)  
+    return fonts.get_font(FONT_PATH, size)  # 全局字体注册表，文字渲染结果带 LRU 缓存  
 
 # ================= 全局配置 =================  
 GRID_SIZE = 49  
@@ -34,11 +38,13 @@ class PathGame:
         self.clock = pygame.time.Clock()  
         self.font = get_font(20)  
 
-        self.selected_regions = []  # 存储选中的区域  
+        self.selected_regions = RegionMask()  # 选中的区域，7x7 位掩码  
+        self.idle = IdleScheduler()  
+        self.running = True  
         self.reset_game()  
 
     def reset_game(self):  
-        self.selected_regions = []  # 重置选中区域  
+        self.selected_regions = RegionMask()  # 重置选中区域  
 
     def draw_grid(self):  
         """绘制基础网格和7x7分区边框"""  
@@ -57,12 +63,9 @@ class PathGame:
 
     def draw_selected_regions(self):  
         """绘制选中的区域"""  
-        for region in self.selected_regions:  
-            x, y = region  
-            rect_x = x * 7 * CELL_SIZE  
-            rect_y = (GRID_SIZE - y - 1) * 7 * CELL_SIZE  # Y轴反转  
-            pygame.draw.rect(self.screen, COLORS['highlight'],   
-                            (rect_x, rect_y, 7 * CELL_SIZE, 7 * CELL_SIZE))  
+        for region_x, region_y in self.selected_regions:  
+            pygame.draw.rect(self.screen, COLORS['highlight'],  
+                            region_rect(region_x, region_y, 7 * CELL_SIZE, GRID_SIZE * CELL_SIZE))  # Y轴反转  
 
     def draw_control_panel(self):  
         """绘制右侧控制面板"""  
@@ -90,24 +93,22 @@ class PathGame:
         btn_text = self.font.render("确认", True, (255, 255, 255))  
         self.screen.blit(btn_text, (panel_x + 65, HEIGHT // 2 - 10))  
 
-    def handle_input(self):  
-        for event in pygame.event.get():  
+    def hover_state(self):  
+        panel_x = GRID_SIZE * CELL_SIZE  
+        button_rect = pygame.Rect(panel_x + 50, HEIGHT // 2 - 25, 100, 50)  
+        return button_rect.collidepoint(pygame.mouse.get_pos())  
+
+    def handle_input(self, events=None):  
+        for event in (pygame.event.get() if events is None else events):  
             if event.type == QUIT:  
-                pygame.quit()  
-                sys.exit()  
+                self.running = False  # 只结束本阶段，由调用方决定是否退出 pygame  
 
             if event.type == MOUSEBUTTONDOWN:  
                 x, y = event.pos  
                 if x < GRID_SIZE * CELL_SIZE and y < GRID_SIZE * CELL_SIZE:  
-                    # 计算点击的区域坐标  
-                    region_x = x // (7 * CELL_SIZE)  
-                    region_y = (GRID_SIZE * CELL_SIZE - y) // (7 * CELL_SIZE)  
-
-                    # 切换选中状态  
-                    if (region_x, region_y) in self.selected_regions:  
-                        self.selected_regions.remove((region_x, region_y))  
-                    else:  
-                        self.selected_regions.append((region_x, region_y))  
+                    # 计算点击的区域坐标（从下往上数）并切换选中状态  
+                    region_x, region_y = region_at(x, y, 7 * CELL_SIZE, GRID_SIZE * CELL_SIZE)  
+                    self.selected_regions.toggle(region_x, region_y)  
 
                 # 检查是否点击了确认按钮  
                 panel_x = GRID_SIZE * CELL_SIZE  
@@ -129,7 +130,9 @@ class PathGame:
         # 保存图片  
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")  
         image_path = os.path.join(folder, f"selected_regions_{timestamp}.png")  
+        surface.blit(self.screen, (0, 0), (0, 0, GRID_SIZE * CELL_SIZE, HEIGHT))  
         pygame.image.save(surface, image_path)  
+        save_selection(os.path.join(folder, f"selected_regions_{timestamp}.json"), self.selected_regions, 'obstacles', timestamp)  
         print(f"保存成功: {image_path}")  
 
     def update(self):  
@@ -142,21 +145,35 @@ class PathGame:
 
         pygame.display.flip()  
 
-    def run(self):  
-        while True:  
-            self.handle_input()  
+    def frame(self):  
+        events = self.idle.poll()  
+        self.handle_input(events)  
+        if self.idle.should_redraw(events, self.hover_state()):  
             self.update()  
-            self.clock.tick(30)  
+
+    def run(self):  
+        scene_loop.run(self)  
 
 
 # ================= 主程序 =================  
-def main():  
+def open_window():  
     pygame.init()  
     screen = pygame.display.set_mode((WIDTH, HEIGHT))  
     pygame.display.set_caption("区域选择游戏")  
+    return screen  
+
+def run_stage():  
+    """在当前窗口中运行区域选择阶段，结束后返回而不退出 pygame"""  
+    PathGame(open_window()).run()  
 
-    game = PathGame(screen)  
-    game.run()  
+async def run_stage_async():  
+    """网页版：同一阶段的协作式版本，每帧把控制权交还浏览器"""  
+    await scene_loop.run_async(PathGame(open_window()))  
+
+def main():  
+    run_stage()  
+    pygame.quit()  
+    sys.exit()  
 
 if __name__ == "__main__":  
     main()  
\ No newline at end of file
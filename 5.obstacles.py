@@ -4,8 +4,16 @@ import math
 import json  
 import os  # To get the current directory for saving files
 from datetime import datetime  
-import pandas as pd  # Import pandas for DataFrame and Excel functionality
 from pygame.locals import *  
+import fonts  
+from idle import IdleScheduler  
+from archive_writer import get_writer  
+import event_log  
+from trajectory import ARCHIVE_EXTENSIONS, MAP_IDS, image_path, save_sidecar, unique_path  
+from render_cache import shared_layer, DirtyRenderer, PathTracker, PathLayer, circle_rect  
+from frame_timing import FrameTimer  
+import scene_loop  
+import map_files  
 
 # ================= 配置参数 =================  
 FONT_PATH = "C:/Windows/Fonts/simhei.ttf"  
@@ -14,6 +22,10 @@ CELL_SIZE = 15
 PANEL_WIDTH = 200  # 右侧面板宽度  
 WIDTH = GRID_SIZE * CELL_SIZE + PANEL_WIDTH  
 HEIGHT = GRID_SIZE * CELL_SIZE  
+DIRTY_RENDERING = True  # 缓存静态图层，每帧只重绘变化的区域  
+INFO_RECT = (0, 0, 200, 60)  # 左上角转弯次数/暂停提示区域  
+FINISH_SCREEN_MS = 2000  # 完成提示显示时长，按任意键可提前结束  
+TRAJECTORY_MAP_ID = MAP_IDS['obstacles']  # 二进制轨迹文件头中的地图编号  
 
 COLORS = {  
     'background': (255, 255, 255),  
@@ -29,59 +41,15 @@ COLORS = {
     'current': (255, 0, 0)  
 }  
 
-POINTS = {  
-    'start': (7, 42),  
-    'close1': (20, 18),  
-    'close2': (31, 29),  
-    'far1': (5, 1),  
-    'far2': (48, 44)  
-}  
-
-# 障碍物定义
-ORIGINAL_OBSTACLES = [  
-    (9, 9, 8, 1),    
-    (8, 8, 12, 1),    
-    (10, 10, 6, 1),  
-    (11, 7, 4, 1),  
-    (14, 25, 6, 1),   
-    (13, 24, 5, 1),  
-    (15, 26, 3, 1),  
-    (10, 23, 7, 1),   
-    (24, 15, 5, 1),   
-    (27, 14, 2, 1),  
-    (23, 16, 6, 1),  
-    (3, 31, 6, 1),  
-    (4, 32, 4, 1),  
-    (5, 30, 3, 1),  
-    (44, 9, 5, 1),  
-    (43, 10, 3, 1),  
-    (45, 8, 4, 1),  
-]  
-
-MIRRORED_OBSTACLES = [  
-    (39, 32, 1, 8),    
-    (40, 29, 1, 12),    
-    (38, 33, 1, 6),    
-    (41, 34, 1, 4),  
-    (23, 29, 1, 6),   
-    (24, 31, 1, 5),  
-    (22, 31, 1, 3),  
-    (25, 32, 1, 7),  
-    (33, 20, 1, 5),   
-    (34, 20, 1, 2),  
-    (32, 20, 1, 6),  
-    (17, 40, 1, 6),  
-    (16, 41, 1, 4),  
-    (18, 41, 1, 3),  
-    (39, 0, 1, 5),    
-    (38, 3, 1, 3),    
-    (40, 0, 1, 4),  
-]  
-
-ALL_OBSTACLES = ORIGINAL_OBSTACLES + MIRRORED_OBSTACLES  
+# 关键点和障碍物定义在 map_data/obstacles.json，与 experiment.py 的第四、五阶段共用  
+MAP_NAME = 'obstacles'  
+MAP_SOURCE = map_files.read_source(MAP_NAME)  
+POINTS = MAP_SOURCE['points']  
+ALL_OBSTACLES = MAP_SOURCE['obstacles']  
+BLOCK_OBSTACLES = False  # True 时禁止走进障碍物；默认沿用原实验设置，允许穿过  
 
 def get_font(size):  
-    return pygame.font.Font(FONT_PATH, size)    
+    return fonts.get_font(FONT_PATH, size)  # 全局字体注册表，文字渲染结果带 LRU 缓存    
 
 class PathGame:  
     def __init__(self):  
@@ -90,6 +58,17 @@ class PathGame:
         pygame.display.set_caption("迷宫路径-完整障碍物版")  
         self.clock = pygame.time.Clock()  
         self.font = get_font(20)  
+        self.dirty_rendering = DIRTY_RENDERING  
+        self.compiled_map = map_files.load(MAP_NAME, CELL_SIZE, COLORS, (WIDTH, HEIGHT), 8)  # 首次运行时编译，之后直接 mmap  
+        self.background = shared_layer('obstacles.background', (WIDTH, HEIGHT), self.draw_static)  
+        self.renderer = DirtyRenderer(self.screen, self.background)  
+        self.path_tracker = PathTracker()  
+        self.idle = IdleScheduler()  
+        self.archive_writer = get_writer()  
+        self.event_log = event_log.EventLog(writer=self.archive_writer)  # 逐事件高精度日志  
+        self.frame_timer = FrameTimer()  # F3 显示分阶段帧耗时  
+        self.path_layer = PathLayer((WIDTH, HEIGHT), self.convert_coords, (0,0,0), 3)  
+        self.occupancy = self.compiled_map.occupancy  
         self.reset_game()  
 
     def reset_game(self):  
@@ -104,62 +83,70 @@ class PathGame:
         self.game_started = False  
         self.previous_direction = None  
         self.turn_times = []  
+        self.step_times = [0]  # 每一步相对开始的毫秒数，与 path 一一对应  
         self.pause_start = 0  
+        self.last_info = None  
+        self.last_panel = None  
+        self.finish_message = None  
+        self.finish_deadline = 0  
+        self.renderer.invalidate()  
 
     def convert_coords(self, x, y):  
         return (x * CELL_SIZE, (GRID_SIZE - y) * CELL_SIZE)  
 
-    def draw_grid(self):  
+    def draw_grid(self, surface=None):  
+        surface = surface or self.screen  
         for i in range(GRID_SIZE + 1):  
-            pygame.draw.line(self.screen, COLORS['grid'],  
+            pygame.draw.line(surface, COLORS['grid'],  
                              (i * CELL_SIZE, 0), (i * CELL_SIZE, HEIGHT))  
-            pygame.draw.line(self.screen, COLORS['grid'],  
+            pygame.draw.line(surface, COLORS['grid'],  
                              (0, i * CELL_SIZE), (WIDTH, i * CELL_SIZE))  
 
-    def draw_obstacles(self):  
-        for obstacle in ALL_OBSTACLES:  
+    def draw_obstacles(self, surface=None):  
+        surface = surface or self.screen  
+        for obstacle in self.compiled_map.rectangles:  # 合并后的障碍物矩形  
             ox, oy, ow, oh = obstacle  
             screen_x = ox * CELL_SIZE  
             screen_y = (GRID_SIZE - oy - oh) * CELL_SIZE  
             width = ow * CELL_SIZE  
             height = oh * CELL_SIZE  
-            pygame.draw.rect(self.screen, COLORS['obstacle'],   
+            pygame.draw.rect(surface, COLORS['obstacle'],   
                              (screen_x, screen_y, width, height))  
 
-    def draw_points(self):  
-        self.draw_obstacles()  
-        
+    def draw_static(self, surface):  
+        """静态背景图层：网格、障碍物和关键点，直接贴编译地图里预渲染好的图层"""  
+        surface.blit(self.compiled_map.layer(), (0, 0))  
+
+    def draw_key_points(self, surface=None):  
+        surface = surface or self.screen  
         for name, (x, y) in POINTS.items():  
             pos = self.convert_coords(x, y)  
             color = COLORS.get(name, (0,0,0))  
-            pygame.draw.circle(self.screen, color, pos, 8)  
-            
-        pygame.draw.circle(self.screen, COLORS['current'],  
-                           self.convert_coords(*self.current_pos), 8)  
+            pygame.draw.circle(surface, color, pos, 8)  
+
+    def draw_current(self):  
+        return pygame.draw.circle(self.screen, COLORS['current'],  
+                                  self.convert_coords(*self.current_pos), 8)  
+
+    def draw_points(self):  
+        self.draw_obstacles()  
+        self.draw_key_points()  
+        self.draw_current()  
 
     def draw_path(self):  
-        if len(self.path) > 1:  
-            points = [self.convert_coords(x, y) for x, y in self.path]  
-            pygame.draw.lines(self.screen, (0,0,0), False, points, 3)  
+        self.path_layer.sync(self.path)  
+        self.path_layer.draw(self.screen)  
 
     def is_in_obstacle(self, x, y):  
-        """允许穿过障碍物"""  
-        return False  # Always return False to allow movement through obstacles.
+        """允许穿过障碍物；BLOCK_OBSTACLES 为 True 时才查询占用网格"""  
+        return BLOCK_OBSTACLES and self.occupancy.is_obstructed(x, y)  
 
     def is_valid_move(self, new_x, new_y):  
-        # Check bounds
-        if not (0 <= new_x < GRID_SIZE and 0 <= new_y < GRID_SIZE):  
-            return False  
-
-        # Path can move freely through obstacles now.
-        # We don't block the movement based on whether it's a visited path or obstacle.
-
-        # Must move to an adjacent cell
-        if abs(new_x - self.current_pos[0]) + abs(new_y - self.current_pos[1]) != 1:  
-            return False  
-
-        # If none of the above conditions block us, it's valid
-        return True  
+        # Must move to an adjacent cell inside the grid.
+        # Obstacles only block the move when BLOCK_OBSTACLES is enabled (see is_in_obstacle);
+        # by default the path can move freely through them.
+        return (self.occupancy.is_valid_move(self.current_pos, (new_x, new_y), block_obstacles=False)  
+                and not self.is_in_obstacle(new_x, new_y))  
 
     def calculate_angle(self, p1, p2, p3):  
         v1 = (p1[0] - p2[0], p1[1] - p2[1])  
@@ -170,8 +157,8 @@ class PathGame:
         cos_angle = dot_product / (magnitude_v1 * magnitude_v2)  
         return math.degrees(math.acos(cos_angle))  
 
-    def handle_input(self):  
-        for event in pygame.event.get():  
+    def handle_input(self, events=None):  
+        for event in (pygame.event.get() if events is None else events):  
             if event.type == QUIT:  
                 self.running = False  
             
@@ -181,20 +168,26 @@ class PathGame:
                     HEIGHT//2 - 25 < event.pos[1] < HEIGHT//2 + 25):  
                     self.game_started = True  
                     self.start_time = time.time()  
+                    self.event_log.open(event_log.log_path(TRAJECTORY_MAP_ID), TRAJECTORY_MAP_ID)  
+                    self.event_log.record(event_log.START, *self.current_pos)  
 
             if event.type == KEYDOWN:  
                 if self.game_started and event.key == K_ESCAPE:  
                     if not self.paused:  
                         self.pause_start = time.time()  
+                        self.event_log.record(event_log.PAUSE, *self.current_pos)  
                     else:  
                         self.start_time += time.time() - self.pause_start  
+                        self.event_log.record(event_log.RESUME, *self.current_pos)  
                     self.paused = not self.paused  
                 
                 if self.game_started and not self.paused and not self.finished:  
                     if event.key == K_BACKSPACE:  
                         if len(self.path) > 1:  
                             self.path.pop()  
+                            self.step_times.pop()  
                             self.current_pos = list(self.path[-1])  
+                            self.event_log.record(event_log.UNDO, *self.current_pos)  
                     
                     dx, dy = 0, 0  
                     if event.key == K_UP: dy = 1  
@@ -207,6 +200,7 @@ class PathGame:
                     new_y = self.current_pos[1] + dy  
 
                     if not self.is_valid_move(new_x, new_y):  
+                        self.event_log.record(event_log.REJECT, new_x, new_y)  # 记录被拒绝的目标格  
                         return  
 
                     if len(self.path) > 1:  
@@ -218,6 +212,8 @@ class PathGame:
 
                     self.current_pos = [new_x, new_y]  
                     self.path.append(tuple(self.current_pos))  
+                    self.step_times.append(int((time.time() - self.start_time) * 1000))  
+                    self.event_log.record(event_log.MOVE, *self.current_pos)  
                     self.previous_direction = (dx, dy)  
 
     def check_finish(self):  
@@ -236,17 +232,21 @@ class PathGame:
                 "steps": len(self.path) - 1,  
                 "turns": self.turn_count  
             },  
-            "path": self.path,  
+            "path": list(self.path),  
+            "step_times": list(self.step_times),  
             "turn_events": [{"turn": t[0], "time": t[1]} for t in self.turn_times]  
         }  
 
     def save_archive(self, archive_data):  
-        filename = f"archive_{archive_data['meta']['timestamp']}.json"  
+        filename = unique_path(f"archive_{archive_data['meta']['timestamp']}.json", ARCHIVE_EXTENSIONS)  
         with open(filename, "w", encoding='utf-8') as f:  
             json.dump(archive_data, f, indent=4, ensure_ascii=False)  
-        self.save_path_image(archive_data['meta']['timestamp'])  
+        # 紧凑的二进制轨迹（逐步毫秒时间），批量分析时用 trajectory.open_trajectory 读取  
+        save_sidecar(filename, archive_data["path"], archive_data["step_times"], TRAJECTORY_MAP_ID, archive_data["path"][-1])  
+        self.event_log.link(filename)  # 事件日志文件头记下所属存档  
+        self.save_path_image(image_path(filename))  
 
-    def save_path_image(self, timestamp):  
+    def save_path_image(self, filename):  
         surface = pygame.Surface((WIDTH, HEIGHT))  
         surface.fill(COLORS['background'])  
 
@@ -256,7 +256,7 @@ class PathGame:
             pygame.draw.line(surface, COLORS['grid'],  
                              (0, i * CELL_SIZE), (WIDTH, i * CELL_SIZE))  
 
-        for obstacle in ALL_OBSTACLES:  
+        for obstacle in self.compiled_map.rectangles:  # 合并后的障碍物矩形  
             ox, oy, ow, oh = obstacle  
             screen_x = ox * CELL_SIZE  
             screen_y = (GRID_SIZE - oy - oh) * CELL_SIZE  
@@ -275,7 +275,7 @@ class PathGame:
             if idx < len(points):  
                 pygame.draw.circle(surface, color, points[idx], 6)  # Yellow, Blue, and Red for 30%, 50%, and 70%
 
-        pygame.image.save(surface, f"path_{timestamp}.png")  
+        pygame.image.save(surface, filename)  
 
     def draw_control_panel(self):  
         panel_x = GRID_SIZE * CELL_SIZE  
@@ -304,40 +304,121 @@ class PathGame:
         btn_text = self.font.render("开始游戏" if not self.game_started else "进行中", True, (255,255,255))  
         self.screen.blit(btn_text, (panel_x + 65, HEIGHT//2 - 10))  
 
-    def run(self):  
-        while self.running:  
-            self.screen.fill(COLORS['background'])  
-            self.handle_input()  
+    def info_texts(self):  
+        if not self.game_started:  
+            return []  
+        return [  
+            f"转弯次数: {self.turn_count}",  
+            "暂停中" if self.paused else ""  
+        ]  
 
-            self.draw_grid()  
-            self.draw_points()  
+    def draw_info(self):  
+        for i, text in enumerate(self.info_texts()):  
+            if text:  
+                text_surface = self.font.render(text, True, (0,0,0))  
+                self.screen.blit(text_surface, (10, 10 + i*25))  
+
+    def render_full(self):  
+        self.screen.fill(COLORS['background'])  
+        self.draw_grid()  
+        self.draw_points()  
+        self.draw_path()  
+        self.draw_control_panel()  
+        self.draw_info()  
+
+    def render_dirty(self):  
+        """脏矩形模式：背景取自缓存图层，只重绘变化的部分"""  
+        renderer = self.renderer  
+        info = self.info_texts()  
+        panel_x = GRID_SIZE * CELL_SIZE  
+        panel = self.panel_state()  
+
+        changed = self.path_tracker.changes(self.path)  
+        if renderer.full_redraw or changed is None:  
+            renderer.invalidate()  
+            renderer.reset()  
             self.draw_path()  
             self.draw_control_panel()  
+            self.draw_info()  
+        else:  
+            if changed:  
+                area = circle_rect(self.convert_coords(*changed[0]), 8)  
+                for point in changed[1:]:  
+                    area.union_ip(circle_rect(self.convert_coords(*point), 8))  
+                renderer.restore(area, self.draw_path)  
+            if info != self.last_info:  
+                renderer.restore(INFO_RECT, self.draw_path)  
+                self.draw_info()  
+            if panel != self.last_panel:  
+                self.draw_control_panel()  
+                renderer.mark((panel_x, 0, PANEL_WIDTH, HEIGHT))  
+        renderer.mark(self.draw_current())  
+        self.last_info = info  
+        self.last_panel = panel  
+
+    def panel_state(self):  
+        """面板上会变化的状态：按钮悬停、是否已开始"""  
+        panel_x = GRID_SIZE * CELL_SIZE  
+        button_rect = pygame.Rect(panel_x + 50, HEIGHT//2 - 25, 100, 50)  
+        return (button_rect.collidepoint(pygame.mouse.get_pos()), self.game_started)  
+
+    def frame(self):  
+        """一帧：取事件、更新、绘制；限帧和让出控制权由 scene_loop 负责"""  
+        events = self.idle.poll()  
+        if self.frame_timer.handle(self, events):  
+            self.renderer.invalidate()  # 叠加层显示/隐藏后整屏重绘一次  
+        self.handle_input(events)  
+        if not self.idle.should_redraw(events, self.panel_state()):  
+            return  
+        if self.dirty_rendering:  
+            self.render_dirty()  
+        else:  
+            self.render_full()  
+
+        if self.finish_message and (pygame.time.get_ticks() >= self.finish_deadline or  
+                                    any(e.type in (KEYDOWN, MOUSEBUTTONDOWN) for e in events)):  
+            self.running = False  
+        if not self.finish_message and self.game_started and not self.paused and (result := self.check_finish()):  
+            # 存档和路径图交给后台线程写入，完成提示期间主循环照常运行  
+            self.finish_message = f"到达 {result}！"  
+            self.finish_deadline = pygame.time.get_ticks() + FINISH_SCREEN_MS  
+            self.archive_writer.submit(self.save_archive, self.generate_archive())  
+            self.event_log.record(event_log.FINISH, *self.current_pos)  
+            self.event_log.close()  
+        if self.finish_message:  
+            finish_text = self.font.render(self.finish_message, True, (0,0,255))  
+            self.renderer.mark(self.screen.blit(finish_text, (WIDTH//2-50, HEIGHT//2)))  
+            self.idle.request_redraw()  # 空闲模式下也要按时结束完成提示  
+
+        if self.frame_timer.overlay:  
+            self.renderer.mark(self.frame_timer.draw(self.screen))  
+            self.idle.request_redraw()  
+        self.present()  
+
+    def present(self):  
+        """把本帧送上屏幕：脏矩形模式只更新变化的区域"""  
+        if self.dirty_rendering:  
+            self.renderer.present()  
+        else:  
+            pygame.display.flip()  
 
-            if self.game_started:  
-                info_texts = [  
-                    f"转弯次数: {self.turn_count}",  
-                    "暂停中" if self.paused else ""  
-                ]  
-                for i, text in enumerate(info_texts):  
-                    if text:  
-                        text_surface = self.font.render(text, True, (0,0,0))  
-                        self.screen.blit(text_surface, (10, 10 + i*25))  
-
-            if self.game_started and not self.paused and (result := self.check_finish()):  
-                finish_text = self.font.render(f"到达 {result}！", True, (0,0,255))  
-                self.screen.blit(finish_text, (WIDTH//2-50, HEIGHT//2))  
-                
-                archive_data = self.generate_archive()  
-                self.save_archive(archive_data)  
-                pygame.time.wait(2000)  
-                self.running = False  
+    def close(self):  
+        self.event_log.close()  # 中途退出时也写出缓冲区里剩余的事件  
+        self.frame_timer.close()  # 恢复被计时包装的方法，有样本时写出 CSV  
 
-            pygame.display.flip()  
-            self.clock.tick(30)  
+    def run(self):  
+        scene_loop.run(self)  
+
+def run_stage():  
+    """在当前窗口中运行本阶段，结束后返回而不退出 pygame"""  
+    PathGame().run()  
 
-        pygame.quit()  
+async def run_stage_async():  
+    """网页版：同一阶段的协作式版本，每帧把控制权交还浏览器"""  
+    await scene_loop.run_async(PathGame())  
 
 if __name__ == "__main__":  
     game = PathGame()  
-    game.run()
+    game.run()  
+    game.archive_writer.flush()  # 确保存档写完再退出 pygame  
+    pygame.quit()
@@ -0,0 +1,173 @@
+import argparse
+import csv
+import importlib.util
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import maps
+from distance_fields import UNREACHABLE, shortest_distance, warm
+from obstacle_index import build_index
+from trajectory import MAP_NAMES, Trajectory, archive_timestamp, find_sidecars, read_archive
+
+# ================= 离线批量分析存档 =================
+# 递归查找 archive_*.json / archive_*.xlsx，用进程池并行解析，每次试验输出一行指标
+# 最短路（shortest / efficiency）默认按游戏规则计算：目前各阶段都允许穿过障碍物（阶段脚本的 BLOCK_OBSTACLES），
+# --block-obstacles / --through-obstacles 可强制指定
+# 用法：python analyze_archives.py 数据目录 [--out summary.csv|summary.parquet] [--workers 8] [--block-obstacles]
+
+COLUMNS = ['file', 'map', 'timestamp', 'steps', 'turns', 'duration', 'goal', 'reached',
+           'shortest', 'efficiency', 'revisits', 'backtracks', 'clearance_mean', 'clearance_min', 'error']
+PROGRESS_INTERVAL = 1.0  # 进度输出间隔（秒）
+
+
+def discover(root):
+    """递归查找存档文件（跳过 Excel 的 ~$ 锁文件）"""
+    found = []
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if name.startswith('archive_') and name.endswith(('.json', '.xlsx')):
+                found.append(os.path.join(folder, name))
+    return sorted(found)
+
+
+def sidecar_matches(trajectory, path):
+    """轨迹与存档路径的点数和终点一致"""
+    if len(trajectory) != len(path):
+        return False
+    return not path or (int(trajectory.x[-1]), int(trajectory.y[-1])) == tuple(path[-1])
+
+
+def matching_sidecars(filename, path=None):
+    """存档对应的轨迹文件（见 trajectory.find_sidecars）中与存档路径一致的那些；path 缺省时读取存档"""
+    sidecars = [Trajectory(sidecar) for sidecar in find_sidecars(filename)]
+    if sidecars and path is None:
+        path, _ = read_archive(filename)
+    return [t for t in sidecars if sidecar_matches(t, path)]
+
+
+def archive_map(filename, default=None, path=None, meta=None):
+    """存档所属的地图：与存档一致的 .traj 文件头中的地图编号，其次是 --map；都没有时报错，不按扩展名猜测
+    大地图存档返回 large_<边长>，边长取自存档 meta.size；path / meta 缺省时读取存档"""
+    if path is None or meta is None:
+        path, meta = read_archive(filename)
+    names = {MAP_NAMES.get(t.map_id, 'unknown') for t in matching_sidecars(filename, path)} - {'unknown'}
+    if names == {'large'} or (not names and meta.get('size')):  # 只有大地图阶段在 meta 中记录 size
+        if not meta.get('size'):
+            raise ValueError(f"{os.path.basename(filename)} 是大地图存档，但 meta 中没有 size")
+        return maps.large_map_name(int(meta['size']))
+    if len(names) == 1:
+        return names.pop()
+    if default:
+        return default
+    if names:
+        raise ValueError(f"{os.path.basename(filename)} 对应多个地图的轨迹（{', '.join(sorted(names))}），请用 --map 指定")
+    raise ValueError(f"{os.path.basename(filename)} 没有与之一致的 .traj，无法确定地图，请用 --map 指定")
+
+
+def path_metrics(path):
+    """重复访问（走到已经走过的格子）与折返（下一步回到上一步的位置）次数"""
+    seen = {path[0]} if path else set()
+    revisits = backtracks = 0
+    for i in range(1, len(path)):
+        if path[i] in seen:
+            revisits += 1
+        seen.add(path[i])
+        if i >= 2 and path[i] == path[i - 2]:
+            backtracks += 1
+    return revisits, backtracks
+
+
+def analyze_file(task):
+    """进程池任务：解析一个存档并计算指标，出错时只记录错误不中断整批"""
+    filename, default_map, block_obstacles = task
+    row = dict.fromkeys(COLUMNS)  # 缺失值为 None：CSV 中为空，Parquet 中为 null
+    row['file'] = filename
+    try:
+        path, meta = read_archive(filename)
+        map_name = archive_map(filename, default_map, path, meta)
+        game_map = maps.load_map(map_name)
+        steps = len(path) - 1
+        goal = game_map.goal_at(path[-1]) if path else None
+        target = game_map.points[goal] if goal else (path[-1] if path else game_map.start)
+        shortest = shortest_distance(game_map, path[0] if path else game_map.start, target, block_obstacles)
+        revisits, backtracks = path_metrics(path)
+        clearance = build_index(game_map.obstacles, game_map.size).nearest_distances(path) if game_map.obstacles else []
+        row.update({
+            'map': map_name,
+            'timestamp': meta.get('timestamp') or archive_timestamp(filename),  # .xlsx 没有 meta 时间戳
+            'steps': steps,
+            'turns': meta.get('turns'),
+            'duration': meta.get('duration'),
+            'goal': goal,
+            'reached': goal is not None,
+            'shortest': shortest if shortest != UNREACHABLE else None,
+            'efficiency': round(shortest / steps, 4) if steps > 0 and shortest != UNREACHABLE else None,
+            'revisits': revisits,
+            'backtracks': backtracks,
+            'clearance_mean': round(sum(clearance) / len(clearance), 4) if clearance else None,  # 每步到最近障碍物的距离（格）
+            'clearance_min': round(min(clearance), 4) if clearance else None,
+        })
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def write_table(rows, output):
+    if output.endswith('.parquet'):
+        import pandas as pd
+        pd.DataFrame(rows, columns=COLUMNS).to_parquet(output, index=False)
+        return
+    with open(output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行批量分析 archive_*.json / archive_*.xlsx")
+    parser.add_argument('root', nargs='?', default='.', help="存档所在目录（递归查找）")
+    parser.add_argument('--out', default='summary.csv', help="输出文件，.csv 或 .parquet")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="进程数，默认全部核心")
+    parser.add_argument('--chunksize', type=int, help="每个进程一次领取的文件数")
+    parser.add_argument('--map', choices=sorted(maps.MAP_SOURCES), help="没有与存档一致的 .traj 时使用的地图（不指定时这类存档报错）")
+    rule = parser.add_mutually_exclusive_group()  # 都不指定时按游戏规则（阶段脚本的 BLOCK_OBSTACLES）
+    rule.add_argument('--through-obstacles', dest='block_obstacles', action='store_const', const=False,
+                      help="最短路一律允许穿过障碍物")
+    rule.add_argument('--block-obstacles', dest='block_obstacles', action='store_const', const=True,
+                      help="最短路一律绕开障碍物")
+    args = parser.parse_args()
+    if args.out.endswith('.parquet') and not any(importlib.util.find_spec(m) for m in ('pyarrow', 'fastparquet')):
+        parser.error("输出 Parquet 需要安装 pyarrow 或 fastparquet")
+
+    files = discover(args.root)
+    if not files:
+        print(f"{args.root} 下没有找到存档")
+        return
+    tasks = [(f, args.map, args.block_obstacles) for f in files]
+    for name in maps.MAP_SOURCES:
+        warm(maps.load_map(name), args.block_obstacles)  # 先写好磁盘缓存，各进程直接读取
+    workers = max(1, args.workers or 1)
+    chunksize = args.chunksize or max(1, min(64, len(tasks) // (workers * 8)))
+
+    start = last_report = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for row in pool.map(analyze_file, tasks, chunksize=chunksize):
+            rows.append(row)
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                print(f"\r{len(rows)}/{len(tasks)}  {len(rows) / (now - start):.0f} 个/秒",
+                      end='', file=sys.stderr, flush=True)
+
+    elapsed = time.perf_counter() - start
+    write_table(rows, args.out)
+    errors = sum(1 for row in rows if row['error'])
+    print(f"\r分析 {len(rows)} 个存档，用时 {elapsed:.2f}s（{len(rows) / elapsed:.0f} 个/秒，{workers} 个进程），"
+          f"失败 {errors} 个 → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import asyncio
+import atexit
+import queue
+import sys
+import threading
+import traceback
+
+THREADS = sys.platform != 'emscripten'  # pygbag 网页版不能启动线程，写入改为事件循环上的任务
+
+
+# ================= 后台存档写入 =================
+class ArchiveWriter:
+    """在后台线程里执行存档/图片写入，游戏主循环只负责把任务放进有界队列"""
+
+    def __init__(self, maxsize=16):
+        self.queue = queue.Queue(maxsize)  # 队列满时 submit 会阻塞，避免无限堆积
+        self.errors = []
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="archive-writer", daemon=True)
+                self.thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        self.start()
+        self.queue.put((fn, args, kwargs))
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                fn, args, kwargs = job
+                fn(*args, **kwargs)
+            except Exception as e:
+                self.errors.append(e)
+                print(f"存档写入失败: {e}")
+                traceback.print_exc()
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """等待已提交的任务全部写完"""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    async def join(self):
+        """协作式等待已提交的任务全部写完"""
+        while self.queue.unfinished_tasks and self.thread is not None and self.thread.is_alive():
+            await asyncio.sleep(0.01)
+
+    def close(self):
+        self.flush()
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.thread = None
+
+
+class TaskArchiveWriter:
+    """没有线程时的写入器：每个任务在当前帧让出控制权之后作为 asyncio 任务执行，接口与 ArchiveWriter 相同"""
+
+    def __init__(self):
+        self.tasks = set()
+        self.errors = []
+
+    def submit(self, fn, *args, **kwargs):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._call(fn, args, kwargs)  # 不在事件循环里（如桌面版同步运行）时直接写
+            return
+        task = loop.create_task(self._run(fn, args, kwargs))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, fn, args, kwargs):
+        await asyncio.sleep(0)  # 先让本帧画完
+        self._call(fn, args, kwargs)
+
+    def _call(self, fn, args, kwargs):
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            self.errors.append(e)
+            print(f"存档写入失败: {e}")
+            traceback.print_exc()
+
+    def flush(self):
+        """同步场合无法等待事件循环上的任务；需要等待时用 join()"""
+
+    async def join(self):
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+
+    def close(self):
+        pass
+
+
+_writer = None
+
+
+def get_writer():
+    """进程内共享的写入器，退出时自动 flush"""
+    global _writer
+    if _writer is None:
+        _writer = ArchiveWriter() if THREADS else TaskArchiveWriter()
+        atexit.register(_writer.close)
+    return _writer
@@ -0,0 +1,393 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime
+
+# ================= 热点路径基准 =================
+# 无窗口测量路径游戏的热点：碰撞查询、转角计算、不同长度路径的 draw_path、整帧渲染、存档保存、区域切换、大地图视口、
+# 障碍物索引查询和阶段启动
+# 结果写成 JSON，可用 --compare 与之前的结果逐项对比（比值 < 1 表示变快）
+# 用法：python bench_hotpaths.py [obstruction angle draw_path frame archive region viewport obstacles startup] [--quick] [--json bench.json] [--compare 旧.json]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PATH_SIZES = (10, 100, 1000, 10000, 100000)
+QUICK_PATH_SIZES = (10, 1000, 10000)
+FRAME_PATH_SIZES = (10, 1000, 10000)
+REPEAT = 5  # 每项重复次数，报告中位数和最小值
+SEED = 20240501
+
+
+def stage(script):
+    from controller import load_stage
+    module = load_stage(script)
+    if module.FONT_PATH and not os.path.exists(module.FONT_PATH):
+        module.FONT_PATH = None  # 找不到阶段配置的字体时退回 pygame 默认字体
+    return module
+
+
+def random_walk(steps, size, seed=SEED):
+    """在 size×size 网格内的四连通随机游走，长度 steps + 1"""
+    rng = random.Random(seed)
+    x, y = size // 2, size // 2
+    path = [(x, y)]
+    moves = ((1, 0), (-1, 0), (0, 1), (0, -1))
+    while len(path) <= steps:
+        dx, dy = rng.choice(moves)
+        if 0 <= x + dx < size and 0 <= y + dy < size:
+            x, y = x + dx, y + dy
+            path.append((x, y))
+    return path
+
+
+def measure(fn, number=1, repeat=REPEAT, setup=None):
+    """返回每次调用耗时（微秒）的 {'median', 'min', 'unit', 'number'}"""
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        runs.append(timeit.Timer(fn).timeit(number) / number * 1e6)
+    runs.sort()
+    return {'median': round(runs[len(runs) // 2], 3), 'min': round(runs[0], 3), 'unit': 'us', 'number': number}
+
+
+def per_item(result, count):
+    """把一批调用的耗时换算成单次"""
+    result.update(median=round(result['median'] / count, 4), min=round(result['min'] / count, 4))
+    return result
+
+
+def set_path(game, path):
+    game.path = list(path)
+    game.current_pos = list(path[-1])
+    game.step_times = list(range(len(path)))
+    game.turn_count = 0
+    game.turn_times = []
+
+
+# ================= 各项基准 =================
+def rect_is_obstructed(obstacles, x, y):
+    """原先各游戏里的 is_obstructed：逐个遍历障碍物矩形，作为占用网格的对照"""
+    for ox, oy, w, h in obstacles:
+        if ox <= x < ox + w and oy <= y < oy + h:
+            return True
+    return False
+
+
+def bench_obstruction(quick):
+    """碰撞查询（含越界）：原先逐个遍历矩形与占用网格并排对比，障碍物阶段之外再看平铺大地图"""
+    import maps
+    from occupancy import OccupancyGrid
+    compiled = stage('5.obstacles.py').PathGame().compiled_map
+    maps_to_check = [('obstacles', compiled.obstacles, compiled.occupancy)]
+    for size in (200,) if quick else (200, 1000):
+        obstacles = maps.tiled_obstacles(size)
+        maps_to_check.append((f'tiled.{size}', obstacles, OccupancyGrid(obstacles, size)))
+    results = {}
+    for name, obstacles, grid in maps_to_check:
+        rng = random.Random(SEED)
+        count = 10000 if len(obstacles) < 100 else 1000  # 矩形多时逐个遍历太慢，少查一些
+        cells = [(rng.randint(-2, grid.size + 1), rng.randint(-2, grid.size + 1)) for _ in range(count)]
+        assert all(grid.is_obstructed(x, y) == rect_is_obstructed(obstacles, x, y) for x, y in cells)
+
+        def rects():
+            for x, y in cells:
+                rect_is_obstructed(obstacles, x, y)
+
+        def occupancy():
+            for x, y in cells:
+                grid.is_obstructed(x, y)
+        before = per_item(measure(rects, number=1 if quick else 5), count)
+        after = per_item(measure(occupancy, number=5 if quick else 20), count)
+        before['rects'] = after['rects'] = len(obstacles)
+        after['speedup'] = round(before['median'] / after['median'], 1) if after['median'] else None
+        suffix = '' if name == 'obstacles' else f'.{name}'
+        results[f'is_obstructed.rects{suffix}'] = before
+        results[f'is_obstructed{suffix}'] = after  # 沿用原来的键名，旧结果仍可 --compare
+    return results
+
+
+def bench_angle(quick):
+    module = stage('5.obstacles.py')
+    game = module.PathGame()
+    path = random_walk(10000, module.GRID_SIZE)
+    triples = [(path[i - 2], path[i - 1], path[i]) for i in range(2, len(path)) if path[i] != path[i - 2]]
+
+    def run():
+        for a, b, c in triples:
+            game.calculate_angle(a, b, c)
+    return {'calculate_angle': per_item(measure(run, number=2 if quick else 10), len(triples))}
+
+
+def bench_draw_path(quick):
+    """首次同步整条路径、走一步后的增量同步、撤回一步，以及把图层贴到屏幕"""
+    module = stage('5.obstacles.py')
+    game = module.PathGame()
+    results = {}
+    for size in (QUICK_PATH_SIZES if quick else PATH_SIZES):
+        path = random_walk(size, module.GRID_SIZE)
+        extra = random_walk(size + 1, module.GRID_SIZE)[-1]
+        layer = game.path_layer
+
+        def cold():
+            layer.clear()
+            layer.sync(path)
+        results[f'draw_path.cold.{size}'] = measure(cold, repeat=3 if size >= 10000 else REPEAT)
+        layer.clear()
+        layer.sync(path)
+        grown = path + [extra]
+
+        def step():
+            layer.sync(grown)
+            layer.draw(game.screen)
+            layer.sync(path)
+            layer.draw(game.screen)
+        results[f'draw_path.step_undo.{size}'] = measure(step, number=50)
+        set_path(game, path)
+        game.draw_path()
+        results[f'draw_path.frame.{size}'] = measure(game.draw_path, number=50)
+    return results
+
+
+def bench_frame(quick):
+    """整帧：render_full + flip 与 render_dirty + present（路径不变 / 每帧走一步）"""
+    import pygame
+    results = {}
+    for name, script in (('empty', '3.empty.py'), ('obstacles', '5.obstacles.py')):
+        module = stage(script)
+        game = module.PathGame()
+        game.game_started = True
+        for size in FRAME_PATH_SIZES[:2] if quick else FRAME_PATH_SIZES:
+            path = random_walk(size, module.GRID_SIZE)
+            set_path(game, path)
+            game.renderer.invalidate()
+
+            def full():
+                game.render_full()
+                pygame.display.flip()
+            results[f'frame.full.{name}.{size}'] = measure(full, number=10 if quick else 30)
+
+            def dirty():
+                game.render_dirty()
+                game.renderer.present()
+            game.render_dirty()
+            results[f'frame.dirty_idle.{name}.{size}'] = measure(dirty, number=100)
+            walk = random_walk(size + 200, module.GRID_SIZE)
+            state = {'i': size}
+
+            def dirty_step():
+                state['i'] += 1
+                if state['i'] >= len(walk):
+                    state['i'] = size
+                    set_path(game, walk[:size])
+                game.path.append(walk[state['i']])
+                game.current_pos = list(walk[state['i']])
+                game.render_dirty()
+                game.renderer.present()
+            set_path(game, walk[:size])
+            game.render_dirty()
+            results[f'frame.dirty_step.{name}.{size}'] = measure(dirty_step, number=50)
+    return results
+
+
+def bench_archive(quick):
+    """generate_archive + save_archive：JSON（障碍物阶段）和 Excel（空白阶段），均包含 .traj 与路径图"""
+    results = {}
+    leftovers = [os.path.join(BASE_DIR, pattern) for pattern in ('archive_2*', 'archive_*_2*.traj', 'path_2*.png')]
+    before = {f for pattern in leftovers for f in glob.glob(pattern)}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)  # 障碍物阶段和路径图写到当前目录
+        try:
+            for name, script, kind in (('obstacles', '5.obstacles.py', 'json'), ('empty', '3.empty.py', 'excel')):
+                module = stage(script)
+                game = module.PathGame()
+                game.start_time = time.time()
+                for size in (100, 1000) if quick else (100, 1000, 10000):
+                    set_path(game, random_walk(size, module.GRID_SIZE))
+                    game.turn_times = [(i, i * 0.5) for i in range(size // 4)]
+                    results[f'archive.{kind}.{size}'] = measure(
+                        lambda: game.save_archive(game.generate_archive()), repeat=3)
+        finally:
+            os.chdir(cwd)
+            # 空白阶段把存档写在脚本目录，删掉本次基准产生的文件
+            for leftover in {f for pattern in leftovers for f in glob.glob(pattern)} - before:
+                os.remove(leftover)
+    return results
+
+
+def bench_region(quick):
+    """区域选择：位掩码切换，以及经由 handle_input 的点击切换"""
+    import pygame
+    from pygame.locals import MOUSEBUTTONDOWN
+    from regions import RegionMask, REGIONS
+    mask = RegionMask()
+    rng = random.Random(SEED)
+    regions = [(rng.randrange(REGIONS), rng.randrange(REGIONS)) for _ in range(10000)]
+
+    def toggle():
+        for rx, ry in regions:
+            mask.toggle(rx, ry)
+    results = {'region.toggle': per_item(measure(toggle, number=5), len(regions))}
+    module = stage('experiment.py')
+    game = module.RegionSelectionGame(pygame.Surface(module.RS_SCREEN_SIZE))
+    clicks = [pygame.event.Event(MOUSEBUTTONDOWN, pos=(rng.randrange(module.RS_GRID_WIDTH),
+                                                       rng.randrange(module.RS_GRID_WIDTH)), button=1)
+              for _ in range(1000)]
+    results['region.click'] = per_item(measure(lambda: game.handle_input(clicks), number=5), len(clicks))
+    return results
+
+
+def bench_viewport(quick):
+    """大地图分块渲染：每帧走一步并重绘视口，不同地图大小下的单帧耗时应基本相同"""
+    import pygame
+    import large_map
+    if large_map.FONT_PATH and not os.path.exists(large_map.FONT_PATH):
+        large_map.FONT_PATH = None
+    results = {}
+    for size in (200, 1000) if quick else (49, 200, 1000):
+        game = large_map.LargePathGame(size)
+        game.game_started = True
+        walk = random_walk(2000, size)
+        set_path(game, walk[:1])
+        game.render()
+        state = {'i': 0}
+
+        def frame():
+            state['i'] = (state['i'] + 1) % len(walk)
+            if state['i'] == 0:
+                set_path(game, walk[:1])
+            game.path.append(walk[state['i']])
+            game.current_pos = list(walk[state['i']])
+            game.render()
+            pygame.display.flip()
+        results[f'viewport.frame.{size}'] = measure(frame, number=100)
+        results[f'viewport.frame.{size}']['chunks'] = len(game.layer.chunks)
+    return results
+
+
+def bench_obstacles(quick):
+    """平铺障碍物的大地图：合并与建索引，以及点查询、最近障碍物和视线查询"""
+    import maps
+    from obstacle_index import ObstacleIndex, merge_obstacles
+    results = {}
+    for size in (200, 1000) if quick else (49, 200, 1000):
+        obstacles = maps.tiled_obstacles(size)
+        rng = random.Random(SEED)
+        cells = [(rng.randrange(size), rng.randrange(size)) for _ in range(1000)]
+        pairs = list(zip(cells, cells[1:] + cells[:1]))
+        merged = merge_obstacles(obstacles, size)
+        results[f'obstacles.merge.{size}'] = measure(lambda: merge_obstacles(obstacles, size), repeat=3)
+        results[f'obstacles.merge.{size}'].update(strips=len(obstacles), rects=len(merged))
+        index = ObstacleIndex(merged, size)
+        results[f'obstacles.hit.{size}'] = per_item(measure(lambda: [index.hit(x, y) for x, y in cells], number=10), 1000)
+        results[f'obstacles.nearest.{size}'] = per_item(
+            measure(lambda: [index.nearest(x, y) for x, y in cells], number=3), 1000)
+        results[f'obstacles.line_of_sight.{size}'] = per_item(
+            measure(lambda: [index.line_of_sight(a, b) for a, b in pairs], number=3), 1000)
+    return results
+
+
+def bench_startup(quick):
+    """阶段冷启动到首帧（复用 bench_startup 的子进程测量，单位毫秒）"""
+    import bench_startup
+    options = argparse.Namespace(font=None, headless=True)
+    results = {}
+    for name in ('empty', 'obstacles', 'experiment.maze', 'experiment.fifth'):
+        runs = [bench_startup.measure(name, options) for _ in range(1 if quick else 3)]
+        if any('error' in r for r in runs):
+            results[f'startup.{name}'] = {'error': next(r['error'] for r in runs if 'error' in r)}
+            continue
+        values = sorted(r['time_to_first_frame_ms'] for r in runs)
+        results[f'startup.{name}'] = {'median': values[len(values) // 2], 'min': values[0],
+                                      'unit': 'ms', 'number': 1}
+    return results
+
+
+BENCHMARKS = {
+    'obstruction': bench_obstruction,
+    'angle': bench_angle,
+    'draw_path': bench_draw_path,
+    'frame': bench_frame,
+    'archive': bench_archive,
+    'region': bench_region,
+    'viewport': bench_viewport,
+    'obstacles': bench_obstacles,
+    'startup': bench_startup,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline_file):
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    print(f"\n与 {baseline_file} 对比（中位数比值，< 1 表示变快）：")
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old and 'median' in old and 'median' in result and old['median']:
+            print(f"{name:<36}{old['median']:>12.3f} → {result['median']:>12.3f} {result['unit']:<3}"
+                  f"{result['median'] / old['median']:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="路径游戏热点基准，结果写成 JSON 便于前后对比")
+    parser.add_argument('benchmarks', nargs='*', help="要运行的项，默认全部：" + ", ".join(BENCHMARKS))
+    parser.add_argument('--quick', action='store_true', help="缩小规模和重复次数")
+    parser.add_argument('--json', default=f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    parser.add_argument('--compare', help="之前保存的结果 JSON")
+    args = parser.parse_args()
+    unknown = [b for b in args.benchmarks if b not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准：{', '.join(unknown)}")
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # 必须在 pygame.init 之前设置
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import pygame
+    pygame.init()
+    results = {}
+    for name in args.benchmarks or BENCHMARKS:
+        start = time.perf_counter()
+        part = BENCHMARKS[name](args.quick)
+        for key, result in part.items():
+            if 'error' in result:
+                print(f"{key:<36}失败: {result['error']}")
+            else:
+                speedup = f"，快 {result['speedup']} 倍" if result.get('speedup') else ''
+                print(f"{key:<36}{result['median']:>12.3f} {result['unit']:<3}（最小 {result['min']:.3f}{speedup}）")
+        print(f"-- {name} 用时 {time.perf_counter() - start:.1f}s")
+        results.update(part)
+    pygame.quit()
+
+    report = {
+        'timestamp': datetime.now().strftime("%Y%m%d_%H%M%S"),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'quick': args.quick,
+        'results': results,
+    }
+    with open(args.json, "w", encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"保存成功: {args.json}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
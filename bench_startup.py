@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# ================= 启动耗时基准 =================
+# 每个阶段在独立的解释器里冷启动，分别记录：
+#   pygame 导入、阶段模块导入、pygame.init、字体加载、首帧绘制，以及从进程启动到首帧的总耗时
+# 用法：python bench_startup.py [--headless] [--repeat 3] [--font simhei.ttf] [--json startup.json]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def frame_main(m, pygame):
+    screen = pygame.display.set_mode(m.SCREEN_SIZE)
+    page = m.GamePage("欢迎页", "欢迎参与路径规划实验！")
+    page.draw_panel(screen)
+    pygame.display.flip()
+
+
+def frame_describe(m, pygame):
+    size = getattr(m, 'SCREEN_SIZE', (m.WIDTH, m.HEIGHT))
+    game = m.PathGame(pygame.display.set_mode(size))
+    game.update()
+
+
+def frame_path(m, pygame):
+    game = m.PathGame()
+    game.render_dirty()
+    game.renderer.present()
+
+
+def frame_experiment_scene(m, pygame):
+    scene = m.ExperimentScene(pygame.display.set_mode(m.EXP_SCREEN_SIZE))
+    scene.update([])
+
+
+def frame_region_scene(m, pygame):
+    scene = m.RegionSelectionScene(pygame.display.set_mode((1200, 800)))
+    scene.game.update()
+    scene.main_screen.blit(scene.region_surface, (0, 0))
+    pygame.display.flip()
+
+
+def frame_maze(m, pygame):
+    game = m.MazeGame()
+    game.render_dirty()
+    game.renderer.present()
+
+
+def frame_full_maze(m, pygame):
+    m.FullMazeGame().update()
+
+
+def frame_fifth(m, pygame):
+    game = m.FifthGame()
+    game.render_dirty()
+    game.renderer.present()
+
+
+# 阶段名 → (脚本文件, 首帧绘制函数, 需要预加载的字号)
+STAGES = {
+    'main': ('main.py', frame_main, (20, 24, 36)),
+    'describeempty': ('2.describeempty.py', frame_describe, (20,)),
+    'empty': ('3.empty.py', frame_path, (20,)),
+    'describeobstacles': ('4.describeobstacles.py', frame_describe, (20,)),
+    'obstacles': ('5.obstacles.py', frame_path, (20,)),
+    'experiment.scene': ('experiment.py', frame_experiment_scene, (20, 24, 36)),
+    'experiment.region': ('experiment.py', frame_region_scene, (20,)),
+    'experiment.maze': ('experiment.py', frame_maze, (20,)),
+    'experiment.fullmaze': ('experiment.py', frame_full_maze, (20,)),
+    'experiment.fifth': ('experiment.py', frame_fifth, (20,)),
+}
+
+
+def load_stage_module(script):
+    """按文件路径导入阶段脚本（脚本名以数字开头，不能直接 import）"""
+    import importlib.util
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    name = os.path.splitext(script)[0].replace('.', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(BASE_DIR, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_child(stage, font_path):
+    """子进程：测量单个阶段的各项启动耗时，结果以一行 JSON 打印"""
+    t0 = time.perf_counter()
+    timings = {}
+
+    def mark(name, since):
+        now = time.perf_counter()
+        timings[name] = round((now - since) * 1000, 2)
+        return now
+
+    script, draw_first_frame, font_sizes = STAGES[stage]
+    t = time.perf_counter()
+    import pygame
+    t = mark('import_pygame_ms', t)
+    module = load_stage_module(script)
+    t = mark('import_stage_ms', t)
+    pygame.init()
+    t = mark('pygame_init_ms', t)
+
+    if font_path:
+        module.FONT_PATH = font_path
+    font = 'stage'
+    if module.FONT_PATH and not os.path.exists(module.FONT_PATH):
+        module.FONT_PATH = None  # 找不到阶段配置的字体时退回 pygame 默认字体
+        font = 'default'
+    for size in font_sizes:
+        module.get_font(size)
+    t = mark('font_load_ms', t)
+
+    draw_first_frame(module, pygame)
+    mark('first_frame_ms', t)
+    timings['time_to_first_frame_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+    timings['font'] = font
+    timings['heavy_modules'] = sorted(m for m in ('pandas', 'numpy', 'openpyxl') if m in sys.modules)
+    pygame.quit()
+    print(json.dumps(timings))
+
+
+def measure(stage, args):
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', stage]
+    if args.font:
+        cmd += ['--font', args.font]
+    env = dict(os.environ)
+    if args.headless:
+        env['SDL_VIDEODRIVER'] = 'dummy'
+        env['SDL_AUDIODRIVER'] = 'dummy'
+    env['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+    start = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env, cwd=BASE_DIR)
+    wall = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'}
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process_wall_ms'] = round(wall, 2)
+    return timings
+
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="各阶段启动耗时基准（导入、pygame.init、字体、首帧）")
+    parser.add_argument('stages', nargs='*', help="要测量的阶段，默认全部：" + ", ".join(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help="每个阶段冷启动次数，报告中位数")
+    parser.add_argument('--headless', action='store_true', help="使用 SDL dummy 视频驱动，不打开窗口")
+    parser.add_argument('--font', help="覆盖阶段脚本中的 FONT_PATH")
+    parser.add_argument('--json', help="把结果写入 JSON 文件，便于前后对比")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.font)
+        return
+
+    columns = ['import_pygame_ms', 'import_stage_ms', 'pygame_init_ms', 'font_load_ms',
+               'first_frame_ms', 'time_to_first_frame_ms', 'process_wall_ms']
+    report = {}
+    headers = [c.replace('_ms', '') for c in columns]
+    print(f"{'stage':<22}" + "".join(f"{h:>{len(h) + 2}}" for h in headers))
+    for stage in args.stages or STAGES:
+        runs = [measure(stage, args) for _ in range(args.repeat)]
+        errors = [r['error'] for r in runs if 'error' in r]
+        if errors:
+            report[stage] = {'error': errors[0]}
+            print(f"{stage:<22}  失败: {errors[0]}")
+            continue
+        summary = {c: median([r[c] for r in runs]) for c in columns}
+        summary['font'] = runs[0]['font']
+        summary['heavy_modules'] = runs[0]['heavy_modules']
+        report[stage] = summary
+        print(f"{stage:<22}" + "".join(f"{summary[c]:>{len(h) + 2}.1f}" for c, h in zip(columns, headers)))
+
+    if args.json:
+        with open(args.json, "w", encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'repeat': args.repeat, 'stages': report},
+                      f, indent=4, ensure_ascii=False)
+        print(f"保存成功: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
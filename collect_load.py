@@ -0,0 +1,182 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from collect_server import CollectServer, read_sessions
+
+# ================= 收集服务器压测 =================
+# 模拟大量浏览器会话：每个会话一条 keep-alive 连接，按间隔上传移动批次，测量从发送到收到确认的延迟
+# 不给 --url 时在本进程里启动一个临时的收集服务器（写到临时目录），结束后核对每个会话的批次是否完整、不重复
+# 用法：python collect_load.py [--sessions 300] [--batches 20] [--moves 30] [--interval 0.05] [--url http://127.0.0.1:8765]
+SEED = 20240501
+
+
+class HttpClient:
+    """最小的 HTTP/1.1 keep-alive 客户端，只处理收集服务器的 JSON 响应"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def post(self, path, payload):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        head = (f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode('latin-1') + body)
+        await self.writer.drain()
+        lines = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ')[1])
+        headers = dict(line.split(':', 1) for line in lines[1:] if ':' in line)
+        headers = {name.strip().lower(): value.strip() for name, value in headers.items()}
+        data = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, json.loads(data) if data else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def synthetic_moves(rng, start, count, t0):
+    """随机游走的一批移动 [[x, y, 毫秒], ...]，返回 (批次, 最后位置, 最后时间)"""
+    x, y = start
+    t = t0
+    moves = []
+    for _ in range(count):
+        dx, dy = rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1)))
+        x, y = min(max(x + dx, 0), 48), min(max(y + dy, 0), 48)
+        t += rng.randint(80, 400)
+        moves.append([x, y, t])
+    return moves, (x, y), t
+
+
+async def run_session(index, args, host, port, results):
+    """一个模拟会话：连上服务器，依次上传各批次，按比例重发已确认的批次检验去重"""
+    rng = random.Random(SEED + index)
+    session = f"load-{os.getpid()}-{index:05d}"
+    await asyncio.sleep(rng.uniform(0, args.ramp))  # 错开各会话的开始时间
+    client = HttpClient(host, port)
+    pos, t = (7, 42), 0
+    try:
+        await client.connect()
+        for seq in range(args.batches):
+            moves, pos, t = synthetic_moves(rng, pos, args.moves, t)
+            payload = {'seq': seq, 'stage': 'obstacles', 'moves': moves, 'final': seq == args.batches - 1}
+            for attempt in range(2 if rng.random() < args.duplicates else 1):
+                if client.writer is None:
+                    await client.connect()
+                start = time.perf_counter()
+                status, reply = await client.post(f"/sessions/{session}/batches", payload)
+                results['latencies'].append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    results['errors'].append(f"{session} seq {seq}: {status} {reply}")
+                elif attempt == 0:
+                    results['moves'] += len(moves)
+                    results['batches'] += 1
+                elif not reply.get('duplicate'):
+                    results['errors'].append(f"{session} seq {seq}: 重发没有被识别为重复")
+            await asyncio.sleep(args.interval * rng.uniform(0.5, 1.5))
+    except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+        results['errors'].append(f"{session}: {type(e).__name__}: {e}")
+    finally:
+        client.close()
+    results['sessions'].append(session)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def verify(filename, sessions, batches):
+    """核对记录文件：每个会话 seq 0..batches-1 各一条"""
+    stored = read_sessions(filename)
+    problems = []
+    for session in sessions:
+        seqs = [r['seq'] for r in stored.get(session, [])]
+        if seqs != list(range(batches)):
+            problems.append(f"{session}: 记录的 seq 为 {seqs[:5]}{'...' if len(seqs) > 5 else ''}（共 {len(seqs)} 条）")
+    return problems
+
+
+async def run(args):
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        out_dir = tempfile.mkdtemp(prefix='collect_load_')
+        server = await CollectServer(out_dir, '127.0.0.1', 0).start()
+        host, port = server.host, server.port
+    results = {'latencies': [], 'errors': [], 'moves': 0, 'batches': 0, 'sessions': []}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(i, args, host, port, results) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    latencies = results['latencies']
+    report = {
+        'sessions': args.sessions,
+        'batches': results['batches'],
+        'moves': results['moves'],
+        'requests': len(latencies),
+        'elapsed_s': round(elapsed, 3),
+        'batches_per_s': round(results['batches'] / elapsed, 1),
+        'moves_per_s': round(results['moves'] / elapsed, 1),
+        'latency_ms': {f"p{q}": round(percentile(latencies, q), 3) for q in (50, 90, 99, 99.9)} if latencies else {},
+        'errors': len(results['errors']),
+    }
+    if latencies:
+        report['latency_ms']['max'] = round(max(latencies), 3)
+    if server is not None:
+        await server.close()
+        report['commits'] = server.appender.stats['commits']
+        report['records_per_commit'] = round(server.appender.stats['records'] / max(server.appender.stats['commits'], 1), 1)
+        report['missing'] = verify(server.appender.filename, results['sessions'], args.batches)
+        report['file'] = server.appender.filename
+    return report, results['errors']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟大量浏览器会话压测收集服务器")
+    parser.add_argument('--url', help="已在运行的收集服务器，缺省时在本进程启动一个临时服务器")
+    parser.add_argument('--sessions', type=int, default=300, help="并发会话数")
+    parser.add_argument('--batches', type=int, default=20, help="每个会话上传的批次数")
+    parser.add_argument('--moves', type=int, default=30, help="每批的移动数")
+    parser.add_argument('--interval', type=float, default=0.05, help="同一会话两批之间的平均间隔（秒）")
+    parser.add_argument('--ramp', type=float, default=1.0, help="各会话在这么多秒内陆续开始")
+    parser.add_argument('--duplicates', type=float, default=0.02, help="立即重发同一批的比例，检验服务器去重")
+    parser.add_argument('--json', help="把报告写成 JSON")
+    args = parser.parse_args()
+
+    report, errors = asyncio.run(run(args))
+    for error in errors[:10]:
+        print(error)
+    latency = report['latency_ms']
+    print(f"{report['sessions']} 个会话，{report['batches']} 批 / {report['moves']} 步，用时 {report['elapsed_s']}s："
+          f"{report['batches_per_s']} 批/秒，{report['moves_per_s']} 步/秒")
+    if latency:
+        print("确认延迟 ms：" + "  ".join(f"{name} {value}" for name, value in latency.items()))
+    if 'commits' in report:
+        print(f"落盘 {report['commits']} 次，平均每次 {report['records_per_commit']} 条；"
+              f"缺失或重复的会话 {len(report['missing'])} 个 → {report['file']}")
+    print(f"错误 {report['errors']} 个")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"保存成功: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import time
+from datetime import datetime
+
+# ================= 会话数据收集服务器 =================
+# pygbag 网页版的结果只能留在浏览器的虚拟文件系统里；这里提供一个只依赖标准库的 asyncio HTTP 服务器，
+# 参与者的浏览器把每个会话的移动批次 POST 过来：POST /sessions/<会话编号>/batches，正文为 JSON
+#   {"seq": 3, "stage": "obstacles", "moves": [[x, y, 毫秒], ...], "final": false}
+# 各连接收到的记录先进同一个提交队列，攒够一批（或等够 COMMIT_MAX_DELAY）后一次 write + fsync，落盘后才回 200 确认
+# 每个会话按 seq 去重，浏览器超时重发同一批不会重复写入；重发赶上第一次写入还没落盘时，等它的结果再回复
+# 会话收到 final 批次后（或空闲超过 SESSION_TTL），已落盘的连续 seq 收拢成一个区间，不再逐个保留
+# 待做：目前树里还没有上传端，游戏只写本地存档，collect_load.py（压测）是唯一的客户端；网页版需要按上面的格式分批上传
+# 用法：python collect_server.py [--host 127.0.0.1] [--port 8765] [--out collected]
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+OUT_DIR = 'collected'
+COMMIT_MAX_RECORDS = 256  # 每次 fsync 最多提交的记录数
+COMMIT_MAX_DELAY = 0.005  # 第一条记录最多等这么久（秒）再提交，让并发会话的记录合并到同一次 fsync
+MAX_BODY = 1 << 20  # 单个请求正文上限（字节）
+MAX_HEADER = 16 << 10
+IDLE_TIMEOUT = 60  # keep-alive 连接空闲多久后关闭（秒）
+SESSION_TTL = 300  # 会话空闲多久后收拢已确认的 seq（秒）
+SESSION_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+BATCH_PATH = re.compile(r'^/sessions/([^/]+)/batches$')
+
+REASONS = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           408: 'Request Timeout', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+CORS_HEADERS = (  # 网页版与服务器通常不同源
+    'Access-Control-Allow-Origin: *\r\n'
+    'Access-Control-Allow-Methods: POST, GET, OPTIONS\r\n'
+    'Access-Control-Allow-Headers: Content-Type\r\n'
+)
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ================= 组提交追加写入 =================
+class BatchAppender:
+    """把并发到达的记录合并成一次 write + fsync；append() 在记录落盘后才返回"""
+
+    def __init__(self, filename, max_records=COMMIT_MAX_RECORDS, max_delay=COMMIT_MAX_DELAY):
+        self.filename = filename
+        self.max_records = max_records
+        self.max_delay = max_delay
+        self.file = open(filename, 'ab')
+        self.pending = []  # [(一行字节, future)]
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.closed = False
+        self.stats = {'records': 0, 'commits': 0, 'bytes': 0}
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def append(self, line):
+        if self.closed:
+            raise RuntimeError("写入器已关闭")
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((line, future))
+        self.wakeup.set()
+        await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while not (self.closed and not self.pending):
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            deadline = loop.time() + self.max_delay
+            while len(self.pending) < self.max_records and not self.closed and loop.time() < deadline:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                self.wakeup.clear()
+            while self.pending:
+                batch, self.pending = self.pending[:self.max_records], self.pending[self.max_records:]
+                data = b''.join(line for line, _ in batch)
+                try:
+                    await loop.run_in_executor(None, self._commit, data)  # fsync 不占用事件循环
+                except OSError as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.stats['records'] += len(batch)
+                self.stats['commits'] += 1
+                self.stats['bytes'] += len(data)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    def _commit(self, data):
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    async def close(self):
+        """提交剩余记录后关闭文件"""
+        self.closed = True
+        self.wakeup.set()
+        if self.task is not None:
+            await self.task
+        self.file.close()
+
+
+# ================= 会话去重状态 =================
+class SessionState:
+    """一个会话的去重状态：在写或刚写完的 seq 各有一个写入 future（结果为 True 表示已落盘），
+    收拢后已落盘的连续 seq 只记区间 [floor, mark]，不连续的仍保留 future"""
+
+    def __init__(self):
+        self.writes = {}  # seq → 写入 future；写入失败的会删掉
+        self.floor = None
+        self.mark = None  # 高水位：floor..mark 都已落盘
+        self.final = False
+        self.last_seen = time.monotonic()
+
+    def stored(self, seq):
+        return self.mark is not None and self.floor <= seq <= self.mark
+
+    def collapse(self):
+        """把已写完并与区间相连的 seq 并入区间，释放它们的 future"""
+        done = sorted(seq for seq, write in self.writes.items() if write.done())
+        if not done:
+            return
+        if self.mark is None:
+            self.floor = self.mark = done[0]
+        for seq in done:
+            if seq == self.mark + 1:
+                self.mark = seq
+        for seq in reversed(done):
+            if seq == self.floor - 1:
+                self.floor = seq
+        for seq in done:
+            if self.floor <= seq <= self.mark:
+                del self.writes[seq]
+
+
+# ================= HTTP 服务 =================
+class CollectServer:
+    """每个连接一个协程，支持 keep-alive；会话状态见 SessionState"""
+
+    def __init__(self, out_dir=OUT_DIR, host=DEFAULT_HOST, port=DEFAULT_PORT, **appender_options):
+        self.out_dir = out_dir
+        self.host = host
+        self.port = port
+        self.appender_options = appender_options
+        self.sessions = {}  # 会话编号 → SessionState
+        self.server = None
+        self.appender = None
+        self.sweeper = None
+        self.connections = 0
+        self.stats = {'requests': 0, 'batches': 0, 'duplicates': 0, 'errors': 0}
+
+    async def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        filename = os.path.join(self.out_dir, f"sessions_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.jsonl")
+        self.appender = BatchAppender(filename, **self.appender_options)
+        self.appender.start()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_HEADER, backlog=1024)
+        self.port = self.server.sockets[0].getsockname()[1]  # port=0 时取实际分配的端口
+        self.sweeper = asyncio.get_running_loop().create_task(self._sweep())
+        return self
+
+    async def close(self):
+        self.sweeper.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+        await self.appender.close()
+
+    def collapse_idle(self, now=None):
+        """收拢空闲超过 SESSION_TTL 的会话"""
+        cutoff = (time.monotonic() if now is None else now) - SESSION_TTL
+        for state in self.sessions.values():
+            if state.writes and state.last_seen < cutoff:
+                state.collapse()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(SESSION_TTL / 4)
+            self.collapse_idle()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, 400, {'error': "请求头过长"}, keep_alive=False)
+                    return
+                headers, body_read = {}, False
+                try:
+                    method, path, headers = parse_head(head)
+                    try:
+                        length = int(headers.get('content-length', 0))
+                    except ValueError:
+                        raise HttpError(400, "Content-Length 不是整数")
+                    if not 0 <= length <= MAX_BODY:
+                        raise HttpError(413, f"正文超过 {MAX_BODY} 字节")
+                    body = await asyncio.wait_for(reader.readexactly(length), IDLE_TIMEOUT) if length else b''
+                    body_read = True
+                    status, payload = await self.dispatch(method, path, body)
+                except HttpError as e:
+                    self.stats['errors'] += 1
+                    status, payload = e.status, {'error': str(e)}
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                # 正文没读完时连接里剩下的字节无法解析，只能关闭
+                keep_alive = body_read and status < 500 and headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def dispatch(self, method, path, body):
+        self.stats['requests'] += 1
+        if method == 'OPTIONS':
+            return 204, None
+        if path == '/health':
+            if method != 'GET':
+                raise HttpError(405, "只支持 GET")
+            return 200, {'ok': True, 'sessions': len(self.sessions), 'connections': self.connections,
+                         **self.stats, **{f"stored_{k}": v for k, v in self.appender.stats.items()}}
+        match = BATCH_PATH.match(path)
+        if not match:
+            raise HttpError(404, f"没有 {path}")
+        if method != 'POST':
+            raise HttpError(405, "只支持 POST")
+        return 200, await self.accept(match.group(1), body)
+
+    async def accept(self, session, body):
+        """校验一批记录，落盘后返回确认"""
+        if not SESSION_ID.match(session):
+            raise HttpError(400, "会话编号只能包含字母、数字、- 和 _，最长 64 个字符")
+        try:
+            batch = json.loads(body)
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(400, "正文不是合法的 JSON")
+        if not isinstance(batch, dict) or not isinstance(batch.get('seq'), int) or not isinstance(batch.get('moves'), list):
+            raise HttpError(400, "正文需要整数 seq 和列表 moves")
+        state = self.sessions.get(session)
+        if state is None:
+            state = self.sessions[session] = SessionState()
+        state.last_seen = time.monotonic()
+        writes = state.writes
+        seq = batch['seq']
+        write = writes.get(seq)
+        if write is not None or state.stored(seq):
+            # 同一批已在写或已写完：等第一次写入的结果，落盘前不确认
+            if write is not None and not await asyncio.shield(write):
+                raise HttpError(500, "同一批的写入失败，请重发")
+            self.stats['duplicates'] += 1
+            return {'ok': True, 'seq': seq, 'duplicate': True}
+        write = writes[seq] = asyncio.get_running_loop().create_future()
+        record = {'session': session, 'received_ns': time.time_ns(), **batch}
+        written = False
+        try:
+            await self.appender.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+            written = True
+        except (OSError, RuntimeError) as e:
+            raise HttpError(500, f"写入失败: {e}")
+        finally:
+            if not written:
+                del writes[seq]  # 之后的重发重新写入
+            write.set_result(written)
+        self.stats['batches'] += 1
+        if batch.get('final'):
+            state.final = True
+        if state.final:
+            state.collapse()  # final 之前还没写完的批次写完时也在这里并入
+        return {'ok': True, 'seq': seq, 'duplicate': False}
+
+    async def respond(self, writer, status, payload, keep_alive=True):
+        body = b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                f"{CORS_HEADERS}\r\n")
+        writer.write(head.encode('latin-1') + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def parse_head(head):
+    """请求行和请求头 → (方法, 路径, {小写头名: 值})"""
+    lines = head.decode('latin-1').split('\r\n')
+    parts = lines[0].split(' ')
+    if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+        raise HttpError(400, "请求行格式错误")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise HttpError(400, "请求头格式错误")
+            headers[name.strip().lower()] = value.strip()
+    return parts[0].upper(), parts[1].split('?', 1)[0], headers
+
+
+def read_sessions(filename):
+    """读回收集到的记录：{会话编号: 按 seq 排序的批次列表}"""
+    sessions = {}
+    with open(filename, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                sessions.setdefault(record['session'], []).append(record)
+    for batches in sessions.values():
+        batches.sort(key=lambda r: r['seq'])
+    return sessions
+
+
+async def serve(args):
+    server = await CollectServer(args.out, args.host, args.port).start()
+    print(f"收集服务器已启动 http://{server.host}:{server.port} → {server.appender.filename}")
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, stop.set)  # 停止前把已收到的记录全部落盘
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows 上没有，Ctrl+C 仍会中断
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        print(f"共 {server.stats['batches']} 批，{server.appender.stats['commits']} 次落盘")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接收网页版会话上传的移动批次")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--out', default=OUT_DIR, help="记录文件目录")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
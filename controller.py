@@ -1,27 +1,95 @@
-import subprocess
+import asyncio
+import importlib.util
+import os
+import sys
 import time
+import traceback
+
+import pygame
+
+import scene_loop
+from archive_writer import get_writer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ================= 阶段列表 =================
+# 按顺序在同一个解释器、同一个窗口中运行；每个脚本提供 run_stage()，结束时返回而不退出 pygame
+# 字体注册表、共享背景图层和后台存档写入器在各阶段之间复用
+# 网页版（pygbag）改用 main_async()：每个脚本的 run_stage_async() 协作式运行本阶段
+STAGES = [
+    {'script': "main.py", 'entry': 'run_stage'},  # First game (UI game)
+    {'script': "2.describeempty.py", 'entry': 'run_stage'},  # Next step (describe empty)
+    {'script': "3.empty.py", 'entry': 'run_stage'},  # Empty game stage
+    {'script': "4.describeobstacles.py", 'entry': 'run_stage'},  # Next step (describe obstacles)
+    {'script': "5.obstacles.py", 'entry': 'run_stage'},  # Obstacles game stage
+]
+
+
+def load_stage(script):
+    """按文件路径导入阶段脚本（脚本名以数字开头，不能直接 import），同一脚本只导入一次"""
+    name = 'stage_' + os.path.splitext(script)[0].replace('.', '_')
+    module = sys.modules.get(name)
+    if module is None:
+        if BASE_DIR not in sys.path:
+            sys.path.insert(0, BASE_DIR)
+        spec = importlib.util.spec_from_file_location(name, os.path.join(BASE_DIR, script))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+def run_stage(stage):
+    print(f"Running {stage['script']}...")
+    start = time.perf_counter()
+    try:
+        getattr(load_stage(stage['script']), stage['entry'])()
+        status = 'finished'
+    except Exception:
+        traceback.print_exc()  # 单个阶段出错时记录下来，继续后面的阶段
+        status = 'failed'
+    pygame.event.clear()  # 上一阶段残留的点击/按键不带入下一阶段
+    print(f"{stage['script']} {status} in {time.perf_counter() - start:.1f}s")
+
+
+async def run_stage_async(stage):
+    print(f"Running {stage['script']}...")
+    start = time.perf_counter()
+    try:
+        await getattr(load_stage(stage['script']), stage['entry'] + '_async')()
+        status = 'finished'
+    except Exception:
+        traceback.print_exc()  # 单个阶段出错时记录下来，继续后面的阶段
+        status = 'failed'
+    await scene_loop.transition()  # 上一阶段残留的点击/按键不带入下一阶段
+    print(f"{stage['script']} {status} in {time.perf_counter() - start:.1f}s")
 
-# A simple function to run a Python script and wait for it to finish
-def run_script(script_name):
-    print(f"Running {script_name}...")
-    result = subprocess.run(['python', script_name], capture_output=True, text=True)
-    print(result.stdout)  # Optionally, print the output of the script
-    print(result.stderr)  # Optionally, print errors if any
 
 def main():
-    # List of scripts in the order they need to be executed
-    scripts = [
-        "main.py",  # First game (UI game)
-        "2.describeempty.py",  # Next step (describe empty)
-        "3.empty.py",  # Empty game stage
-        "4.describeobstacles.py",  # Next step (describe obstacles)
-        "5.obstacles.py",  # Obstacles game stage
-    ]
-
-    # Sequentially run each script
-    for script in scripts:
-        run_script(script)
-        time.sleep(1)  # Optional: Add a short delay between scripts
+    pygame.init()
+    # 进入第一帧之前导入全部阶段，阶段切换时不再有导入开销
+    for stage in STAGES:
+        load_stage(stage['script'])
+
+    # Sequentially run each stage in the same window
+    for stage in STAGES:
+        run_stage(stage)
+
+    get_writer().flush()  # 确保所有存档写完再退出
+    pygame.quit()
+
+
+async def main_async():
+    pygame.init()
+    for stage in STAGES:
+        load_stage(stage['script'])
+    for stage in STAGES:
+        await run_stage_async(stage)
+    await scene_loop.wait_writes()  # 存档任务全部写完再结束
+    pygame.quit()
 
 if __name__ == "__main__":
-    main()
+    if scene_loop.IS_WEB:
+        asyncio.run(main_async())
+    else:
+        main()
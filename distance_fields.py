@@ -0,0 +1,125 @@
+import hashlib
+import os
+from collections import deque
+from functools import lru_cache
+
+from occupancy import compile_obstacles
+
+
+# ================= 最短路距离场 =================
+# 距离场先查内存（LRU），再查磁盘缓存，都没有才做 BFS
+# 磁盘缓存按“网格大小 + 障碍物 + 是否阻挡”的内容哈希分目录，地图一改哈希就变，旧缓存自然失效
+UNREACHABLE = -1  # 无法到达的格子
+FIELD_VERSION = 1  # BFS 语义变化时递增，使旧的磁盘缓存全部失效
+CACHE_DIR = os.environ.get('MAP_DISTANCE_CACHE',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), 'distance_cache'))
+DISK_CACHE = True
+
+_stats = {'memory_hits': 0, 'disk_hits': 0, 'computed': 0}
+
+
+def bfs(grid, source, block_obstacles=True):
+    """四连通 BFS，返回长度 size*size 的列表，按 y*size+x 索引"""
+    size = grid.size
+    cells = grid.cells
+    dist = [UNREACHABLE] * (size * size)
+    sx, sy = source
+    if not grid.in_bounds(sx, sy):
+        return dist
+    dist[sy * size + sx] = 0
+    queue = deque([(sx, sy)])
+    while queue:
+        x, y = queue.popleft()
+        d = dist[y * size + x] + 1
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < size and 0 <= ny < size:
+                i = ny * size + nx
+                if dist[i] == UNREACHABLE and not (block_obstacles and cells[i]):
+                    dist[i] = d
+                    queue.append((nx, ny))
+    return dist
+
+
+def map_hash(size, obstacles, block_obstacles=True):
+    """地图内容哈希；障碍物顺序不影响结果"""
+    content = repr((FIELD_VERSION, size, sorted(tuple(o) for o in obstacles), bool(block_obstacles)))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+def _cache_file(key, source):
+    return os.path.join(CACHE_DIR, key, f"{source[0]}_{source[1]}.npy")
+
+
+def _load(filename):
+    import numpy as np
+    try:
+        return np.load(filename)
+    except (OSError, ValueError):
+        return None  # 不存在或写到一半的文件都当作未缓存
+
+
+def _save(filename, field):
+    """先写临时文件再改名，多个分析进程同时写同一个场也不会读到半截文件"""
+    import numpy as np
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    temp = f"{filename}.{os.getpid()}.tmp"
+    with open(temp, 'wb') as f:
+        np.save(f, field)
+    os.replace(temp, filename)
+
+
+@lru_cache(maxsize=256)
+def _field(size, obstacles, source, block_obstacles):
+    import numpy as np
+    key = map_hash(size, obstacles, block_obstacles)
+    field = _load(_cache_file(key, source)) if DISK_CACHE else None
+    if field is not None and field.shape == (size, size):
+        _stats['disk_hits'] += 1
+    else:
+        _stats['computed'] += 1
+        grid = compile_obstacles(obstacles, size)
+        field = np.array(bfs(grid, source, block_obstacles), dtype=np.int32).reshape(size, size)
+        if DISK_CACHE:
+            try:
+                _save(_cache_file(key, source), field)
+            except OSError as e:
+                print(f"距离场缓存写入失败: {e}")
+    field.setflags(write=False)  # 缓存共享，禁止调用方改写
+    return field
+
+
+def distance_field(game_map, source, block_obstacles=None):
+    """从任意格子 source 出发到每个格子的最短步数，(size, size) 数组按 [y, x] 索引
+    block_obstacles 缺省时按游戏规则（game_map.block_obstacles）"""
+    if block_obstacles is None:
+        block_obstacles = game_map.block_obstacles
+    hits = _field.cache_info().hits
+    field = _field(game_map.size, game_map.obstacles, tuple(source), block_obstacles)
+    _stats['memory_hits'] += _field.cache_info().hits - hits
+    return field
+
+
+def shortest_distance(game_map, source, target, block_obstacles=None):
+    """source 到 target 的最短步数，不可达时为 UNREACHABLE"""
+    return int(distance_field(game_map, target, block_obstacles)[source[1], source[0]])
+
+
+def goal_fields(game_map, block_obstacles=None):
+    """所有目标点的距离场叠成 (目标数, size, size) 数组，返回 (目标名列表, 数组)"""
+    import numpy as np
+    names = list(game_map.goals)
+    return names, np.stack([distance_field(game_map, game_map.points[name], block_obstacles) for name in names])
+
+
+def warm(game_map, block_obstacles=None):
+    """预先算好起点和所有目标点的距离场并写入磁盘，供之后的分析进程直接读取"""
+    for pos in game_map.points.values():
+        distance_field(game_map, pos, block_obstacles)
+
+
+def cache_info():
+    return dict(_stats, memory_size=_field.cache_info().currsize, cache_dir=CACHE_DIR)
+
+
+def clear_memory():
+    _field.cache_clear()
@@ -0,0 +1,195 @@
+import glob
+import os
+import struct
+import time
+from array import array
+from datetime import datetime
+
+from archive_writer import get_writer
+from trajectory import MAP_NAMES, archive_stem, unique_path
+
+
+# ================= 逐事件高精度日志 =================
+# 每个输入事件记录 perf_counter_ns 时间戳、事件类型和事件后的位置
+# 记录写进预先分配好的环形缓冲区，凑满一批后交给后台写入线程落盘，按键处理路径上没有 I/O
+# 文件 = 56 字节文件头（魔数 'MEVT'、版本、地图编号、开始时的 perf_counter_ns 与 time_ns、所属存档名主干）+ 14 字节记录
+# 开始时还不知道存档名：日志按 events_<地图>_<开始时间>.evlog 命名（已占用时加序号，从不覆盖），
+# 存档写出后由 link() 把存档名主干填进文件头预留的位置；版本 1 的文件头只有 24 字节，没有地图编号和存档名
+MAGIC = b'MEVT'
+SCHEMA_VERSION = 2
+HEADER = struct.Struct('<4sHHqq32s')
+HEADER_V1 = struct.Struct('<4sH2xqq')
+ARCHIVE_OFFSET = HEADER.size - 32  # 存档名主干在文件头中的位置（UTF-8，补 0）
+RECORD = struct.Struct('<qBxhh')  # 时间戳 ns、事件类型、x、y
+
+EVENT_LOG_CAPACITY = 4096  # 环形缓冲区容量（条）
+EVENT_LOG_BATCH = 512  # 每攒够这么多条就提交一次后台写入
+
+# 事件类型
+START = 1
+MOVE = 2
+UNDO = 3
+REJECT = 4  # 越界或撞障碍物，位置记录的是被拒绝的目标格
+PAUSE = 5
+RESUME = 6
+FINISH = 7
+EVENT_NAMES = {START: 'start', MOVE: 'move', UNDO: 'undo', REJECT: 'reject',
+               PAUSE: 'pause', RESUME: 'resume', FINISH: 'finish'}
+
+
+class EventLog:
+    """数组实现的环形缓冲区；未 open 文件时只在内存中保留最近 capacity 条"""
+
+    def __init__(self, capacity=EVENT_LOG_CAPACITY, batch=EVENT_LOG_BATCH, writer=None):
+        self.capacity = capacity
+        self.batch = min(batch, capacity)
+        self.times = array('q', bytes(8 * capacity))
+        self.kinds = array('B', bytes(capacity))
+        self.xs = array('h', bytes(2 * capacity))
+        self.ys = array('h', bytes(2 * capacity))
+        self.head = 0  # 已记录的总条数
+        self.flushed = 0  # 已提交写入的总条数
+        self.filename = None  # 正在写入的文件，close 后为 None
+        self.path = None  # 最近一次打开的文件，close 后仍保留，供 link() 使用
+        self.writer = writer or get_writer()
+
+    def open(self, filename, map_id=0):
+        """开始写入文件（文件名已被占用时加序号，不覆盖旧日志），返回实际文件名；之前缓冲区里的记录不写入"""
+        filename = unique_path(filename, taken=_opened)
+        _opened.add(filename)
+        self.filename = self.path = filename
+        self.flushed = self.head
+        self.writer.submit(self._write, filename, HEADER.pack(MAGIC, SCHEMA_VERSION, map_id, time.perf_counter_ns(),
+                                                             time.time_ns(), b''), 'xb')
+        return filename
+
+    def link(self, archive):
+        """把所属存档的文件名主干写进文件头；由 save_archive 在后台写入线程里直接调用（日志文件已由之前的任务建好），日志已关闭也可以"""
+        if self.path is None:
+            return
+        stem = archive_stem(archive).encode('utf-8')
+        if len(stem) > HEADER.size - ARCHIVE_OFFSET:
+            raise ValueError(f"存档名过长: {archive}")
+        self._write_at(self.path, ARCHIVE_OFFSET, stem.ljust(HEADER.size - ARCHIVE_OFFSET, b'\0'))
+
+    def record(self, kind, x, y):
+        i = self.head % self.capacity
+        self.times[i] = time.perf_counter_ns()
+        self.kinds[i] = kind
+        self.xs[i] = x
+        self.ys[i] = y
+        self.head += 1
+        if self.filename is not None and self.head - self.flushed >= self.batch:
+            self.flush()
+
+    def flush(self):
+        """把尚未写出的记录复制一份交给后台线程（每批一次复制）"""
+        if self.filename is None or self.head == self.flushed:
+            return
+        start, end = self.flushed, self.head
+        chunks = []
+        for lo, hi in self._spans(start, end):
+            chunks.append((self.times[lo:hi], self.kinds[lo:hi], self.xs[lo:hi], self.ys[lo:hi]))
+        self.flushed = end
+        self.writer.submit(self._write_records, self.filename, chunks)
+
+    def close(self):
+        self.flush()
+        self.filename = None
+
+    def recent(self, n=None):
+        """返回内存中最近的 n 条 (时间戳, 类型, x, y)，便于调试"""
+        n = min(self.head, self.capacity, n if n is not None else self.capacity)
+        return [(self.times[i % self.capacity], self.kinds[i % self.capacity],
+                 self.xs[i % self.capacity], self.ys[i % self.capacity])
+                for i in range(self.head - n, self.head)]
+
+    def _spans(self, start, end):
+        """把逻辑区间 [start, end) 映射到环形数组上的 1~2 段"""
+        lo, hi = start % self.capacity, end % self.capacity
+        if end - start >= self.capacity:
+            lo = hi  # 未及时 flush 时只能保留最近 capacity 条
+        if lo < hi:
+            return [(lo, hi)]
+        return [(lo, self.capacity), (0, hi)]
+
+    @staticmethod
+    def _write(filename, data, mode='ab'):
+        with open(filename, mode) as f:
+            f.write(data)
+
+    @staticmethod
+    def _write_at(filename, offset, data):
+        with open(filename, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+
+    @staticmethod
+    def _write_records(filename, chunks):
+        data = bytearray()
+        for times, kinds, xs, ys in chunks:
+            for record in zip(times, kinds, xs, ys):
+                data += RECORD.pack(*record)
+        with open(filename, 'ab') as f:
+            f.write(data)
+
+
+_opened = set()  # 本进程分配过的日志文件名：文件由后台线程创建，分配时可能还不存在
+
+
+def log_path(map_id, folder=''):
+    """新日志的文件名 events_<地图>_<开始时间>.evlog"""
+    return os.path.join(folder, f"events_{MAP_NAMES.get(map_id, 'unknown')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.evlog")
+
+
+# ================= 读取 =================
+def read_header(filename):
+    """文件头字典：version / map_id / t0_ns / wall_ns / archive（未关联存档时为 None）/ size（文件头字节数）"""
+    with open(filename, 'rb') as f:
+        raw = f.read(HEADER.size)
+    if len(raw) < HEADER_V1.size or raw[:4] != MAGIC:
+        raise ValueError(f"不是事件日志: {filename}")
+    version = struct.unpack_from('<H', raw, 4)[0]
+    if version == 1:
+        _, _, t0_ns, wall_ns = HEADER_V1.unpack_from(raw)
+        return {'version': 1, 'map_id': 0, 't0_ns': t0_ns, 'wall_ns': wall_ns, 'archive': None, 'size': HEADER_V1.size}
+    if version > SCHEMA_VERSION or len(raw) < HEADER.size:
+        raise ValueError(f"不支持的事件日志版本 {version}: {filename}")
+    _, _, map_id, t0_ns, wall_ns, archive = HEADER.unpack(raw)
+    archive = archive.rstrip(b'\0').decode('utf-8') or None
+    return {'version': version, 'map_id': map_id, 't0_ns': t0_ns, 'wall_ns': wall_ns, 'archive': archive, 'size': HEADER.size}
+
+
+def read_events(filename):
+    """读取事件日志，返回 (文件头字典, NumPy 结构化数组)；t_ns 减去文件头的 t0_ns 即相对开始的时间"""
+    import numpy as np
+    header = read_header(filename)
+    dtype = np.dtype([('t_ns', '<i8'), ('kind', 'u1'), ('pad', 'u1'), ('x', '<i2'), ('y', '<i2')])
+    count = (os.path.getsize(filename) - header['size']) // dtype.itemsize
+    with open(filename, 'rb') as f:
+        f.seek(header['size'])
+        events = np.fromfile(f, dtype=dtype, count=count)
+    return header, events
+
+
+def find_events(archive):
+    """存档旁记录了该存档的事件日志"""
+    stem = archive_stem(archive)
+    pattern = os.path.join(glob.escape(os.path.dirname(archive)), 'events_*.evlog')
+    found = []
+    for filename in sorted(glob.glob(pattern)):
+        try:
+            if read_header(filename)['archive'] == stem:
+                found.append(filename)
+        except (OSError, ValueError):
+            continue
+    return found
+
+
+if __name__ == "__main__":
+    import sys
+    for name in sys.argv[1:]:
+        header, events = read_events(name)
+        print(f"{name}: {len(events)} 条事件，地图 {MAP_NAMES.get(header['map_id'], 'unknown')}，存档 {header['archive']}")
+        for t_ns, kind, _, x, y in events:
+            print(f"{(t_ns - header['t0_ns']) / 1e6:10.3f} ms  {EVENT_NAMES.get(kind, kind):<7} ({x}, {y})")
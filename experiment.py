@@ -5,7 +5,19 @@ import os
 import math
 import json
 from pygame.locals import *
+import fonts
 from datetime import datetime
+from render_cache import shared_layer, DirtyRenderer, PathTracker, PathLayer, circle_rect
+from frame_timing import FrameTimer
+from occupancy import compile_obstacles
+import map_files
+from obstacle_index import merge_obstacles
+from idle import IdleScheduler
+from archive_writer import get_writer
+import scene_loop
+import event_log
+from trajectory import ARCHIVE_EXTENSIONS, MAP_IDS, image_path, save_sidecar, unique_path
+from regions import RegionMask, save_selection
 
 
 # ================= 公共字体配置 ================
@@ -18,7 +30,7 @@ else:
 
 FONT_PATH = os.path.join(base_path, "simhei.ttf")
 def get_font(size):
-    return pygame.font.Font(FONT_PATH, size)
+    return fonts.get_font(FONT_PATH, size)  # 全局字体注册表，文字渲染结果带 LRU 缓存
 
 # ================= 第一部分（路径规划实验）的配置 =================
 EXP_SCREEN_SIZE = (1920, 1080)  # 第一部分整体窗口尺寸
@@ -68,6 +80,8 @@ class ExperimentGame:
         self.font = get_font(20)
         self.current_pos = list(self.config['start'])
         self.path = [tuple(self.current_pos)]
+        self.path_layer = PathLayer((GAME_SIZE, GAME_SIZE), self.convert_coords, (0, 0, 0), 3)
+        self.occupancy = compile_obstacles(self.config['obstacles'], GRID_SIZE + 1)
         self.active = False
         self.finished = False
     def convert_coords(self, x, y):
@@ -90,14 +104,11 @@ class ExperimentGame:
         current_pos = self.convert_coords(*self.current_pos)
         pygame.draw.circle(self.game_surface, EXP_COLORS['current'], current_pos, 8)
     def draw_path(self):
-        if len(self.path) > 1:
-            points = [self.convert_coords(x, y) for x, y in self.path]
-            pygame.draw.lines(self.game_surface, (0, 0, 0), False, points, 3)
+        # 路径图层只补画新增线段，每帧开销与路径长度无关
+        self.path_layer.sync(self.path)
+        self.path_layer.draw(self.game_surface)
     def is_obstructed(self, x, y):
-        for ox, oy, w, h in self.config['obstacles']:
-            if ox <= x < ox + w and oy <= y < oy + h:
-                return True
-        return False
+        return self.occupancy.is_obstructed(x, y)
     def handle_input(self, events):
         if not self.active or self.finished:
             return
@@ -126,7 +137,7 @@ class ExperimentGame:
                 new_y = self.current_pos[1] + dy
                 if self.is_obstructed(new_x, new_y):
                     return
-                if not (0 <= new_x <= GRID_SIZE and 0 <= new_y <= GRID_SIZE):
+                if not self.occupancy.in_bounds(new_x, new_y):
                     return
                 self.current_pos = [new_x, new_y]
                 self.path.append(tuple(self.current_pos))
@@ -217,6 +228,13 @@ class ExperimentScene:
         ]
         self.current_page = 0
         self.running = True
+        self.idle = IdleScheduler()
+    def hover_state(self):
+        # 页码和两个按钮的悬停状态；空闲模式下只有它们变化才因鼠标移动重绘
+        mouse_pos = pygame.mouse.get_pos()
+        return (self.current_page,
+                pygame.Rect(1000, 700, 180, 60).collidepoint(mouse_pos),
+                pygame.Rect(1020, 700, 160, 60).collidepoint(mouse_pos))
     def process_input(self, events):
         for event in events:
             if event.type == QUIT:
@@ -255,12 +273,13 @@ class ExperimentScene:
                 else:
                     self.running = False
         pygame.display.flip()
-    def run(self):
-        while self.running:
-            events = pygame.event.get()
-            self.process_input(events)
+    def frame(self):
+        events = self.idle.poll()
+        self.process_input(events)
+        if self.idle.should_redraw(events, self.hover_state()):
             self.update(events)
-            self.clock.tick(30)
+    def run(self):
+        scene_loop.run(self)
 
 # ================= 第二部分（区域选择游戏）的配置 =================
 RS_SCREEN_SIZE = (1920, 1080)
@@ -283,24 +302,18 @@ RS_COLORS = {
     'selected': (169, 169, 169)
 }
 
-RS_POINTS = {
-    'start': (7, 42),
-    'close 1': (20, 18),
-    'close 2': (31, 29),
-    'far 1': (5, 1),
-    'far 2': (48, 44)
-}
+RS_POINTS = map_files.read_source('empty')['points']  # 与 3.empty.py 共用 map_data/empty.json
 
 class RegionSelectionGame:
     def __init__(self, parent_surface):
         self.screen = parent_surface
         self.clock = pygame.time.Clock()
         self.font = get_font(20)
-        self.selected_regions = []
+        self.selected_regions = RegionMask()
         self.finished = False  # 修改：通过 finished 标志退出循环
         self.reset_game()
     def reset_game(self):
-        self.selected_regions = []
+        self.selected_regions = RegionMask()
     def convert_coords(self, x, y):
         return (x * CELL_SIZE, (GRID_SIZE - y) * CELL_SIZE)
     def convert_region_coords(self, region_x, region_y):
@@ -338,6 +351,9 @@ class RegionSelectionGame:
         btn_text = self.font.render("确认", True, (255, 255, 255))
         text_rect = btn_text.get_rect(center=button_rect.center)
         self.screen.blit(btn_text, text_rect)
+    def hover_state(self):
+        button_rect = pygame.Rect(RS_GRID_WIDTH + 50, RS_SCREEN_SIZE[1] // 2 - 25, 100, 50)
+        return button_rect.collidepoint(pygame.mouse.get_pos())
     def draw_points(self):
         for point, (x, y) in RS_POINTS.items():
             pygame.draw.circle(self.screen, RS_COLORS[point],
@@ -356,10 +372,7 @@ class RegionSelectionGame:
                 elif x < RS_GRID_WIDTH and y < RS_GRID_WIDTH:
                     region_x = x // (REGION_SIZE * CELL_SIZE)
                     region_y = (RS_GRID_WIDTH - y - 1) // (REGION_SIZE * CELL_SIZE)
-                    if (region_x, region_y) in self.selected_regions:
-                        self.selected_regions.remove((region_x, region_y))
-                    else:
-                        self.selected_regions.append((region_x, region_y))
+                    self.selected_regions.toggle(region_x, region_y)
     def save_selected_regions(self):
         folder = "selected_regions"
         if not os.path.exists(folder):
@@ -371,8 +384,11 @@ class RegionSelectionGame:
         self.draw_points_on_surface(surface)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         image_path = os.path.join(folder, f"selected_regions_{timestamp}.png")
-        pygame.image.save(surface, image_path)
+        get_writer().submit(pygame.image.save, surface, image_path)
         print(f"保存成功: {image_path}")
+        # 同时保存位掩码数据，便于整批分析（regions.load_selections）
+        get_writer().submit(save_selection, os.path.join(folder, f"selected_regions_{timestamp}.json"),
+                            RegionMask(self.selected_regions.bits), 'maze', timestamp)
     def draw_grid_on_surface(self, surface):
         for i in range(GRID_SIZE + 1):
             pygame.draw.line(surface, RS_COLORS['grid'], (i * CELL_SIZE, 0), (i * CELL_SIZE, RS_GRID_WIDTH))
@@ -395,33 +411,35 @@ class RegionSelectionGame:
         self.draw_points()
         self.draw_control_panel()
         pygame.display.flip()
-        self.clock.tick(30)
 
 class RegionSelectionScene:
     def __init__(self, main_screen):
         self.main_screen = main_screen
         self.region_surface = pygame.Surface(RS_SCREEN_SIZE)
         self.game = RegionSelectionGame(self.region_surface)
-    def run(self):
-        finished = False
-        while not finished:
-            events = pygame.event.get()
-            self.game.handle_input(events)
+        self.idle = IdleScheduler()
+        self.clock = self.game.clock
+        self.running = True
+    def frame(self):
+        events = self.idle.poll()
+        self.game.handle_input(events)
+        if self.idle.should_redraw(events, self.game.hover_state()):
             self.game.update()
             self.main_screen.fill(RS_COLORS['background'])
             self.main_screen.blit(self.region_surface, (0, 0))
-            for event in events:
-                if event.type == QUIT:
-                    finished = True
             pygame.display.flip()
-            self.game.clock.tick(30)
-            if self.game.finished:
-                finished = True
+        if self.game.finished or any(event.type == QUIT for event in events):
+            self.running = False
+    def run(self):
+        scene_loop.run(self)
 
 # ================= 第三部分（路径迷宫游戏）的配置 =================
 PANEL_WIDTH = 500
 MAZE_WIDTH = GRID_SIZE * CELL_SIZE + PANEL_WIDTH  
 MAZE_HEIGHT = GRID_SIZE * CELL_SIZE  
+DIRTY_RENDERING = True  # 路径游戏缓存静态图层，每帧只重绘变化的区域
+INFO_RECT = (0, 0, 200, 60)  # 左上角转弯次数/暂停提示区域
+FINISH_SCREEN_MS = 2000  # 完成提示显示时长，按任意键可提前结束
 
 MAZE_COLORS = {
     'background': (255, 255, 255),
@@ -438,13 +456,8 @@ MAZE_COLORS = {
     'far 2': (0, 0, 0)
 }
 
-MAZE_POINTS = {
-    'start': (7, 42),
-    'close 1': (20, 18),
-    'close 2': (31, 29),
-    'far 1': (5, 1),
-    'far 2': (48, 44)
-}
+MAZE_MAP = 'empty'
+MAZE_POINTS = map_files.read_source(MAZE_MAP)['points']
 
 class MazeGame:
     def __init__(self):
@@ -452,6 +465,17 @@ class MazeGame:
         pygame.display.set_caption("路径迷宫")
         self.clock = pygame.time.Clock()
         self.font = get_font(20)
+        self.dirty_rendering = DIRTY_RENDERING
+        self.compiled_map = map_files.load(MAZE_MAP, CELL_SIZE, MAZE_COLORS, (MAZE_WIDTH, MAZE_HEIGHT), 6)
+        self.background = shared_layer('maze.background', (MAZE_WIDTH, MAZE_HEIGHT), self.draw_static)
+        self.renderer = DirtyRenderer(self.screen, self.background)
+        self.path_tracker = PathTracker()
+        self.idle = IdleScheduler()
+        self.archive_writer = get_writer()
+        self.event_log = event_log.EventLog(writer=self.archive_writer)  # 逐事件高精度日志
+        self.frame_timer = FrameTimer()  # F3 显示分阶段帧耗时
+        self.path_layer = PathLayer((MAZE_WIDTH, MAZE_HEIGHT), self.convert_coords, MAZE_COLORS['path'], 2)
+        self.occupancy = self.compiled_map.occupancy  # 空地图，只用于越界检查
         self.reset_game()
     def reset_game(self):
         self.current_pos = list(MAZE_POINTS['start'])
@@ -464,26 +488,39 @@ class MazeGame:
         self.game_started = False
         self.previous_direction = None
         self.turn_times = []
+        self.step_times = [0]  # 每一步相对开始的毫秒数，与 path 一一对应
         self.pause_start = 0
+        self.last_info = None
+        self.last_panel = None
+        self.finish_message = None
+        self.finish_deadline = 0
+        self.renderer.invalidate()
     def convert_coords(self, x, y):
         return (x * CELL_SIZE, (GRID_SIZE - y) * CELL_SIZE)
-    def draw_grid(self):
+    def draw_grid(self, surface=None):
+        surface = surface or self.screen
         for i in range(GRID_SIZE + 1):
-            pygame.draw.line(self.screen, MAZE_COLORS['grid'],
+            pygame.draw.line(surface, MAZE_COLORS['grid'],
                              (i * CELL_SIZE, 0), (i * CELL_SIZE, MAZE_HEIGHT))
-            pygame.draw.line(self.screen, MAZE_COLORS['grid'],
+            pygame.draw.line(surface, MAZE_COLORS['grid'],
                              (0, i * CELL_SIZE), (MAZE_WIDTH, i * CELL_SIZE))
-    def draw_points(self):
+    def draw_static(self, surface):
+        surface.blit(self.compiled_map.layer(), (0, 0))  # 编译地图里预渲染好的网格和关键点
+    def draw_key_points(self, surface=None):
+        surface = surface or self.screen
         for name, (x, y) in MAZE_POINTS.items():
             pos = self.convert_coords(x, y)
             color = MAZE_COLORS.get(name, (0, 0, 0))
-            pygame.draw.circle(self.screen, color, pos, 6)
-        pygame.draw.circle(self.screen, MAZE_COLORS['current'],
-                           self.convert_coords(*self.current_pos), 6)
+            pygame.draw.circle(surface, color, pos, 6)
+    def draw_current(self):
+        return pygame.draw.circle(self.screen, MAZE_COLORS['current'],
+                                  self.convert_coords(*self.current_pos), 6)
+    def draw_points(self):
+        self.draw_key_points()
+        self.draw_current()
     def draw_path(self):
-        if len(self.path) > 1:
-            points = [self.convert_coords(x, y) for x, y in self.path]
-            pygame.draw.lines(self.screen, MAZE_COLORS['path'], False, points, 2)
+        self.path_layer.sync(self.path)
+        self.path_layer.draw(self.screen)
     def calculate_angle(self, p1, p2, p3):
         v1 = (p1[0] - p2[0], p1[1] - p2[1])
         v2 = (p3[0] - p2[0], p3[1] - p2[1])
@@ -492,8 +529,8 @@ class MazeGame:
         magnitude_v2 = math.sqrt(v2[0]**2 + v2[1]**2)
         cos_angle = dot_product / (magnitude_v1 * magnitude_v2)
         return math.degrees(math.acos(cos_angle))
-    def handle_input(self):
-        for event in pygame.event.get():
+    def handle_input(self, events=None):
+        for event in (pygame.event.get() if events is None else events):
             if event.type == QUIT:
                 self.running = False
             if event.type == MOUSEBUTTONDOWN and not self.game_started:
@@ -502,18 +539,24 @@ class MazeGame:
                     MAZE_HEIGHT//2 - 25 < event.pos[1] < MAZE_HEIGHT//2 + 25):
                     self.game_started = True
                     self.start_time = time.time()
+                    self.event_log.open(event_log.log_path(MAP_IDS['maze'], os.path.dirname(os.path.abspath(__file__))), MAP_IDS['maze'])
+                    self.event_log.record(event_log.START, *self.current_pos)
             if event.type == KEYDOWN:
                 if self.game_started and event.key == K_ESCAPE:
                     if not self.paused:
                         self.pause_start = time.time()
+                        self.event_log.record(event_log.PAUSE, *self.current_pos)
                     else:
                         self.start_time += time.time() - self.pause_start
+                        self.event_log.record(event_log.RESUME, *self.current_pos)
                     self.paused = not self.paused
                 if self.game_started and not self.paused and not self.finished:
                     if event.key == K_BACKSPACE:
                         if len(self.path) > 1:
                             self.path.pop()
+                            self.step_times.pop()
                             self.current_pos = list(self.path[-1])
+                            self.event_log.record(event_log.UNDO, *self.current_pos)
                     dx, dy = 0, 0
                     if event.key == K_UP: dy = 1
                     elif event.key == K_DOWN: dy = -1
@@ -523,9 +566,8 @@ class MazeGame:
                         return
                     new_x = self.current_pos[0] + dx
                     new_y = self.current_pos[1] + dy
-                    if not (0 <= new_x <= GRID_SIZE and 0 <= new_y <= GRID_SIZE):
-                        return
-                    if abs(new_x - self.current_pos[0]) + abs(new_y - self.current_pos[1]) != 1:
+                    if not self.occupancy.is_valid_move(self.current_pos, (new_x, new_y)):
+                        self.event_log.record(event_log.REJECT, new_x, new_y)  # 记录被拒绝的目标格
                         return
                     if len(self.path) > 1:
                         angle = self.calculate_angle(self.path[-2], self.path[-1], (new_x, new_y))
@@ -535,6 +577,8 @@ class MazeGame:
                             self.turn_times.append((self.turn_count, round(elapsed_time, 1)))
                     self.current_pos = [new_x, new_y]
                     self.path.append(tuple(self.current_pos))
+                    self.step_times.append(int((time.time() - self.start_time) * 1000))
+                    self.event_log.record(event_log.MOVE, *self.current_pos)
                     self.previous_direction = (dx, dy)
     def check_finish(self):
         current = tuple(self.current_pos)
@@ -552,7 +596,8 @@ class MazeGame:
                 "steps": len(self.path) - 1,
                 "turns": self.turn_count
             },
-            "path": self.path,
+            "path": list(self.path),
+            "step_times": list(self.step_times),
             "turn_events": [{"turn": t[0], "time": t[1]} for t in self.turn_times]
         }
     def save_archive(self, archive_data):
@@ -566,13 +611,15 @@ class MazeGame:
             'Total Turns': [archive_data['meta']['turns']]
         }
         df_summary = pd.DataFrame(summary_data)
-        excel_filename = os.path.join(current_directory, f"archive_{archive_data['meta']['timestamp']}.xlsx")
+        excel_filename = unique_path(os.path.join(current_directory, f"archive_{archive_data['meta']['timestamp']}.xlsx"), ARCHIVE_EXTENSIONS)
         with pd.ExcelWriter(excel_filename) as writer:
             df_summary.to_excel(writer, sheet_name="Summary", index=False)
             df_path.to_excel(writer, sheet_name="Path", index=False)
             df_turns.to_excel(writer, sheet_name="Turns", index=False)
-        self.save_path_image(archive_data['meta']['timestamp'])
-    def save_path_image(self, timestamp):
+        save_sidecar(excel_filename, archive_data["path"], archive_data["step_times"], MAP_IDS['maze'], archive_data["path"][-1])
+        self.event_log.link(excel_filename)  # 事件日志文件头记下所属存档
+        self.save_path_image(image_path(excel_filename))
+    def save_path_image(self, filename):
         surface = pygame.Surface((MAZE_WIDTH, MAZE_HEIGHT))
         surface.fill(MAZE_COLORS['background'])
         for i in range(GRID_SIZE + 1):
@@ -591,8 +638,7 @@ class MazeGame:
                 if idx < len(points):
                     pygame.draw.circle(surface, color, points[idx], 6)
 
-        path_image_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"path_{timestamp}.png")
-        pygame.image.save(surface, path_image_filename)
+        pygame.image.save(surface, filename)
     def draw_control_panel(self):
         panel_x = GRID_SIZE * CELL_SIZE
         pygame.draw.rect(self.screen, (240, 240, 240), (panel_x, 0, PANEL_WIDTH, MAZE_HEIGHT))
@@ -614,32 +660,97 @@ class MazeGame:
         pygame.draw.rect(self.screen, btn_color, button_rect, border_radius=5)
         btn_text = self.font.render("开始游戏" if not self.game_started else "进行中", True, (255,255,255))
         self.screen.blit(btn_text, (panel_x + 65, MAZE_HEIGHT//2 - 10))
-    def run(self):
-        while self.running:
-            self.screen.fill(MAZE_COLORS['background'])
-            self.handle_input()
-            self.draw_grid()
-            self.draw_points()
+    def info_texts(self):
+        if not self.game_started:
+            return []
+        return [
+            f"转弯次数: {self.turn_count}",
+            "暂停中" if self.paused else ""
+        ]
+    def draw_info(self):
+        for i, text in enumerate(self.info_texts()):
+            if text:
+                text_surface = self.font.render(text, True, (0,0,0))
+                self.screen.blit(text_surface, (10, 10 + i*25))
+    def render_full(self):
+        self.screen.fill(MAZE_COLORS['background'])
+        self.draw_grid()
+        self.draw_points()
+        self.draw_path()
+        self.draw_control_panel()
+        self.draw_info()
+    def render_dirty(self):
+        # 脏矩形模式：背景取自缓存图层，只重绘光标、路径末段、文字和面板中变化的部分
+        renderer = self.renderer
+        info = self.info_texts()
+        panel_x = GRID_SIZE * CELL_SIZE
+        panel = self.panel_state()
+        changed = self.path_tracker.changes(self.path)
+        if renderer.full_redraw or changed is None:
+            renderer.invalidate()
+            renderer.reset()
             self.draw_path()
             self.draw_control_panel()
-            if self.game_started:
-                info_texts = [
-                    f"转弯次数: {self.turn_count}",
-                    "暂停中" if self.paused else ""
-                ]
-                for i, text in enumerate(info_texts):
-                    if text:
-                        text_surface = self.font.render(text, True, (0,0,0))
-                        self.screen.blit(text_surface, (10, 10 + i*25))
-            if self.game_started and not self.paused and (result := self.check_finish()):
-                finish_text = self.font.render(f"到达 {result}！", True, (0,0,255))
-                self.screen.blit(finish_text, (MAZE_WIDTH//2 - 50, MAZE_HEIGHT//2))
-                archive_data = self.generate_archive()
-                self.save_archive(archive_data)
-                pygame.time.wait(2000)
-                self.running = False
+            self.draw_info()
+        else:
+            if changed:
+                area = circle_rect(self.convert_coords(*changed[0]), 6)
+                for point in changed[1:]:
+                    area.union_ip(circle_rect(self.convert_coords(*point), 6))
+                renderer.restore(area, self.draw_path)
+            if info != self.last_info:
+                renderer.restore(INFO_RECT, self.draw_path)
+                self.draw_info()
+            if panel != self.last_panel:
+                self.draw_control_panel()
+                renderer.mark((panel_x, 0, PANEL_WIDTH, MAZE_HEIGHT))
+        renderer.mark(self.draw_current())
+        self.last_info = info
+        self.last_panel = panel
+    def panel_state(self):
+        panel_x = GRID_SIZE * CELL_SIZE
+        button_rect = pygame.Rect(panel_x + 50, MAZE_HEIGHT//2 - 25, 100, 50)
+        return (button_rect.collidepoint(pygame.mouse.get_pos()), self.game_started)
+    def frame(self):
+        events = self.idle.poll()
+        if self.frame_timer.handle(self, events):
+            self.renderer.invalidate()  # 叠加层显示/隐藏后整屏重绘一次
+        self.handle_input(events)
+        if not self.idle.should_redraw(events, self.panel_state()):
+            return
+        if self.dirty_rendering:
+            self.render_dirty()
+        else:
+            self.render_full()
+        if self.finish_message and (pygame.time.get_ticks() >= self.finish_deadline or
+                                    any(e.type in (KEYDOWN, MOUSEBUTTONDOWN) for e in events)):
+            self.running = False
+        if not self.finish_message and self.game_started and not self.paused and (result := self.check_finish()):
+            # 存档和路径图交给后台线程写入，完成提示期间主循环照常运行
+            self.finish_message = f"到达 {result}！"
+            self.finish_deadline = pygame.time.get_ticks() + FINISH_SCREEN_MS
+            self.archive_writer.submit(self.save_archive, self.generate_archive())
+            self.event_log.record(event_log.FINISH, *self.current_pos)
+            self.event_log.close()
+        if self.finish_message:
+            finish_text = self.font.render(self.finish_message, True, (0,0,255))
+            self.renderer.mark(self.screen.blit(finish_text, (MAZE_WIDTH//2 - 50, MAZE_HEIGHT//2)))
+            self.idle.request_redraw()
+        if self.frame_timer.overlay:
+            self.renderer.mark(self.frame_timer.draw(self.screen))
+            self.idle.request_redraw()
+        self.present()
+    def present(self):
+        """把本帧送上屏幕：脏矩形模式只更新变化的区域"""
+        if self.dirty_rendering:
+            self.renderer.present()
+        else:
             pygame.display.flip()
-            self.clock.tick(30)
+    def close(self):
+        self.event_log.close()  # 中途退出时也写出缓冲区里剩余的事件
+        self.frame_timer.close()  # 恢复被计时包装的方法，有样本时写出 CSV
+    def run(self):
+        scene_loop.run(self)
         # 退出当前部分，返回主程序
 
 # ================= 第四部分（迷宫路径-完整障碍物版）的配置 =================
@@ -665,55 +776,11 @@ F4_COLORS = {
     'selected': (169, 169, 169)
 }
 
-F4_POINTS = {
-    'start': (7, 42),
-    'close1': (20, 18),
-    'close2': (31, 29),
-    'far1': (5, 1),
-    'far2': (48, 44)
-}
-
-F4_ORIGINAL_OBSTACLES = [
-    (9, 9, 8, 1),
-    (8, 8, 12, 1),
-    (10, 10, 6, 1),
-    (11, 7, 4, 1),
-    (14, 25, 6, 1),
-    (13, 24, 5, 1),
-    (15, 26, 3, 1),
-    (10, 23, 7, 1),
-    (24, 15, 5, 1),
-    (27, 14, 2, 1),
-    (23, 16, 6, 1),
-    (3, 31, 6, 1),
-    (4, 32, 4, 1),
-    (5, 30, 3, 1),
-    (44, 9, 5, 1),
-    (43, 10, 3, 1),
-    (45, 8, 4, 1),
-]
-
-F4_MIRRORED_OBSTACLES = [
-    (39, 32, 1, 8),
-    (40, 29, 1, 12),
-    (38, 33, 1, 6),
-    (41, 34, 1, 4),
-    (23, 29, 1, 6),
-    (24, 31, 1, 5),
-    (22, 31, 1, 3),
-    (25, 32, 1, 7),
-    (33, 20, 1, 5),
-    (34, 20, 1, 2),
-    (32, 20, 1, 6),
-    (17, 40, 1, 6),
-    (16, 41, 1, 4),
-    (18, 41, 1, 3),
-    (39, 0, 1, 5),
-    (38, 3, 1, 3),
-    (40, 0, 1, 4),
-]
-
-F4_ALL_OBSTACLES = F4_ORIGINAL_OBSTACLES + F4_MIRRORED_OBSTACLES
+# 第四、五阶段与 5.obstacles.py 共用 map_data/obstacles.json
+F4_MAP_SOURCE = map_files.read_source('obstacles')
+F4_POINTS = F4_MAP_SOURCE['points']
+F4_ALL_OBSTACLES = F4_MAP_SOURCE['obstacles']
+F4_MERGED_OBSTACLES = merge_obstacles(F4_ALL_OBSTACLES, F4_GRID_SIZE)  # 每帧逐个绘制，先合并成尽量少的矩形
 
 class FullMazeGame:
     def __init__(self):
@@ -721,6 +788,8 @@ class FullMazeGame:
         pygame.display.set_caption("迷宫路径-完整障碍物版")
         self.clock = pygame.time.Clock()
         self.font = get_font(20)
+        self.path_layer = PathLayer((F4_WIDTH, F4_HEIGHT), self.convert_coords, (0, 0, 0), 3)
+        self.idle = IdleScheduler()
         self.reset_game()
     def reset_game(self):
         self.current_pos = list(F4_POINTS['start'])
@@ -734,7 +803,7 @@ class FullMazeGame:
         self.previous_direction = None
         self.turn_times = []
         self.pause_start = 0
-        self.selected_regions = []
+        self.selected_regions = RegionMask()
     def convert_coords(self, x, y):
         return (x * F4_CELL_SIZE, (F4_GRID_SIZE - y) * F4_CELL_SIZE)
     def convert_region_coords(self, region_x, region_y):
@@ -748,7 +817,7 @@ class FullMazeGame:
             pygame.draw.line(self.screen, F4_COLORS['grid'],
                              (0, i * F4_CELL_SIZE), (F4_WIDTH, i * F4_CELL_SIZE))
     def draw_obstacles(self):
-        for obstacle in F4_ALL_OBSTACLES:
+        for obstacle in F4_MERGED_OBSTACLES:
             ox, oy, ow, oh = obstacle
             screen_x = ox * F4_CELL_SIZE
             screen_y = (F4_GRID_SIZE - oy - oh) * F4_CELL_SIZE
@@ -773,9 +842,8 @@ class FullMazeGame:
         pygame.draw.circle(self.screen, F4_COLORS['current'],
                            self.convert_coords(*self.current_pos), 8)
     def draw_path(self):
-        if len(self.path) > 1:
-            points = [self.convert_coords(x, y) for x, y in self.path]
-            pygame.draw.lines(self.screen, (0, 0, 0), False, points, 3)
+        self.path_layer.sync(self.path)
+        self.path_layer.draw(self.screen)
     def draw_control_panel(self):
         panel_x = F4_GRID_SIZE * F4_CELL_SIZE
         pygame.draw.rect(self.screen, (240, 240, 240), (panel_x, 0, F4_PANEL_WIDTH, F4_HEIGHT))
@@ -801,7 +869,7 @@ class FullMazeGame:
             pygame.draw.line(surface, F4_COLORS['grid'], (i * F4_CELL_SIZE, 0), (i * F4_CELL_SIZE, F4_HEIGHT))
             pygame.draw.line(surface, F4_COLORS['grid'], (0, i * F4_CELL_SIZE), (F4_GRID_SIZE * F4_CELL_SIZE, i * F4_CELL_SIZE))
     def draw_obstacles_on_surface(self, surface):
-        for obstacle in F4_ALL_OBSTACLES:
+        for obstacle in F4_MERGED_OBSTACLES:
             ox, oy, ow, oh = obstacle
             screen_x = ox * F4_CELL_SIZE
             screen_y = (F4_GRID_SIZE - oy - oh) * F4_CELL_SIZE
@@ -840,10 +908,13 @@ class FullMazeGame:
         self.draw_points_on_surface(surface)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         image_path = os.path.join(folder, f"selected_regions_{timestamp}.png")
-        pygame.image.save(surface, image_path)
+        get_writer().submit(pygame.image.save, surface, image_path)
         print(f"保存成功: {image_path}")
-    def handle_input(self):
-        for event in pygame.event.get():
+        # 同时保存位掩码数据，便于整批分析（regions.load_selections）
+        get_writer().submit(save_selection, os.path.join(folder, f"selected_regions_{timestamp}.json"),
+                            RegionMask(self.selected_regions.bits), 'full_maze', timestamp)
+    def handle_input(self, events=None):
+        for event in (pygame.event.get() if events is None else events):
             if event.type == QUIT:
                 self.running = False
             if event.type == MOUSEBUTTONDOWN:
@@ -856,10 +927,7 @@ class FullMazeGame:
                 elif x < F4_GRID_SIZE * F4_CELL_SIZE and y < F4_HEIGHT:
                     region_x = x // (F4_REGION_SIZE * F4_CELL_SIZE)
                     region_y = (F4_HEIGHT - y - 1) // (F4_REGION_SIZE * F4_CELL_SIZE)
-                    if (region_x, region_y) in self.selected_regions:
-                        self.selected_regions.remove((region_x, region_y))
-                    else:
-                        self.selected_regions.append((region_x, region_y))
+                    self.selected_regions.toggle(region_x, region_y)
     def update(self):
         self.screen.fill(F4_COLORS['background'])
         self.draw_grid()
@@ -868,12 +936,17 @@ class FullMazeGame:
         self.draw_points()
         self.draw_control_panel()
         pygame.display.flip()
-        self.clock.tick(30)
-    def run(self):
-        while self.running:
-            self.handle_input()
+    def hover_state(self):
+        panel_x = F4_GRID_SIZE * F4_CELL_SIZE
+        button_rect = pygame.Rect(panel_x + 50, F4_HEIGHT // 2 - 25, 100, 50)
+        return button_rect.collidepoint(pygame.mouse.get_pos())
+    def frame(self):
+        events = self.idle.poll()
+        self.handle_input(events)
+        if self.idle.should_redraw(events, self.hover_state()):
             self.update()
-            self.clock.tick(30)
+    def run(self):
+        scene_loop.run(self)
         # 退出当前部分后返回主程序
 
 # ================= 第五部分（迷宫路径-完整障碍物版）的配置 =================
@@ -897,55 +970,11 @@ F5_COLORS = {
     'current': (255, 0, 0)
 }
 
-F5_POINTS = {
-    'start': (7, 42),
-    'close1': (20, 18),
-    'close2': (31, 29),
-    'far1': (5, 1),
-    'far2': (48, 44)
-}
-
-F5_ORIGINAL_OBSTACLES = [
-    (9, 9, 8, 1),
-    (8, 8, 12, 1),
-    (10, 10, 6, 1),
-    (11, 7, 4, 1),
-    (14, 25, 6, 1),
-    (13, 24, 5, 1),
-    (15, 26, 3, 1),
-    (10, 23, 7, 1),
-    (24, 15, 5, 1),
-    (27, 14, 2, 1),
-    (23, 16, 6, 1),
-    (3, 31, 6, 1),
-    (4, 32, 4, 1), 
-    (5, 30, 3, 1),
-    (44, 9, 5, 1),
-    (43, 10, 3, 1),
-    (45, 8, 4, 1),
-]
-
-F5_MIRRORED_OBSTACLES = [
-    (39, 32, 1, 8),
-    (40, 29, 1, 12),
-    (38, 33, 1, 6),
-    (41, 34, 1, 4),
-    (23, 29, 1, 6),
-    (24, 31, 1, 5),
-    (22, 31, 1, 3),
-    (25, 32, 1, 7),
-    (33, 20, 1, 5),
-    (34, 20, 1, 2),
-    (32, 20, 1, 6),
-    (17, 40, 1, 6),
-    (16, 41, 1, 4),
-    (18, 41, 1, 3),
-    (39, 0, 1, 5),
-    (38, 3, 1, 3),
-    (40, 0, 1, 4),
-]
-
-F5_ALL_OBSTACLES = F5_ORIGINAL_OBSTACLES + F5_MIRRORED_OBSTACLES
+F5_MAP = 'obstacles'
+F5_MAP_SOURCE = map_files.read_source(F5_MAP)
+F5_POINTS = F5_MAP_SOURCE['points']
+F5_ALL_OBSTACLES = F5_MAP_SOURCE['obstacles']
+F5_BLOCK_OBSTACLES = False  # True 时禁止走进障碍物；默认沿用原实验设置，允许穿过
 
 class FifthGame:
     def __init__(self):
@@ -953,6 +982,17 @@ class FifthGame:
         pygame.display.set_caption("迷宫路径-完整障碍物版 (第五部分)")
         self.clock = pygame.time.Clock()
         self.font = get_font(20)
+        self.dirty_rendering = DIRTY_RENDERING
+        self.compiled_map = map_files.load(F5_MAP, F5_CELL_SIZE, F5_COLORS, (F5_WIDTH, F5_HEIGHT), 8)
+        self.background = shared_layer('fifth.background', (F5_WIDTH, F5_HEIGHT), self.draw_static)
+        self.renderer = DirtyRenderer(self.screen, self.background)
+        self.path_tracker = PathTracker()
+        self.idle = IdleScheduler()
+        self.archive_writer = get_writer()
+        self.event_log = event_log.EventLog(writer=self.archive_writer)  # 逐事件高精度日志
+        self.frame_timer = FrameTimer()  # F3 显示分阶段帧耗时
+        self.path_layer = PathLayer((F5_WIDTH, F5_HEIGHT), self.convert_coords, (0, 0, 0), 3)
+        self.occupancy = self.compiled_map.occupancy
         self.reset_game()
     def reset_game(self):
         self.current_pos = list(F5_POINTS['start'])
@@ -965,42 +1005,52 @@ class FifthGame:
         self.game_started = False
         self.previous_direction = None
         self.turn_times = []
+        self.step_times = [0]  # 每一步相对开始的毫秒数，与 path 一一对应
         self.pause_start = 0
+        self.last_info = None
+        self.last_panel = None
+        self.finish_message = None
+        self.finish_deadline = 0
+        self.renderer.invalidate()
     def convert_coords(self, x, y):
         return (x * F5_CELL_SIZE, (F5_GRID_SIZE - y) * F5_CELL_SIZE)
-    def draw_grid(self):
+    def draw_grid(self, surface=None):
+        surface = surface or self.screen
         for i in range(F5_GRID_SIZE + 1):
-            pygame.draw.line(self.screen, F5_COLORS['grid'],
+            pygame.draw.line(surface, F5_COLORS['grid'],
                              (i * F5_CELL_SIZE, 0), (i * F5_CELL_SIZE, F5_HEIGHT))
-            pygame.draw.line(self.screen, F5_COLORS['grid'],
+            pygame.draw.line(surface, F5_COLORS['grid'],
                              (0, i * F5_CELL_SIZE), (F5_WIDTH, i * F5_CELL_SIZE))
-    def draw_obstacles(self):
-        for obstacle in F5_ALL_OBSTACLES:
+    def draw_obstacles(self, surface=None):
+        surface = surface or self.screen
+        for obstacle in self.compiled_map.rectangles:  # 合并后的障碍物矩形
             ox, oy, ow, oh = obstacle
             screen_x = ox * F5_CELL_SIZE
             screen_y = (F5_GRID_SIZE - oy - oh) * F5_CELL_SIZE
             width = ow * F5_CELL_SIZE
             height = oh * F5_CELL_SIZE
-            pygame.draw.rect(self.screen, F5_COLORS['obstacle'],
+            pygame.draw.rect(surface, F5_COLORS['obstacle'],
                              (screen_x, screen_y, width, height))
-    def draw_points(self):
-        self.draw_obstacles()
+    def draw_static(self, surface):
+        surface.blit(self.compiled_map.layer(), (0, 0))  # 编译地图里预渲染好的网格、障碍物和关键点
+    def draw_key_points(self, surface=None):
+        surface = surface or self.screen
         for name, (x, y) in F5_POINTS.items():
             pos = self.convert_coords(x, y)
             color = F5_COLORS.get(name, (0, 0, 0))
-            pygame.draw.circle(self.screen, color, pos, 8)
-        pygame.draw.circle(self.screen, F5_COLORS['current'],
-                           self.convert_coords(*self.current_pos), 8)
+            pygame.draw.circle(surface, color, pos, 8)
+    def draw_current(self):
+        return pygame.draw.circle(self.screen, F5_COLORS['current'],
+                                  self.convert_coords(*self.current_pos), 8)
+    def draw_points(self):
+        self.draw_obstacles()
+        self.draw_key_points()
+        self.draw_current()
     def draw_path(self):
-        if len(self.path) > 1:
-            points = [self.convert_coords(x, y) for x, y in self.path]
-            pygame.draw.lines(self.screen, (0, 0, 0), False, points, 3)
+        self.path_layer.sync(self.path)
+        self.path_layer.draw(self.screen)
     def is_valid_move(self, new_x, new_y):
-        if not (0 <= new_x < F5_GRID_SIZE and 0 <= new_y < F5_GRID_SIZE):
-            return False
-        if abs(new_x - self.current_pos[0]) + abs(new_y - self.current_pos[1]) != 1:
-            return False
-        return True
+        return self.occupancy.is_valid_move(self.current_pos, (new_x, new_y), F5_BLOCK_OBSTACLES)
     def calculate_angle(self, p1, p2, p3):
         v1 = (p1[0] - p2[0], p1[1] - p2[1])
         v2 = (p3[0] - p2[0], p3[1] - p2[1])
@@ -1009,8 +1059,8 @@ class FifthGame:
         magnitude_v2 = math.sqrt(v2[0]**2 + v2[1]**2)
         cos_angle = dot_product / (magnitude_v1 * magnitude_v2)
         return math.degrees(math.acos(cos_angle))
-    def handle_input(self):
-        for event in pygame.event.get():
+    def handle_input(self, events=None):
+        for event in (pygame.event.get() if events is None else events):
             if event.type == QUIT:
                 self.running = False
             if event.type == MOUSEBUTTONDOWN and not self.game_started:
@@ -1019,18 +1069,24 @@ class FifthGame:
                     F5_HEIGHT//2 - 25 < event.pos[1] < F5_HEIGHT//2 + 25):
                     self.game_started = True
                     self.start_time = time.time()
+                    self.event_log.open(event_log.log_path(MAP_IDS['fifth'], os.path.dirname(os.path.abspath(__file__))), MAP_IDS['fifth'])
+                    self.event_log.record(event_log.START, *self.current_pos)
             if event.type == KEYDOWN:
                 if self.game_started and event.key == K_ESCAPE:
                     if not self.paused:
                         self.pause_start = time.time()
+                        self.event_log.record(event_log.PAUSE, *self.current_pos)
                     else:
                         self.start_time += time.time() - self.pause_start
+                        self.event_log.record(event_log.RESUME, *self.current_pos)
                     self.paused = not self.paused
                 if self.game_started and not self.paused and not self.finished:
                     if event.key == K_BACKSPACE:
                         if len(self.path) > 1:
                             self.path.pop()
+                            self.step_times.pop()
                             self.current_pos = list(self.path[-1])
+                            self.event_log.record(event_log.UNDO, *self.current_pos)
                     dx, dy = 0, 0
                     if event.key == K_UP: dy = 1
                     elif event.key == K_DOWN: dy = -1
@@ -1041,6 +1097,7 @@ class FifthGame:
                     new_x = self.current_pos[0] + dx
                     new_y = self.current_pos[1] + dy
                     if not self.is_valid_move(new_x, new_y):
+                        self.event_log.record(event_log.REJECT, new_x, new_y)  # 记录被拒绝的目标格
                         return
                     if len(self.path) > 1:
                         angle = self.calculate_angle(self.path[-2], self.path[-1], (new_x, new_y))
@@ -1050,6 +1107,8 @@ class FifthGame:
                             self.turn_times.append((self.turn_count, round(elapsed_time, 1)))
                     self.current_pos = [new_x, new_y]
                     self.path.append(tuple(self.current_pos))
+                    self.step_times.append(int((time.time() - self.start_time) * 1000))
+                    self.event_log.record(event_log.MOVE, *self.current_pos)
                     self.previous_direction = (dx, dy)
     def check_finish(self):
         current = tuple(self.current_pos)
@@ -1066,7 +1125,8 @@ class FifthGame:
                 "steps": len(self.path) - 1,
                 "turns": self.turn_count
             },
-            "path": self.path,
+            "path": list(self.path),
+            "step_times": list(self.step_times),
             "turn_events": [{"turn": t[0], "time": t[1]} for t in self.turn_times]
         }
     def save_archive(self, archive_data):
@@ -1080,14 +1140,16 @@ class FifthGame:
             'Total Turns': [archive_data['meta']['turns']]
         }
         df_summary = pd.DataFrame(summary_data)
-        excel_filename = os.path.join(current_directory, f"archive_{archive_data['meta']['timestamp']}.xlsx")
+        excel_filename = unique_path(os.path.join(current_directory, f"archive_{archive_data['meta']['timestamp']}.xlsx"), ARCHIVE_EXTENSIONS)
         with pd.ExcelWriter(excel_filename) as writer:
             df_summary.to_excel(writer, sheet_name="Summary", index=False)
             df_path.to_excel(writer, sheet_name="Path", index=False)
             df_turns.to_excel(writer, sheet_name="Turns", index=False)
-        self.save_path_image(archive_data['meta']['timestamp'])
+        save_sidecar(excel_filename, archive_data["path"], archive_data["step_times"], MAP_IDS['fifth'], archive_data["path"][-1])
+        self.event_log.link(excel_filename)  # 事件日志文件头记下所属存档
+        self.save_path_image(image_path(excel_filename))
 
-    def save_path_image(self, timestamp):
+    def save_path_image(self, filename):
         surface = pygame.Surface((F5_WIDTH, F5_HEIGHT))
         surface.fill(F5_COLORS['background'])
         for i in range(F5_GRID_SIZE + 1):
@@ -1095,7 +1157,7 @@ class FifthGame:
                              (i * F5_CELL_SIZE, 0), (i * F5_CELL_SIZE, F5_HEIGHT))
             pygame.draw.line(surface, F5_COLORS['grid'],
                              (0, i * F5_CELL_SIZE), (F5_WIDTH, i * F5_CELL_SIZE))
-        for obstacle in F5_ALL_OBSTACLES:
+        for obstacle in self.compiled_map.rectangles:
             ox, oy, ow, oh = obstacle
             screen_x = ox * F5_CELL_SIZE
             screen_y = (F5_GRID_SIZE - oy - oh) * F5_CELL_SIZE
@@ -1110,7 +1172,7 @@ class FifthGame:
                 idx = int((len(points) - 1) * percent)
                 if idx < len(points):
                     pygame.draw.circle(surface, color, points[idx], 6)
-        pygame.image.save(surface, f"path_{timestamp}.png")
+        pygame.image.save(surface, filename)
     def draw_control_panel(self):
         panel_x = F5_GRID_SIZE * F5_CELL_SIZE
         pygame.draw.rect(self.screen, (240, 240, 240), (panel_x, 0, F5_PANEL_WIDTH, F5_HEIGHT))
@@ -1133,77 +1195,147 @@ class FifthGame:
         pygame.draw.rect(self.screen, btn_color, button_rect, border_radius=5)
         btn_text = self.font.render("开始游戏" if not self.game_started else "进行中", True, (255,255,255))
         self.screen.blit(btn_text, (panel_x + 65, F5_HEIGHT//2 - 10))
-    def run(self):
-        while self.running:
-            self.screen.fill(F5_COLORS['background'])
-            self.handle_input()
-            self.draw_grid()
-            self.draw_points()
+    def info_texts(self):
+        if not self.game_started:
+            return []
+        return [
+            f"转弯次数: {self.turn_count}",
+            "暂停中" if self.paused else ""
+        ]
+    def draw_info(self):
+        for i, text in enumerate(self.info_texts()):
+            if text:
+                text_surface = self.font.render(text, True, (0,0,0))
+                self.screen.blit(text_surface, (10, 10 + i*25))
+    def render_full(self):
+        self.screen.fill(F5_COLORS['background'])
+        self.draw_grid()
+        self.draw_points()
+        self.draw_path()
+        self.draw_control_panel()
+        self.draw_info()
+    def render_dirty(self):
+        renderer = self.renderer
+        info = self.info_texts()
+        panel_x = F5_GRID_SIZE * F5_CELL_SIZE
+        panel = self.panel_state()
+        changed = self.path_tracker.changes(self.path)
+        if renderer.full_redraw or changed is None:
+            renderer.invalidate()
+            renderer.reset()
             self.draw_path()
             self.draw_control_panel()
-            if self.game_started:
-                info_texts = [
-                    f"转弯次数: {self.turn_count}",
-                    "暂停中" if self.paused else ""
-                ]
-                for i, text in enumerate(info_texts):
-                    if text:
-                        text_surface = self.font.render(text, True, (0,0,0))
-                        self.screen.blit(text_surface, (10, 10 + i*25))
-            if self.game_started and not self.paused and (result := self.check_finish()):
-                finish_text = self.font.render(f"到达 {result}！", True, (0,0,255))
-                self.screen.blit(finish_text, (F5_WIDTH//2-50, F5_HEIGHT//2))
-                archive_data = self.generate_archive()
-                self.save_archive(archive_data)
-                pygame.time.wait(2000)
-                self.running = False
+            self.draw_info()
+        else:
+            if changed:
+                area = circle_rect(self.convert_coords(*changed[0]), 8)
+                for point in changed[1:]:
+                    area.union_ip(circle_rect(self.convert_coords(*point), 8))
+                renderer.restore(area, self.draw_path)
+            if info != self.last_info:
+                renderer.restore(INFO_RECT, self.draw_path)
+                self.draw_info()
+            if panel != self.last_panel:
+                self.draw_control_panel()
+                renderer.mark((panel_x, 0, F5_PANEL_WIDTH, F5_HEIGHT))
+        renderer.mark(self.draw_current())
+        self.last_info = info
+        self.last_panel = panel
+    def panel_state(self):
+        panel_x = F5_GRID_SIZE * F5_CELL_SIZE
+        button_rect = pygame.Rect(panel_x + 50, F5_HEIGHT//2 - 25, 100, 50)
+        return (button_rect.collidepoint(pygame.mouse.get_pos()), self.game_started)
+    def frame(self):
+        events = self.idle.poll()
+        if self.frame_timer.handle(self, events):
+            self.renderer.invalidate()  # 叠加层显示/隐藏后整屏重绘一次
+        self.handle_input(events)
+        if not self.idle.should_redraw(events, self.panel_state()):
+            return
+        if self.dirty_rendering:
+            self.render_dirty()
+        else:
+            self.render_full()
+        if self.finish_message and (pygame.time.get_ticks() >= self.finish_deadline or
+                                    any(e.type in (KEYDOWN, MOUSEBUTTONDOWN) for e in events)):
+            self.running = False
+        if not self.finish_message and self.game_started and not self.paused and (result := self.check_finish()):
+            # 存档和路径图交给后台线程写入，完成提示期间主循环照常运行
+            self.finish_message = f"到达 {result}！"
+            self.finish_deadline = pygame.time.get_ticks() + FINISH_SCREEN_MS
+            self.archive_writer.submit(self.save_archive, self.generate_archive())
+            self.event_log.record(event_log.FINISH, *self.current_pos)
+            self.event_log.close()
+        if self.finish_message:
+            finish_text = self.font.render(self.finish_message, True, (0,0,255))
+            self.renderer.mark(self.screen.blit(finish_text, (F5_WIDTH//2-50, F5_HEIGHT//2)))
+            self.idle.request_redraw()
+        if self.frame_timer.overlay:
+            self.renderer.mark(self.frame_timer.draw(self.screen))
+            self.idle.request_redraw()
+        self.present()
+    def present(self):
+        """把本帧送上屏幕：脏矩形模式只更新变化的区域"""
+        if self.dirty_rendering:
+            self.renderer.present()
+        else:
             pygame.display.flip()
-            self.clock.tick(30)
+    def close(self):
+        self.event_log.close()  # 中途退出时也写出缓冲区里剩余的事件
+        self.frame_timer.close()  # 恢复被计时包装的方法，有样本时写出 CSV
+    def run(self):
+        scene_loop.run(self)
         # 结束后返回主程序
 
 # ================= 主程序 =================
-def main():
-    pygame.init()
+def scenes():
+    """按顺序生成五个部分的场景；每次切换前调整窗口"""
+    # 各部分共用同一个显示子系统，切换时只调用 set_mode 调整窗口，不再反复 quit/init
     # 第一部分：路径规划实验（1920×1080）
     exp_screen = pygame.display.set_mode(EXP_SCREEN_SIZE)
     pygame.display.set_caption("整合版游戏 - 路径规划实验")
-    exp_scene = ExperimentScene(exp_screen)
-    exp_scene.run()
+    yield ExperimentScene(exp_screen)
     
     # 第二部分：区域选择游戏（1200×800），点击“确认”后退出该部分进入第三部分
-    pygame.display.quit()
-    pygame.display.init()
     rs_screen = pygame.display.set_mode((1200, 800))
     pygame.display.set_caption("区域选择游戏")
-    region_scene = RegionSelectionScene(rs_screen)
-    region_scene.run()
+    yield RegionSelectionScene(rs_screen)
     
     # 第三部分：路径迷宫游戏（935×735），游戏结束后自动退出该部分进入第四部分
-    pygame.display.quit()
-    pygame.display.init()
-    maze_screen = pygame.display.set_mode((MAZE_WIDTH, MAZE_HEIGHT))
+    pygame.display.set_mode((MAZE_WIDTH, MAZE_HEIGHT))
     pygame.display.set_caption("路径迷宫")
-    maze_game = MazeGame()
-    maze_game.run()
+    yield MazeGame()
     
     # 第四部分：迷宫路径-完整障碍物版（935×735），点击“确认”后退出该部分进入第五部分
-    pygame.display.quit()
-    pygame.display.init()
-    f4_screen = pygame.display.set_mode((F4_WIDTH, F4_HEIGHT))
+    pygame.display.set_mode((F4_WIDTH, F4_HEIGHT))
     pygame.display.set_caption("迷宫路径-完整障碍物版")
-    full_maze_game = FullMazeGame()
-    full_maze_game.run()
+    yield FullMazeGame()
     
     # 第五部分：迷宫路径-完整障碍物版（第五部分），游戏结束后退出整个程序
-    pygame.display.quit()
-    pygame.display.init()
-    f5_screen = pygame.display.set_mode((F5_WIDTH, F5_HEIGHT))
+    pygame.display.set_mode((F5_WIDTH, F5_HEIGHT))
     pygame.display.set_caption("迷宫路径-完整障碍物版 (第五部分)")
-    fifth_game = FifthGame()
-    fifth_game.run()
-    
+    yield FifthGame()
+
+def main():
+    pygame.init()
+    for scene in scenes():
+        scene_loop.run(scene)
+    get_writer().flush()  # 后台存档写完后再退出
     pygame.quit()
     sys.exit()
 
+async def main_async():
+    """网页版（pygbag）入口：同样的五个部分，每帧、每次切换都把控制权交还浏览器"""
+    pygame.init()
+    for scene in scenes():
+        await scene_loop.run_async(scene)
+        await scene_loop.transition()
+    await scene_loop.wait_writes()  # 存档任务写完后再结束
+    pygame.quit()
+
 if __name__ == "__main__":
-    main()
+    if scene_loop.IS_WEB:
+        import asyncio
+        asyncio.run(main_async())
+    else:
+        main()
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+import pygame
+
+
+# ================= 字体与文字渲染缓存 =================
+TEXT_CACHE_SIZE = 512  # 最多缓存的已渲染文字表面数量
+
+_fonts = {}  # (字体路径, 字号) -> pygame.font.Font
+_text_cache = OrderedDict()  # (字体路径, 字号, 文字, 抗锯齿, 颜色, 背景色) -> Surface
+_stats = {'hits': 0, 'misses': 0, 'font_loads': 0}
+
+
+class CachedFont:
+    """包装 pygame Font：render 结果进入全局 LRU 缓存，其余属性直接转发"""
+
+    def __init__(self, font, path, size):
+        self.font = font
+        self.path = path
+        self.size_px = size
+
+    def render(self, text, antialias, color, background=None):
+        key = (self.path, self.size_px, text, bool(antialias), tuple(color),
+               tuple(background) if background is not None else None)
+        surface = _text_cache.get(key)
+        if surface is not None:
+            _stats['hits'] += 1
+            _text_cache.move_to_end(key)
+            return surface
+        _stats['misses'] += 1
+        if background is None:
+            surface = self.font.render(text, antialias, color)
+        else:
+            surface = self.font.render(text, antialias, color, background)
+        _text_cache[key] = surface
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+        return surface
+
+    def __getattr__(self, name):
+        return getattr(self.font, name)
+
+
+def get_font(path, size):
+    """进程内共享的字体注册表：同一字体文件同一字号只从磁盘加载一次"""
+    if not pygame.font.get_init():
+        pygame.font.init()
+        clear()  # pygame.quit() 之后旧的 Font 对象已失效
+    key = (path, size)
+    font = _fonts.get(key)
+    if font is None:
+        _stats['font_loads'] += 1
+        font = _fonts[key] = CachedFont(pygame.font.Font(path, size), path, size)
+    return font
+
+
+def cache_info():
+    """命中/未命中计数，便于检查缓存效果"""
+    return dict(_stats, size=len(_text_cache), maxsize=TEXT_CACHE_SIZE, fonts=len(_fonts))
+
+
+def clear():
+    _fonts.clear()
+    _text_cache.clear()
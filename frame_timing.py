@@ -0,0 +1,210 @@
+import csv
+import os
+import time
+from datetime import datetime
+
+import pygame
+from pygame.locals import KEYDOWN, K_F3
+
+import fonts
+
+# ================= 逐帧分阶段计时 =================
+# 关闭时不包装任何方法，游戏循环每帧只多一次热键检查；按 F3 显示叠加层（p50/p99）并开始计时
+# 开启时把游戏实例上的各阶段方法（包括送屏的 present）换成计时包装，不改动 pygame 的全局函数；再按一次 F3 恢复原方法
+# 整屏重绘模式下每个绘制调用单独一列；脏矩形模式下网格、障碍物和关键点都来自缓存图层，这几列改为整帧绘制 render
+# 设置环境变量 MAP_FRAME_TIMING=1 则从第一帧起计时；退出阶段时有样本就写出 frame_timing_<时间戳>.csv
+FRAME_TIMING = os.environ.get('MAP_FRAME_TIMING') == '1'
+FRAME_TIMING_CAPACITY = 1024  # 环形缓冲区保留的最近帧数
+FRAME_TIMING_KEY = K_F3
+OVERLAY_REFRESH_FRAMES = 15  # 叠加层每隔多少帧重新计算分位数
+OVERLAY_POS = (10, 70)  # 叠加层左上角，避开左上角的转弯次数提示
+# 阶段 → 游戏实例上被包装的方法；嵌套调用（如 draw_points 里的 draw_obstacles）的时间同时计入两个阶段
+# 游戏上没有对应方法的阶段不出现；最后固定是 tick（限帧等待），由 TimedClock 计时
+FULL_PHASES = {
+    'handle_input': ('handle_input',),
+    'draw_grid': ('draw_grid',),
+    'draw_obstacles': ('draw_obstacles',),
+    'draw_points': ('draw_points',),
+    'draw_path': ('draw_path',),
+    'draw_control_panel': ('draw_control_panel',),
+    'flip': ('present',),  # 游戏自己的送屏：display.flip
+}
+DIRTY_PHASES = {
+    'handle_input': ('handle_input',),
+    'render': ('render_dirty',),
+    'draw_path': ('draw_path',),
+    'draw_control_panel': ('draw_control_panel',),
+    'flip': ('present',),  # 脏矩形的 display.update
+}
+
+
+def phase_methods(game):
+    """按游戏的渲染模式取阶段表，只保留游戏上有对应方法的阶段"""
+    table = DIRTY_PHASES if getattr(game, 'dirty_rendering', False) else FULL_PHASES
+    return {phase: names for phase, names in table.items() if any(hasattr(game, name) for name in names)}
+
+
+class TimedClock:
+    """包装 pygame.time.Clock（C 类型不能替换实例方法）：计时 tick，并以 tick 结束作为一帧的结束"""
+
+    def __init__(self, clock, timer):
+        self.clock = clock
+        self.timer = timer
+
+    def tick(self, framerate=0):
+        start = time.perf_counter()
+        try:
+            return self.clock.tick(framerate)
+        finally:
+            self.timer.current[-1] += time.perf_counter() - start
+            self.timer.end_frame()
+
+    def __getattr__(self, name):
+        return getattr(self.clock, name)
+
+
+class FrameTimer:
+    """每帧各阶段耗时（毫秒）的环形缓冲区，最后一列为整帧耗时"""
+
+    def __init__(self, capacity=FRAME_TIMING_CAPACITY, enabled=None):
+        self.capacity = capacity
+        self.phases = ()  # 阶段名，attach 时按游戏的渲染模式确定
+        self.samples = None  # (capacity, 阶段数 + 1)，首次计时才分配
+        self.count = 0
+        self.current = []
+        self.frame_start = None
+        self.game = None
+        self.saved = {}  # 被替换的原方法，detach 时恢复
+        self.overlay = False
+        self.overlay_surface = None
+        self.always = FRAME_TIMING if enabled is None else enabled
+
+    @property
+    def enabled(self):
+        return self.game is not None
+
+    def _timed(self, index, fn):
+        current = self.current
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                current[index] += clock() - start
+        return timed
+
+    def attach(self, game):
+        """替换 game 上的阶段方法；flip 阶段是游戏自己的送屏 present()"""
+        if self.game is not None:
+            return
+        import numpy as np
+        methods = phase_methods(game)
+        phases = tuple(methods) + ('tick',)
+        if self.samples is None or phases != self.phases:
+            self.phases = phases
+            self.samples = np.zeros((self.capacity, len(phases) + 1))
+            self.count = 0
+            self.current[:] = [0.0] * len(phases)
+        self.game = game
+        for index, names in enumerate(methods.values()):
+            for name in names:
+                if hasattr(game, name):
+                    self.saved[(game, name)] = game.__dict__.get(name)
+                    setattr(game, name, self._timed(index, getattr(game, name)))
+        self.saved[(game, 'clock')] = game.clock
+        game.clock = TimedClock(game.clock, self)
+        self.frame_start = None
+
+    def detach(self):
+        for (owner, name), original in self.saved.items():
+            if original is None:
+                delattr(owner, name)  # 原来是类上的方法，删掉实例属性即可
+            else:
+                setattr(owner, name, original)
+        self.saved = {}
+        self.game = None
+
+    def end_frame(self):
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            row = self.samples[self.count % self.capacity]
+            row[:-1] = self.current
+            row[-1] = now - self.frame_start
+            row *= 1000.0
+            self.count += 1
+        self.frame_start = now
+        self.current[:] = [0.0] * len(self.phases)
+        if self.overlay and self.count % OVERLAY_REFRESH_FRAMES == 0:
+            self.overlay_surface = None
+
+    def recent(self):
+        """按时间顺序返回缓冲区中的样本"""
+        import numpy as np
+        if self.samples is None:
+            return np.zeros((0, len(self.phases) + 1))
+        if self.count <= self.capacity:
+            return self.samples[:self.count]
+        start = self.count % self.capacity
+        return np.concatenate((self.samples[start:], self.samples[:start]))
+
+    def percentiles(self):
+        """{阶段: (p50, p99)}，单位毫秒"""
+        import numpy as np
+        samples = self.recent()
+        if not len(samples):
+            return {}
+        p50, p99 = np.percentile(samples, [50, 99], axis=0)
+        return {name: (p50[i], p99[i]) for i, name in enumerate(self.phases + ('frame',))}
+
+    def handle(self, game, events):
+        """处理热键；叠加层显示/隐藏时返回 True，调用方应整屏重绘一次"""
+        if self.always and self.game is None:
+            self.attach(game)
+        for event in events:
+            if event.type == KEYDOWN and event.key == FRAME_TIMING_KEY:
+                self.overlay = not self.overlay
+                self.overlay_surface = None
+                if self.overlay:
+                    self.attach(game)
+                elif not self.always:
+                    self.detach()
+                return True
+        return False
+
+    def draw(self, screen):
+        """把叠加层画到屏幕上，返回其矩形"""
+        if self.overlay_surface is None:
+            font = fonts.get_font(None, 18)
+            rows = [('ms', 'p50', 'p99')]
+            rows += [(name, f"{p50:.2f}", f"{p99:.2f}") for name, (p50, p99) in self.percentiles().items()]
+            rows.append((f"{min(self.count, self.capacity)} frames", '', ''))
+            columns = (6, 150, 210)  # 默认字体不等宽，按列右对齐数字
+            surface = pygame.Surface((260, 16 * len(rows) + 8))
+            surface.fill((40, 40, 40))
+            for i, row in enumerate(rows):
+                for j, text in enumerate(row):
+                    rendered = font.render(text, True, (255, 255, 255))
+                    x = columns[j] if j == 0 else columns[j] + 44 - rendered.get_width()
+                    surface.blit(rendered, (x, 4 + 16 * i))
+            self.overlay_surface = surface
+        return screen.blit(self.overlay_surface, OVERLAY_POS)
+
+    def dump(self, filename):
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(('frame',) + tuple(f"{name}_ms" for name in self.phases) + ('total_ms',))
+            first = max(self.count - self.capacity, 0)
+            for i, row in enumerate(self.recent()):
+                writer.writerow([first + i] + [round(float(v), 4) for v in row])
+
+    def close(self):
+        """恢复原方法；有样本时写出 CSV，返回文件名"""
+        self.detach()
+        if not self.count:
+            return None
+        filename = f"frame_timing_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        self.dump(filename)
+        print(f"保存成功: {filename}")
+        return filename
@@ -0,0 +1,138 @@
+import argparse
+import csv
+
+import numpy as np
+
+import maps
+from distance_fields import UNREACHABLE, goal_fields
+
+# ================= 基于代价的目标识别 =================
+# 对路径的每个前缀计算各目标的后验：P(g | 前缀) ∝ 先验(g) · exp(-β · (d(当前位置, g) - d(起点, g)))
+# 前缀已走的步数对所有目标相同，在归一化时抵消，因此每一步只需查一次距离场，O(1)
+# 整个数据集的所有路径拼接成一条长数组，一次完成查表、softmax 和逐试验的分段统计
+BETA = 1.0  # 理性系数，越大越相信参与者走最短路
+
+
+def cost_fields(game_map, block_obstacles=None):
+    """目标距离场；被障碍物占据的格子按“只能走出、不能走进”补上距离，便于分析允许穿越障碍物的路径"""
+    names, fields = goal_fields(game_map, block_obstacles)
+    fields = fields.astype(np.float64)
+    fields[fields == UNREACHABLE] = np.inf
+    while True:
+        padded = np.pad(fields, ((0, 0), (1, 1), (1, 1)), constant_values=np.inf)
+        neighbour = np.minimum.reduce([padded[:, :-2, 1:-1], padded[:, 2:, 1:-1],
+                                       padded[:, 1:-1, :-2], padded[:, 1:-1, 2:]]) + 1
+        filled = np.where(np.isinf(fields), neighbour, fields)
+        if np.array_equal(filled, fields):
+            return names, filled
+        fields = filled
+
+
+def concat_paths(paths):
+    """把若干路径拼接成 xs, ys 和每条路径的起始下标"""
+    lengths = np.array([len(p) for p in paths], dtype=np.int64)
+    points = np.concatenate([np.asarray(p, dtype=np.int64).reshape(-1, 2) for p in paths])
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return points[:, 0], points[:, 1], offsets, lengths
+
+
+def posteriors(fields, xs, ys, offsets, lengths, beta=BETA, prior=None):
+    """返回 (步数总和, 目标数) 的后验；每条路径以自己的起点为代价基准"""
+    costs = fields[:, ys, xs].T  # (N, G)
+    baseline = np.repeat(costs[offsets], lengths, axis=0)
+    logits = -beta * (costs - baseline)
+    if prior is not None:
+        logits = logits + np.log(np.asarray(prior, dtype=np.float64))
+    logits -= logits.max(axis=1, keepdims=True)
+    weights = np.exp(logits)
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def deception_scores(post, true_index, offsets, lengths):
+    """逐试验的欺骗性指标（true_index 为每条路径真实目标的下标）
+
+    last_deceptive_point: 真实目标不是唯一最可能目标的最后一步（从未骗过则为 -1）
+    time_to_truth: 此后真实目标一直领先的第一步，即 last_deceptive_point + 1
+    deceptive_fraction: 真实目标不领先的步数占比
+    mean_truth_posterior: 真实目标后验的平均值，越低越具欺骗性
+    """
+    step_true = np.repeat(true_index, lengths)
+    rows = np.arange(len(post))
+    p_true = post[rows, step_true]
+    others = post.copy()
+    others[rows, step_true] = -1.0
+    deceptive = p_true <= others.max(axis=1)
+    local = rows - np.repeat(offsets, lengths)
+    last = np.maximum.reduceat(np.where(deceptive, local, -1), offsets)
+    return {
+        'last_deceptive_point': last,
+        'time_to_truth': last + 1,
+        'deceptive_fraction': np.add.reduceat(deceptive.astype(np.float64), offsets) / lengths,
+        'mean_truth_posterior': np.add.reduceat(p_true, offsets) / lengths,
+    }
+
+
+def recognize(game_map, paths, true_goals=None, beta=BETA, block_obstacles=None):
+    """对一批路径做目标识别；true_goals 缺省时取路径终点所在的目标点
+
+    返回 (目标名列表, 后验数组, 每条路径起始下标, 欺骗性指标字典)
+    """
+    names, fields = cost_fields(game_map, block_obstacles)
+    xs, ys, offsets, lengths = concat_paths(paths)
+    post = posteriors(fields, xs, ys, offsets, lengths, beta)
+    if true_goals is None:
+        true_goals = [game_map.goal_at(p[-1]) for p in paths]
+    known = np.array([g in names for g in true_goals])
+    true_index = np.array([names.index(g) if g in names else 0 for g in true_goals], dtype=np.int64)
+    scores = deception_scores(post, true_index, offsets, lengths)
+    for key, values in scores.items():
+        scores[key] = np.where(known, values, -1 if values.dtype.kind == 'i' else np.nan)
+    return names, post, offsets, scores
+
+
+def main():
+    from analyze_archives import archive_map, discover
+    from trajectory import read_archive
+
+    parser = argparse.ArgumentParser(description="计算存档路径的目标后验与欺骗性指标")
+    parser.add_argument('root', nargs='?', default='.', help="存档所在目录（递归查找）")
+    parser.add_argument('--out', default='deception.csv')
+    parser.add_argument('--beta', type=float, default=BETA)
+    parser.add_argument('--map', choices=sorted(maps.MAP_SOURCES), help="没有与存档一致的 .traj 时使用的地图（不指定时这类存档报错）")
+    rule = parser.add_mutually_exclusive_group()  # 都不指定时按游戏规则（阶段脚本的 BLOCK_OBSTACLES）
+    rule.add_argument('--through-obstacles', dest='block_obstacles', action='store_const', const=False,
+                      help="代价按可穿越障碍物计算")
+    rule.add_argument('--block-obstacles', dest='block_obstacles', action='store_const', const=True,
+                      help="代价按障碍物挡路计算")
+    args = parser.parse_args()
+
+    groups = {}
+    for filename in discover(args.root):
+        try:
+            path, meta = read_archive(filename)
+            map_name = archive_map(filename, args.map, path, meta)
+        except Exception as e:
+            print(f"跳过 {filename}: {e}")
+            continue
+        if path:
+            groups.setdefault(map_name, []).append((filename, path))
+
+    with open(args.out, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'map', 'goal', 'steps', 'last_deceptive_point', 'time_to_truth',
+                         'deceptive_fraction', 'mean_truth_posterior'])
+        for map_name, trials in groups.items():
+            game_map = maps.load_map(map_name)
+            paths = [path for _, path in trials]
+            _, _, _, scores = recognize(game_map, paths, beta=args.beta, block_obstacles=args.block_obstacles)
+            for i, (filename, path) in enumerate(trials):
+                writer.writerow([filename, map_name, game_map.goal_at(path[-1]), len(path) - 1,
+                                 int(scores['last_deceptive_point'][i]), int(scores['time_to_truth'][i]),
+                                 round(float(scores['deceptive_fraction'][i]), 4),
+                                 round(float(scores['mean_truth_posterior'][i]), 4)])
+            print(f"{map_name}: {len(trials)} 条路径")
+    print(f"保存成功: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
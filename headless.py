@@ -0,0 +1,173 @@
+import argparse
+import os
+import re
+import time
+
+# ================= 无窗口脚本化运行 =================
+# 用 SDL dummy 驱动，把脚本化的输入逐帧喂给游戏自己的 run() / handle_input，不限帧率地跑完整个阶段
+# 输入可以是移动字符串（U/D/L/R 方向键、B 撤回、P 暂停/继续、S 点击开始，字母前可带重复次数，如 "S13R24D"）
+# 也可以是 event_log 记录的 .evlog 文件
+# 用法：python headless.py empty obstacles [--moves S13R24D] [--events 某次.evlog] [--repeat 3]
+import pygame
+from pygame.locals import KEYDOWN, MOUSEBUTTONDOWN, QUIT, K_UP, K_DOWN, K_LEFT, K_RIGHT, K_BACKSPACE, K_ESCAPE
+
+import event_log
+import maps
+from controller import load_stage
+from distance_fields import distance_field
+
+# 阶段名 → (脚本, 游戏类, maps 中的地图名, 网格格数常量, 格子像素常量)
+STAGES = {
+    'empty': ('3.empty.py', 'PathGame', 'empty', 'GRID_SIZE', 'CELL_SIZE'),
+    'obstacles': ('5.obstacles.py', 'PathGame', 'obstacles', 'GRID_SIZE', 'CELL_SIZE'),
+    'maze': ('experiment.py', 'MazeGame', 'maze', 'GRID_SIZE', 'CELL_SIZE'),
+    'fifth': ('experiment.py', 'FifthGame', 'fifth', 'F5_GRID_SIZE', 'F5_CELL_SIZE'),
+}
+KEYS = {'U': K_UP, 'D': K_DOWN, 'L': K_LEFT, 'R': K_RIGHT, 'B': K_BACKSPACE, 'P': K_ESCAPE}
+DIRECTIONS = {(0, 1): 'U', (0, -1): 'D', (-1, 0): 'L', (1, 0): 'R'}
+EVENTS_PER_FRAME = 1  # 每帧喂入的输入事件数
+
+
+class ScriptedInput:
+    """顶替游戏的 IdleScheduler：poll 按帧返回脚本里的事件，脚本用完后发送 QUIT"""
+
+    def __init__(self, events, per_frame=EVENTS_PER_FRAME):
+        self.events = list(events)
+        self.per_frame = per_frame
+        self.index = 0
+        self.enabled = False
+
+    def request_redraw(self):
+        pass
+
+    def poll(self):
+        pygame.event.pump()
+        if self.index >= len(self.events):
+            return [pygame.event.Event(QUIT)]
+        batch = self.events[self.index:self.index + self.per_frame]
+        self.index += self.per_frame
+        return batch
+
+    def should_redraw(self, events, state=None):
+        return True
+
+
+class UncappedClock:
+    """顶替 pygame.time.Clock：忽略帧率上限，只统计帧数"""
+
+    def __init__(self):
+        self.frames = 0
+
+    def tick(self, framerate=0):
+        self.frames += 1
+        return 0
+
+    def get_fps(self):
+        return 0.0
+
+
+def start_click(panel_x, height):
+    """右侧面板开始按钮的中心（按钮位于 panel_x + 50 ~ panel_x + 150）"""
+    return pygame.event.Event(MOUSEBUTTONDOWN, pos=(panel_x + 100, height // 2), button=1)
+
+
+def parse_moves(moves, panel_x, height):
+    """把 "S13R24D" 这样的字符串转成事件列表"""
+    events = []
+    for count, letter in re.findall(r'(\d*)([UDLRBPS])', moves.upper()):
+        for _ in range(int(count or 1)):
+            events.append(start_click(panel_x, height) if letter == 'S' else pygame.event.Event(KEYDOWN, key=KEYS[letter]))
+    return events
+
+
+def moves_from_log(filename):
+    """把 .evlog 中的事件还原成移动字符串（REJECT 还原为朝被拒绝格子的方向键）"""
+    _, records = event_log.read_events(filename)
+    moves = []
+    pos = None
+    for kind, x, y in zip(records['kind'], records['x'], records['y']):
+        if kind == event_log.START:
+            moves.append('S')
+        elif kind in (event_log.PAUSE, event_log.RESUME):
+            moves.append('P')
+        elif kind == event_log.UNDO:
+            moves.append('B')
+        elif kind in (event_log.MOVE, event_log.REJECT) and pos is not None:
+            moves.append(DIRECTIONS.get((int(x) - pos[0], int(y) - pos[1]), ''))
+        if kind != event_log.REJECT:
+            pos = (int(x), int(y))
+    return ''.join(moves)
+
+
+def shortest_moves(map_name, goal=None):
+    """沿距离场下降，从起点走到目标（缺省为第一个目标）的最短移动串"""
+    game_map = maps.load_map(map_name)
+    goal = goal or next(iter(game_map.goals))
+    field = distance_field(game_map, game_map.points[goal], block_obstacles=False)
+    x, y = game_map.start
+    moves = ['S']
+    while field[y, x] > 0:
+        for (dx, dy), letter in DIRECTIONS.items():
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < game_map.size and 0 <= ny < game_map.size and field[ny, nx] == field[y, x] - 1:
+                x, y = nx, ny
+                moves.append(letter)
+                break
+    return ''.join(moves)
+
+
+def run_stage(stage, moves=None, per_frame=EVENTS_PER_FRAME):
+    """无窗口跑完一个阶段，返回统计信息"""
+    script, class_name, map_name, grid_name, cell_name = STAGES[stage]
+    module = load_stage(script)
+    module.FINISH_SCREEN_MS = 0  # 完成提示不停留
+    start = time.perf_counter()
+    game = getattr(module, class_name)()
+    panel_x = getattr(module, grid_name) * getattr(module, cell_name)
+    script_events = parse_moves(moves or shortest_moves(map_name), panel_x, game.screen.get_height())
+    game.idle = ScriptedInput(script_events, per_frame)
+    game.clock = UncappedClock()
+    game.run()
+    game.archive_writer.flush()
+    wall = time.perf_counter() - start
+    return {
+        'stage': stage,
+        'frames': game.clock.frames,
+        'wall_s': wall,
+        'fps': game.clock.frames / wall if wall else 0.0,
+        'steps': len(game.path) - 1,
+        'finished': game.finished,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无窗口脚本化运行路径阶段，报告帧率与阶段耗时")
+    parser.add_argument('stages', nargs='*', default=list(STAGES), help="要运行的阶段：" + ", ".join(STAGES))
+    parser.add_argument('--moves', help="移动字符串，缺省为走到第一个目标的最短路")
+    parser.add_argument('--events', help="用 event_log 记录的 .evlog 文件作为输入")
+    parser.add_argument('--per-frame', type=int, default=EVENTS_PER_FRAME, help="每帧喂入的事件数")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--font', help="覆盖阶段脚本中的 FONT_PATH")
+    args = parser.parse_args()
+
+    moves = moves_from_log(args.events) if args.events else args.moves
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # 必须在 pygame.init 之前设置
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.init()
+    total = time.perf_counter()
+    for stage in args.stages:
+        module = load_stage(STAGES[stage][0])
+        if args.font:
+            module.FONT_PATH = args.font
+        if module.FONT_PATH and not os.path.exists(module.FONT_PATH):
+            module.FONT_PATH = None  # 找不到阶段配置的字体时退回 pygame 默认字体
+        for _ in range(args.repeat):
+            result = run_stage(stage, moves, args.per_frame)
+            print(f"{result['stage']:<10} {result['frames']:>6} 帧  {result['wall_s'] * 1000:>8.1f} ms  "
+                  f"{result['fps']:>8.0f} FPS  {result['steps']:>4} 步  {'完成' if result['finished'] else '未完成'}")
+    print(f"总耗时 {time.perf_counter() - total:.2f}s")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
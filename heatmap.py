@@ -0,0 +1,171 @@
+import argparse
+import fnmatch
+import os
+import time
+
+import numpy as np
+
+import maps
+from goal_recognition import concat_paths
+
+# ================= 全体参与者访问热力图 =================
+# 把同一地图的所有路径拼接成一条数组，格子编号 y*size+x 展平后用一次 np.bincount 统计访问次数
+# 过滤条件：到达的目标、实验条件（数据目录下的第一级子目录名，如 data/欺骗组/archive_xxx.json）、时间窗口
+# 时间窗口可按秒（需要 .traj 中的逐步时间）或按路径进度比例（0~1，与 30/50/70% 标记同一口径）
+# 用法：python heatmap.py 数据目录 --map obstacles [--goal close1] [--condition 欺骗组] [--window 0:10] [--phase 0:0.5]
+HEAT_LOW = (255, 255, 0)  # 访问最少的格子
+HEAT_HIGH = (255, 0, 0)  # 访问最多的格子
+HEAT_ALPHA = (60, 220)  # 透明度范围，未访问的格子完全透明
+
+
+class Trial:
+    """一次试验的路径及其分组信息"""
+
+    def __init__(self, filename, condition, path, times, goal):
+        self.filename = filename
+        self.condition = condition
+        self.path = path
+        self.times = times
+        self.goal = goal
+
+
+def condition_of(filename, root):
+    """数据目录下的第一级子目录名；直接放在数据目录里的存档没有条件"""
+    parts = os.path.relpath(os.path.dirname(filename), root).split(os.sep)
+    return parts[0] if parts[0] not in ('.', '') else None
+
+
+def load_trials(root, map_name, default_map=None):
+    """读取 root 下属于 map_name 的所有试验（地图和逐步时间取自与存档一致的 .traj）"""
+    from analyze_archives import discover
+    from replay import load_session
+    from trajectory import Trajectory
+
+    game_map = maps.load_map(map_name)
+    files = discover(root)
+    # 所属存档已不在的 .traj 也计入（旧版轨迹没有记录存档名，按同名文件判断）
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if name.startswith('archive_') and name.endswith('.traj'):
+                filename = os.path.join(folder, name)
+                stem = os.path.join(folder, Trajectory(filename).archive or name[:-len('.traj')])
+                if not any(os.path.exists(stem + ext) for ext in ('.json', '.xlsx')):
+                    files.append(filename)
+    trials = []
+    for filename in files:
+        try:
+            name, path, times = load_session(filename, default_map)
+        except Exception as e:
+            print(f"跳过 {filename}: {e}")
+            continue
+        if name == map_name and path:
+            trials.append(Trial(filename, condition_of(filename, root), path, times, game_map.goal_at(path[-1])))
+    return trials
+
+
+def select(trials, goal=None, condition=None):
+    """按到达的目标和实验条件过滤；condition 支持通配符"""
+    return [t for t in trials
+            if (goal is None or t.goal == goal)
+            and (condition is None or (t.condition is not None and fnmatch.fnmatch(t.condition, condition)))]
+
+
+def accumulate(size, xs, ys, offsets, lengths, times=None, window=None, phase=None, unique=False):
+    """返回 (size, size) 的访问次数，按 [y, x] 索引
+
+    times: 与 xs 对齐的逐步毫秒时间；window=(开始秒, 结束秒) 时必须提供
+    phase: (开始比例, 结束比例)，按每条路径自身的进度截取
+    unique: 每条路径对同一格子只计一次（统计“有多少人经过”而不是“经过多少次”）
+    """
+    keep = np.ones(len(xs), dtype=bool)
+    if window is not None:
+        t = np.asarray(times, dtype=np.float64) / 1000.0
+        keep &= (t >= window[0]) & (t <= window[1])
+    trial = np.repeat(np.arange(len(lengths)), lengths)
+    if phase is not None:
+        step = np.arange(len(xs)) - np.repeat(offsets, lengths)
+        progress = step / np.maximum(np.repeat(lengths, lengths) - 1, 1)
+        keep &= (progress >= phase[0]) & (progress <= phase[1])
+    cells = ys[keep] * size + xs[keep]
+    if unique:
+        cells = np.unique(trial[keep] * (size * size) + cells) % (size * size)
+    return np.bincount(cells, minlength=size * size).reshape(size, size)
+
+
+def aggregate(game_map, trials, window=None, phase=None, unique=False):
+    """把试验列表聚合成热力图；按秒截取时跳过没有逐步时间的试验"""
+    if window is not None:
+        trials = [t for t in trials if t.times is not None]
+    if not trials:
+        return np.zeros((game_map.size, game_map.size), dtype=np.int64), 0
+    xs, ys, offsets, lengths = concat_paths([t.path for t in trials])
+    times = np.concatenate([t.times for t in trials]) if window is not None else None
+    return accumulate(game_map.size, xs, ys, offsets, lengths, times, window, phase, unique), len(trials)
+
+
+def heat_surface(counts, log_scale=True):
+    """计数 → 每格一个像素的 RGBA Surface（第 0 行为地图最上方）"""
+    import pygame
+    values = np.log1p(counts) if log_scale else counts.astype(np.float64)
+    norm = values / values.max() if values.max() > 0 else values
+    norm = norm[::-1]
+    rgba = np.zeros(counts.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = HEAT_LOW[channel] + (HEAT_HIGH[channel] - HEAT_LOW[channel]) * norm
+    rgba[..., 3] = np.where(counts[::-1] > 0, HEAT_ALPHA[0] + (HEAT_ALPHA[1] - HEAT_ALPHA[0]) * norm, 0)
+    size = counts.shape[0]
+    return pygame.image.frombuffer(np.ascontiguousarray(rgba).tobytes(), (size, size), 'RGBA')
+
+
+def render(map_name, counts, filename, log_scale=True):
+    """把热力图叠在与路径图相同的网格/障碍物底图上；每个点以网格交点为中心"""
+    import pygame
+    from render_paths import canvas, static_layer
+
+    game_map = maps.load_map(map_name)
+    colors, cell, _, _ = canvas(map_name)
+    size, grid = game_map.size, game_map.grid_size
+    surface = static_layer(map_name).copy()
+    heat = pygame.transform.scale(heat_surface(counts, log_scale), (size * cell, size * cell))
+    surface.blit(heat, (-cell // 2, (grid - size + 1) * cell - cell // 2))
+    for name, (x, y) in game_map.points.items():
+        pygame.draw.circle(surface, colors.get(name, (0, 0, 0)), (x * cell, (grid - y) * cell), 6)
+    pygame.image.save(surface, filename)
+
+
+def parse_range(text):
+    start, _, end = text.partition(':')
+    return float(start or 0), float(end) if end else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聚合所有参与者在同一地图上的访问热力图")
+    parser.add_argument('root', nargs='?', default='.', help="存档所在目录（递归查找）")
+    parser.add_argument('--map', required=True, choices=sorted(maps.MAP_SOURCES))
+    parser.add_argument('--goal', help="只统计到达该目标的试验，如 close1")
+    parser.add_argument('--condition', help="只统计该实验条件（第一级子目录名，支持通配符）")
+    parser.add_argument('--window', type=parse_range, help="按秒截取，如 0:10")
+    parser.add_argument('--phase', type=parse_range, help="按路径进度截取，如 0:0.5")
+    parser.add_argument('--unique', action='store_true', help="每条路径每个格子只计一次")
+    parser.add_argument('--linear', action='store_true', help="颜色按线性而不是对数刻度")
+    parser.add_argument('--out', default='heatmap.png')
+    parser.add_argument('--npy', help="同时把计数矩阵保存为 .npy")
+    args = parser.parse_args()
+
+    game_map = maps.load_map(args.map)
+    if args.goal and args.goal not in game_map.goals:
+        parser.error(f"{args.map} 没有目标 {args.goal}，可选：{', '.join(game_map.goals)}")
+    start = time.perf_counter()
+    trials = select(load_trials(args.root, args.map), args.goal, args.condition)
+    loaded = time.perf_counter()
+    counts, used = aggregate(game_map, trials, args.window, args.phase, args.unique)
+    aggregated = time.perf_counter()
+    render(args.map, counts, args.out, not args.linear)
+    if args.npy:
+        np.save(args.npy, counts)
+    print(f"{used} 条路径，{int(counts.sum())} 次访问；读取 {loaded - start:.2f}s，"
+          f"聚合 {(aggregated - loaded) * 1000:.1f}ms，保存成功: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pygame
+from pygame.locals import MOUSEMOTION, NOEVENT
+
+
+# ================= 事件驱动的空闲渲染 =================
+# 默认关闭；设置环境变量 MAP_IDLE_RENDERING=1 或把下面的开关改为 True 即可启用
+# 网页版（pygbag）不能阻塞在 event.wait，始终关闭
+IDLE_RENDERING = os.environ.get('MAP_IDLE_RENDERING') == '1' and sys.platform != 'emscripten'
+IDLE_TIMEOUT_MS = 1000  # 没有任何事件时最长阻塞时间，到时返回一次空事件列表
+
+
+class IdleScheduler:
+    """空闲时阻塞在 pygame.event.wait，只在有输入、悬停状态变化或定时器触发时重绘"""
+
+    def __init__(self, enabled=None, timeout=IDLE_TIMEOUT_MS):
+        self.enabled = IDLE_RENDERING if enabled is None else enabled
+        self.timeout = timeout
+        self.pending = True  # 首帧必须绘制
+        self.last_state = None
+
+    def request_redraw(self):
+        self.pending = True
+
+    def poll(self):
+        """取本帧事件；启用时若无待绘制内容则阻塞等待"""
+        if not self.enabled or self.pending:
+            return pygame.event.get()
+        event = pygame.event.wait(self.timeout)
+        if event.type == NOEVENT:
+            return []
+        return [event] + pygame.event.get()
+
+    def should_redraw(self, events, state=None):
+        """state 为调用方关心的悬停/页面状态，变化时才因鼠标移动而重绘"""
+        if not self.enabled:
+            return True
+        redraw = (self.pending or state != self.last_state
+                  or any(event.type != MOUSEMOTION for event in events))
+        self.last_state = state
+        self.pending = False
+        return redraw
@@ -0,0 +1,306 @@
+import argparse
+import json
+import math
+import time
+from datetime import datetime
+
+import pygame
+from pygame.locals import *
+
+import event_log
+import fonts
+import maps
+from archive_writer import get_writer
+from frame_timing import FrameTimer
+from idle import IdleScheduler
+from occupancy import compile_obstacles
+import scene_loop
+from trajectory import ARCHIVE_EXTENSIONS, MAP_IDS, save_sidecar, unique_path
+from viewport import Camera, ChunkedLayer
+
+# ================= 大地图路径游戏 =================
+# 与障碍物阶段相同的范式，但地图可达 200×200 ~ 1000×1000 格：窗口只显示跟随当前位置的视口，
+# 地图切成预渲染的块，每帧只贴可见的块，路径每走一步只在相关块上补画一段
+# 障碍物为障碍物阶段 49×49 图案的平铺，关键点按比例放大
+# 用法：python large_map.py [--size 1000]
+
+# ================= 配置参数 =================
+FONT_PATH = "C:/Windows/Fonts/simhei.ttf"
+LARGE_GRID_SIZE = 200
+CELL_SIZE = 15
+VIEW_SIZE = 49 * CELL_SIZE  # 视口与原阶段的网格区域一样大（735 像素）
+PANEL_WIDTH = 200
+FINISH_SCREEN_MS = 2000  # 完成提示显示时长，按任意键可提前结束
+BLOCK_OBSTACLES = False  # 与障碍物阶段一致：默认允许穿过障碍物
+TRAJECTORY_MAP_ID = MAP_IDS['large']  # 具体哪张大地图由存档 meta 中的 size 决定
+
+COLORS = {
+    'background': (255, 255, 255),
+    'grid': (200, 200, 200),
+    'start': (0, 255, 0),
+    'obstacle': (100, 100, 100),
+    'button': (100, 200, 100),
+    'button_hover': (50, 150, 50),
+    'current': (255, 0, 0)
+}
+
+
+def get_font(size):
+    return fonts.get_font(FONT_PATH, size)  # 全局字体注册表，文字渲染结果带 LRU 缓存
+
+
+class LargePathGame:
+    def __init__(self, size=LARGE_GRID_SIZE):
+        pygame.init()
+        self.size = size
+        self.screen = pygame.display.set_mode((VIEW_SIZE + PANEL_WIDTH, VIEW_SIZE))
+        pygame.display.set_caption(f"迷宫路径-大地图 {size}×{size}")
+        self.clock = pygame.time.Clock()
+        self.font = get_font(20)
+        self.idle = IdleScheduler()
+        self.archive_writer = get_writer()
+        self.event_log = event_log.EventLog(writer=self.archive_writer)  # 逐事件高精度日志
+        self.frame_timer = FrameTimer()  # F3 显示分阶段帧耗时
+        game_map = maps.load_map(maps.large_map_name(size))  # 离线分析按存档 meta 中的 size 重建同一张地图
+        self.obstacles = list(game_map.obstacles)
+        self.points = dict(game_map.points)
+        self.occupancy = compile_obstacles(self.obstacles, size)
+        self.layer = ChunkedLayer(size, CELL_SIZE, COLORS, self.obstacles, self.points)
+        self.camera = Camera((VIEW_SIZE, VIEW_SIZE), self.layer.world_size)
+        self.reset_game()
+
+    def reset_game(self):
+        """初始化游戏状态"""
+        self.current_pos = list(self.points['start'])
+        self.path = [tuple(self.current_pos)]
+        self.turn_count = 0
+        self.start_time = 0
+        self.paused = False
+        self.running = True
+        self.finished = False
+        self.game_started = False
+        self.previous_direction = None
+        self.turn_times = []
+        self.step_times = [0]  # 每一步相对开始的毫秒数，与 path 一一对应
+        self.pause_start = 0
+        self.finish_message = None
+        self.finish_deadline = 0
+        self.layer.clear()
+        self.camera.center_on(self.layer.convert(*self.current_pos))
+
+    def to_screen(self, x, y):
+        return self.camera.to_screen(self.layer.convert(x, y))
+
+    def draw_path(self):
+        """同步路径到分块图层，视口跟随当前位置，只贴可见的块"""
+        self.layer.sync(self.path)
+        self.camera.follow(self.layer.convert(*self.current_pos))
+        self.layer.draw(self.screen, self.camera)
+
+    def draw_points(self):
+        pygame.draw.circle(self.screen, COLORS['current'], self.to_screen(*self.current_pos), 8)
+
+    def is_valid_move(self, new_x, new_y):
+        return self.occupancy.is_valid_move(self.current_pos, (new_x, new_y), BLOCK_OBSTACLES)
+
+    def calculate_angle(self, p1, p2, p3):
+        v1 = (p1[0] - p2[0], p1[1] - p2[1])
+        v2 = (p3[0] - p2[0], p3[1] - p2[1])
+        dot_product = v1[0] * v2[0] + v1[1] * v2[1]
+        magnitude_v1 = math.sqrt(v1[0]**2 + v1[1]**2)
+        magnitude_v2 = math.sqrt(v2[0]**2 + v2[1]**2)
+        cos_angle = dot_product / (magnitude_v1 * magnitude_v2)
+        return math.degrees(math.acos(cos_angle))
+
+    def handle_input(self, events=None):
+        for event in (pygame.event.get() if events is None else events):
+            if event.type == QUIT:
+                self.running = False
+
+            if event.type == MOUSEBUTTONDOWN and not self.game_started:
+                if (VIEW_SIZE + 50 < event.pos[0] < VIEW_SIZE + 150 and
+                        VIEW_SIZE // 2 - 25 < event.pos[1] < VIEW_SIZE // 2 + 25):
+                    self.game_started = True
+                    self.start_time = time.time()
+                    self.event_log.open(event_log.log_path(TRAJECTORY_MAP_ID), TRAJECTORY_MAP_ID)
+                    self.event_log.record(event_log.START, *self.current_pos)
+
+            if event.type == KEYDOWN:
+                if self.game_started and event.key == K_ESCAPE:
+                    if not self.paused:
+                        self.pause_start = time.time()
+                        self.event_log.record(event_log.PAUSE, *self.current_pos)
+                    else:
+                        self.start_time += time.time() - self.pause_start
+                        self.event_log.record(event_log.RESUME, *self.current_pos)
+                    self.paused = not self.paused
+
+                if self.game_started and not self.paused and not self.finished:
+                    if event.key == K_BACKSPACE:
+                        if len(self.path) > 1:
+                            self.path.pop()
+                            self.step_times.pop()
+                            self.current_pos = list(self.path[-1])
+                            self.event_log.record(event_log.UNDO, *self.current_pos)
+
+                    dx, dy = 0, 0
+                    if event.key == K_UP: dy = 1
+                    elif event.key == K_DOWN: dy = -1
+                    elif event.key == K_LEFT: dx = -1
+                    elif event.key == K_RIGHT: dx = 1
+                    else: continue
+
+                    new_x = self.current_pos[0] + dx
+                    new_y = self.current_pos[1] + dy
+
+                    if not self.is_valid_move(new_x, new_y):
+                        self.event_log.record(event_log.REJECT, new_x, new_y)  # 记录被拒绝的目标格
+                        continue
+
+                    if len(self.path) > 1:
+                        angle = self.calculate_angle(self.path[-2], self.path[-1], (new_x, new_y))
+                        if angle >= 25 and self.previous_direction != (dx, dy):
+                            self.turn_count += 1
+                            elapsed_time = time.time() - self.start_time
+                            self.turn_times.append((self.turn_count, round(elapsed_time, 1)))
+
+                    self.current_pos = [new_x, new_y]
+                    self.path.append(tuple(self.current_pos))
+                    self.step_times.append(int((time.time() - self.start_time) * 1000))
+                    self.event_log.record(event_log.MOVE, *self.current_pos)
+                    self.previous_direction = (dx, dy)
+
+    def check_finish(self):
+        current = tuple(self.current_pos)
+        for name, pos in self.points.items():
+            if name != 'start' and current == pos:
+                self.finished = True
+                return name
+        return None
+
+    def generate_archive(self):
+        return {
+            "meta": {
+                "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
+                "duration": round(time.time() - self.start_time, 1),
+                "steps": len(self.path) - 1,
+                "turns": self.turn_count,
+                "size": self.size
+            },
+            "path": list(self.path),
+            "step_times": list(self.step_times),
+            "turn_events": [{"turn": t[0], "time": t[1]} for t in self.turn_times]
+        }
+
+    def save_archive(self, archive_data):
+        """大地图的整图可达上万像素见方，这里只保存 JSON 和 .traj；离线分析按 meta 中的 size 重建地图"""
+        filename = unique_path(f"archive_{archive_data['meta']['timestamp']}.json", ARCHIVE_EXTENSIONS)
+        with open(filename, "w", encoding='utf-8') as f:
+            json.dump(archive_data, f, indent=4, ensure_ascii=False)
+        save_sidecar(filename, archive_data["path"], archive_data["step_times"], TRAJECTORY_MAP_ID, archive_data["path"][-1])
+        self.event_log.link(filename)  # 事件日志文件头记下所属存档
+
+    def draw_control_panel(self):
+        panel_x = VIEW_SIZE
+        pygame.draw.rect(self.screen, (240, 240, 240), (panel_x, 0, PANEL_WIDTH, VIEW_SIZE))
+
+        text_y = 50
+        controls = [
+            "操作说明：",
+            "↑ 上移",
+            "↓ 下移",
+            "← 左移",
+            "→ 右移",
+            f"地图 {self.size}×{self.size}",
+            f"位置 {self.current_pos[0]}, {self.current_pos[1]}",
+        ]
+        for line in controls:
+            text = self.font.render(line, True, (0, 0, 0))
+            self.screen.blit(text, (panel_x + 20, text_y))
+            text_y += 30
+
+        button_rect = pygame.Rect(panel_x + 50, VIEW_SIZE // 2 - 25, 100, 50)
+        mouse_pos = pygame.mouse.get_pos()
+        btn_color = COLORS['button_hover'] if button_rect.collidepoint(mouse_pos) else COLORS['button']
+
+        pygame.draw.rect(self.screen, btn_color, button_rect, border_radius=5)
+        btn_text = self.font.render("开始游戏" if not self.game_started else "进行中", True, (255, 255, 255))
+        self.screen.blit(btn_text, (panel_x + 65, VIEW_SIZE // 2 - 10))
+
+    def draw_info(self):
+        if not self.game_started:
+            return
+        for i, text in enumerate([f"转弯次数: {self.turn_count}", "暂停中" if self.paused else ""]):
+            if text:
+                self.screen.blit(self.font.render(text, True, (0, 0, 0)), (10, 10 + i * 25))
+
+    def render(self):
+        """每帧的工作量只取决于视口大小：贴可见块、当前位置、面板和提示"""
+        self.draw_path()
+        self.draw_points()
+        self.draw_control_panel()
+        self.draw_info()
+
+    def panel_state(self):
+        button_rect = pygame.Rect(VIEW_SIZE + 50, VIEW_SIZE // 2 - 25, 100, 50)
+        return (button_rect.collidepoint(pygame.mouse.get_pos()), self.game_started)
+
+    def frame(self):
+        """一帧：取事件、更新、绘制；限帧和让出控制权由 scene_loop 负责"""
+        events = self.idle.poll()
+        self.frame_timer.handle(self, events)
+        self.handle_input(events)
+        if not self.idle.should_redraw(events, self.panel_state()):
+            return
+        self.render()
+
+        if self.finish_message and (pygame.time.get_ticks() >= self.finish_deadline or
+                                    any(e.type in (KEYDOWN, MOUSEBUTTONDOWN) for e in events)):
+            self.running = False
+        if not self.finish_message and self.game_started and not self.paused and (result := self.check_finish()):
+            # 存档交给后台线程写入，完成提示期间主循环照常运行
+            self.finish_message = f"到达 {result}！"
+            self.finish_deadline = pygame.time.get_ticks() + FINISH_SCREEN_MS
+            self.archive_writer.submit(self.save_archive, self.generate_archive())
+            self.event_log.record(event_log.FINISH, *self.current_pos)
+            self.event_log.close()
+        if self.finish_message:
+            finish_text = self.font.render(self.finish_message, True, (0, 0, 255))
+            self.screen.blit(finish_text, (VIEW_SIZE // 2 - 50, VIEW_SIZE // 2))
+            self.idle.request_redraw()  # 空闲模式下也要按时结束完成提示
+        if self.frame_timer.overlay:
+            self.frame_timer.draw(self.screen)
+            self.idle.request_redraw()
+
+        self.present()
+
+    def present(self):
+        """把本帧送上屏幕"""
+        pygame.display.flip()
+
+    def close(self):
+        self.event_log.close()  # 中途退出时也写出缓冲区里剩余的事件
+        self.frame_timer.close()  # 恢复被计时包装的方法，有样本时写出 CSV
+
+    def run(self):
+        scene_loop.run(self)
+
+
+def run_stage(size=LARGE_GRID_SIZE):
+    """在当前窗口中运行本阶段，结束后返回而不退出 pygame"""
+    LargePathGame(size).run()
+
+
+async def run_stage_async(size=LARGE_GRID_SIZE):
+    """网页版：同一阶段的协作式版本，每帧把控制权交还浏览器"""
+    await scene_loop.run_async(LargePathGame(size))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="大地图路径游戏（分块渲染、视口跟随）")
+    parser.add_argument('--size', type=int, default=LARGE_GRID_SIZE, help="地图边长（格），如 200 或 1000")
+    args = parser.parse_args()
+    game = LargePathGame(args.size)
+    game.run()
+    game.archive_writer.flush()  # 确保存档写完再退出 pygame
+    pygame.quit()
@@ -1,13 +1,19 @@
+import asyncio  
 import pygame  
 import sys  
 import time  
 from pygame.locals import *  
+import fonts  
 from datetime import datetime  
+from render_cache import PathLayer  
+from occupancy import compile_obstacles  
+from idle import IdleScheduler  
+import scene_loop  
 
 # ================= 字体配置 =================  
 FONT_PATH = "C:/Windows/Fonts/simhei.ttf"  
 def get_font(size):  
-    return pygame.font.Font(FONT_PATH, size)  
+    return fonts.get_font(FONT_PATH, size)  # 全局字体注册表，文字渲染结果带 LRU 缓存  
 
 # ================= 全局配置 =================  
 SCREEN_SIZE = (1200, 800)  
@@ -65,6 +71,8 @@ class PathGame:
         
         self.current_pos = list(self.config['start'])  
         self.path = [tuple(self.current_pos)]  
+        self.path_layer = PathLayer((GAME_SIZE, GAME_SIZE), self.convert_coords, (0,0,0), 3)  
+        self.occupancy = compile_obstacles(self.config['obstacles'], GRID_SIZE + 1)  
         self.active = False  
         self.finished = False  
 
@@ -93,15 +101,12 @@ class PathGame:
         pygame.draw.circle(self.game_surface, COLORS['current'], current_pos, 8)  # 移除目标点的绘制
     
     def draw_path(self):  
-        if len(self.path) > 1:  
-            points = [self.convert_coords(x, y) for x, y in self.path]  
-            pygame.draw.lines(self.game_surface, (0,0,0), False, points, 3)  
+        # 路径图层只补画新增线段，每帧开销与路径长度无关  
+        self.path_layer.sync(self.path)  
+        self.path_layer.draw(self.game_surface)  
     
     def is_obstructed(self, x, y):  
-        for ox, oy, w, h in self.config['obstacles']:  
-            if ox <= x < ox + w and oy <= y < oy + h:  
-                return True  
-        return False  
+        return self.occupancy.is_obstructed(x, y)  
     
     def handle_input(self, events):  
         if not self.active or self.finished:  
@@ -130,7 +135,7 @@ class PathGame:
                 
                 if self.is_obstructed(new_x, new_y):  
                     return  
-                if not (0 <= new_x <= GRID_SIZE and 0 <= new_y <= GRID_SIZE):  
+                if not self.occupancy.in_bounds(new_x, new_y):  
                     return  
                 
                 self.current_pos = [new_x, new_y]  
@@ -225,41 +230,41 @@ class GamePage:
         return True  
 
 # ================= 主程序 =================  
-def main():  
-    pygame.init()  
-    screen = pygame.display.set_mode(SCREEN_SIZE)  
-    pygame.display.set_caption("路径规划实验")  
-    clock = pygame.time.Clock()  
+class IntroScene:  
+    """欢迎/练习阶段：说明页翻页和练习游戏；每次 frame() 处理一帧，主循环由 scene_loop 驱动"""  
+    def __init__(self, screen):  
+        self.screen = screen  
+        self.clock = pygame.time.Clock()  
     
-    data = ExperimentData()  
+        self.data = ExperimentData()  
     
-    pages = [  
-        GamePage("欢迎页", "欢迎参与路径规划实验！"),  
-        GamePage("任务说明",   
-            "您的任务是规划网格地图地图中，绘制一条从起点到目标点的路径。\n\n"  
-            "本次实验一共会有四组网格地图需要完成。在实验过程中，我们将指定一个目标点，\n您需要根据该目标点设计路径，并通过路径的设计来尽可能让对手猜不出您的真实目标。\n\n"  
-            ),  
-        GamePage("练习阶段",   
-            "操作说明：\n"  
-            "1. 点击右侧开始按钮激活游戏\n"  
-            "2. 使用方向键控制移动\n"  
-            "3. 熟悉操作后，可以按Esc键结束游戏\n",
-            map_index=0, is_game=True),  
-        GamePage("准备开始", "现在你已经了解了该游戏的过程，点击确认键正式开始游戏！")  
-    ]  
+        self.pages = [  
+            GamePage("欢迎页", "欢迎参与路径规划实验！"),  
+            GamePage("任务说明",   
+                "您的任务是规划网格地图地图中，绘制一条从起点到目标点的路径。\n\n"  
+                "本次实验一共会有四组网格地图需要完成。在实验过程中，我们将指定一个目标点，\n您需要根据该目标点设计路径，并通过路径的设计来尽可能让对手猜不出您的真实目标。\n\n"  
+                ),  
+            GamePage("练习阶段",   
+                "操作说明：\n"  
+                "1. 点击右侧开始按钮激活游戏\n"  
+                "2. 使用方向键控制移动\n"  
+                "3. 熟悉操作后，可以按Esc键结束游戏\n",
+                map_index=0, is_game=True),  
+            GamePage("准备开始", "现在你已经了解了该游戏的过程，点击确认键正式开始游戏！")  
+        ]  
     
-    current_page = 0  
-    running = True    
-    
-    while running: 
-        screen.fill(COLORS['background'])  
-        events = pygame.event.get()  
-        page = pages[current_page]  
+        self.current_page = 0  
+        self.running = True    
+        self.idle = IdleScheduler()  # 默认关闭；启用后空闲时不再以 30 FPS 空转  
+      
+    def frame(self):  
+        events = self.idle.poll()  
+        page = self.pages[self.current_page]  
         
         # ========== 事件处理核心逻辑 ==========  
         for event in events:  
             if event.type == QUIT:  
-                running = False  
+                self.running = False  
                 
             if event.type == MOUSEBUTTONDOWN:  
                 x, y = event.pos  
@@ -267,49 +272,92 @@ def main():
                 # 统一处理右下角按钮区域 (1000-1180, 700-760)  
                 if 1000 <= x <= 1180 and 700 <= y <= 760:  
                     # 处理说明页翻页  
-                    if current_page == 1:  
-                        current_page += 1  
+                    if self.current_page == 1:  
+                        self.current_page += 1  
                     # 处理常规
-                    elif current_page < len(pages)-1:  
+                    elif self.current_page < len(self.pages)-1:  
                         # 游戏页需完成才能翻页  
                         if page.is_game:  
                             if page.game_instance and page.game_instance.finished:  
-                                current_page += 1  
+                                self.current_page += 1  
                         else:  
-                            current_page += 1  
+                            self.current_page += 1  
                     # 退出程序  
                     else:  
-                        running = False  
+                        self.running = False  
                 
                 # 处理游戏页开始按钮（同一区域）  
                 if page.is_game and 1020 <= x <= 1180 and 700 <= y <= 760:  
                     if not page.game_instance.active:  
                         page.game_instance.active = True  
                         # 记录开始时间  
-                        if not data.start_times[page.map_index]:  
-                            data.start_times[page.map_index] = time.time()  
+                        if not self.data.start_times[page.map_index]:  
+                            self.data.start_times[page.map_index] = time.time()  
+        
+        # 只有输入、页码或按钮悬停状态变化时才需要重绘  
+        mouse_pos = pygame.mouse.get_pos()  
+        hover = (self.current_page,  
+                 pygame.Rect(1000, 700, 180, 60).collidepoint(mouse_pos),  
+                 pygame.Rect(1020, 700, 160, 60).collidepoint(mouse_pos))  
+        if not self.idle.should_redraw(events, hover):  
+            return  
         
         # ========== 页面渲染逻辑 ==========  
-        if current_page == 1:  # 全屏文字页特殊处理  
-            page.draw_full_text_page(screen)  
+        self.screen.fill(COLORS['background'])  
+        if self.current_page == 1:  # 全屏文字页特殊处理  
+            page.draw_full_text_page(self.screen)  
         else:  
-            page.draw_panel(screen)  
+            page.draw_panel(self.screen)  
         
         # ========== 游戏逻辑更新 ==========  
-        if page.is_game and current_page not in [1]:  
-            if page.update(screen, data, events):  
+        if page.is_game and self.current_page not in [1]:  
+            if page.update(self.screen, self.data, events):  
                 # 游戏完成时自动翻页  
-                if current_page < len(pages)-1:  
-                    current_page += 1  
+                if self.current_page < len(self.pages)-1:  
+                    self.current_page += 1  
                 else:  
                     # 退出游戏或结束实验
-                    running = False
+                    self.running = False
         
         pygame.display.flip()  
-        clock.tick(30)  
-    
+
+    def run(self):  
+        scene_loop.run(self)  
+
+def open_window():  
+    pygame.init()  
+    screen = pygame.display.set_mode(SCREEN_SIZE)  
+    pygame.display.set_caption("路径规划实验")  
+    return screen  
+
+def run_stage():  
+    """运行欢迎/练习阶段；不退出 pygame，便于 controller 在同一窗口中接着运行下一阶段"""  
+    IntroScene(open_window()).run()  
+
+async def run_stage_async():  
+    """网页版：同一阶段的协作式版本，每帧把控制权交还浏览器"""  
+    await scene_loop.run_async(IntroScene(open_window()))  
+
+async def main_async():  
+    """网页版入口（pygbag 只从 main.py 启动）：本阶段之后接着运行 controller 的其余阶段和 experiment 的各部分"""  
+    import controller  
+    import experiment  
+    stages = [stage for stage in controller.STAGES if stage['script'] != 'main.py']  
+    for stage in stages:  
+        controller.load_stage(stage['script'])  # 进入第一帧之前导入，阶段切换时不再有导入开销  
+    await run_stage_async()  
+    await scene_loop.transition()  
+    for stage in stages:  
+        await controller.run_stage_async(stage)  
+    await experiment.main_async()  # 最后等存档任务写完  
+
+def main():  
+    run_stage()  
     pygame.quit()  
     sys.exit()  
 
 if __name__ == "__main__":  
-    main()  
\ No newline at end of file
+    if scene_loop.IS_WEB:  
+        asyncio.run(main_async())  
+    else:  
+        main()  
\ No newline at end of file
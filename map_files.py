@@ -0,0 +1,230 @@
+import argparse
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+from obstacle_index import ObstacleIndex, merge_obstacles
+from occupancy import OccupancyGrid, compile_obstacles
+
+
+# ================= 外部地图文件与编译缓存 =================
+# 地图（网格大小、关键点、障碍物）定义在 map_data/<名称>.json，阶段脚本和离线分析都从这里读取
+# 游戏第一次用到某张地图时把它编译成二进制文件：占用网格、障碍物矩形、合并后的矩形、关键点和预渲染的静态图层
+# 编译结果按“源文件内容 + 绘制参数”的哈希缓存在 map_cache/ 下，源文件一改哈希就变，旧文件自动删除
+# 加载只做一次 mmap，占用网格和图层像素都直接引用映射的内存
+# 用法：python map_files.py [--clean]
+if hasattr(sys, '_MEIPASS'):
+    # PyInstaller 打包：map_data 随程序解压到临时目录，编译缓存放到用户缓存目录，下次运行还能用
+    BASE_DIR = sys._MEIPASS
+    USER_CACHE = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    DEFAULT_CACHE_DIR = os.path.join(USER_CACHE, 'gamefinal', 'map_cache')
+else:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    DEFAULT_CACHE_DIR = os.path.join(BASE_DIR, 'map_cache')
+MAP_DIR = os.path.join(BASE_DIR, 'map_data')
+CACHE_DIR = os.environ.get('MAP_BINARY_CACHE', DEFAULT_CACHE_DIR)
+MAGIC = b'GMAP'
+FORMAT_VERSION = 2  # 文件布局或绘制方式变化时递增，使旧的编译结果全部失效
+
+# 魔数, 版本, 网格大小, 占用网格大小, 格子像素, 关键点数, 名称长度, 障碍物数, 合并矩形数, 图层宽, 图层高
+HEADER = struct.Struct('<4s10I')
+RECT = struct.Struct('<4i')
+POINT = struct.Struct('<2i')
+
+
+def source_file(name):
+    return os.path.join(MAP_DIR, f"{name}.json")
+
+
+def parse_source(data):
+    """源文件 → 地图字典；size 缺省为 grid_size（空地图沿用原来的 GRID_SIZE + 1），障碍物按分组顺序展开"""
+    obstacles = data.get('obstacles', [])
+    if isinstance(obstacles, dict):
+        obstacles = [rect for group in obstacles.values() for rect in group]
+    return {
+        'grid_size': data['grid_size'],
+        'size': data.get('size', data['grid_size']),
+        'points': {name: tuple(pos) for name, pos in data['points'].items()},
+        'obstacles': [tuple(rect) for rect in obstacles],
+    }
+
+
+def read_source(name):
+    """读取地图源文件，只解析 JSON，不需要 pygame"""
+    with open(source_file(name), encoding='utf-8') as f:
+        return parse_source(json.load(f))
+
+
+# ================= 编译 =================
+def render_layer(source, cell, colors, canvas, point_radius):
+    """与各阶段 draw_static 相同的静态图层：背景、网格、障碍物、关键点"""
+    import pygame
+    grid_size = source['grid_size']
+    width, height = canvas
+    surface = pygame.Surface(canvas)
+    surface.fill(colors['background'])
+    for i in range(grid_size + 1):
+        pygame.draw.line(surface, colors['grid'], (i * cell, 0), (i * cell, height))
+        pygame.draw.line(surface, colors['grid'], (0, i * cell), (width, i * cell))
+    for ox, oy, ow, oh in source['obstacles']:
+        pygame.draw.rect(surface, colors['obstacle'],
+                         (ox * cell, (grid_size - oy - oh) * cell, ow * cell, oh * cell))
+    for name, (x, y) in source['points'].items():
+        pygame.draw.circle(surface, colors.get(name, (0, 0, 0)), (x * cell, (grid_size - y) * cell), point_radius)
+    return surface
+
+
+def compile_map(source, cell, colors, canvas, point_radius):
+    """地图字典 → 编译后的字节串"""
+    import pygame
+    size = source['size']
+    grid = compile_obstacles(source['obstacles'], size)
+    merged = merge_obstacles(source['obstacles'], size)
+    names = json.dumps(list(source['points']), ensure_ascii=False).encode('utf-8')
+    layer = pygame.image.tobytes(render_layer(dict(source, obstacles=merged), cell, colors, canvas, point_radius), 'RGB')
+    parts = [
+        HEADER.pack(MAGIC, FORMAT_VERSION, source['grid_size'], size, cell, len(source['points']), len(names),
+                    len(source['obstacles']), len(merged), canvas[0], canvas[1]),
+        bytes(grid.cells),
+        b''.join(RECT.pack(*rect) for rect in source['obstacles']),
+        b''.join(RECT.pack(*rect) for rect in merged),
+        b''.join(POINT.pack(*pos) for pos in source['points'].values()),
+        names,
+        layer,
+    ]
+    return b''.join(parts)
+
+
+class CompiledMap:
+    """mmap 打开的编译地图；occupancy 与 layer() 都直接引用映射的内存
+    给出 data 时直接引用内存中的编译结果（缓存目录不可写时）"""
+
+    def __init__(self, filename, data=None):
+        self.filename = filename
+        if data is None:
+            with open(filename, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mmap = data
+        view = memoryview(self._mmap)
+        if len(view) < HEADER.size:
+            raise ValueError(f"{filename} 不是完整的编译地图")
+        (magic, version, self.grid_size, self.size, self.cell, n_points, names_len,
+         n_obstacles, n_merged, width, height) = HEADER.unpack_from(view)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{filename} 不是版本 {FORMAT_VERSION} 的编译地图")
+        sizes = (self.size * self.size, n_obstacles * RECT.size, n_merged * RECT.size,
+                 n_points * POINT.size, names_len, width * height * 3)
+        if len(view) != HEADER.size + sum(sizes):
+            raise ValueError(f"{filename} 长度不符，可能写到一半")
+        sections, offset = [], HEADER.size
+        for length in sizes:
+            sections.append(view[offset:offset + length])
+            offset += length
+        cells, obstacles, merged, points, names, self._layer = sections
+        self.occupancy = OccupancyGrid.from_cells(cells, self.size)
+        self.obstacles = [tuple(rect) for rect in RECT.iter_unpack(obstacles)]
+        self.rectangles = [tuple(rect) for rect in RECT.iter_unpack(merged)]
+        self.points = dict(zip(json.loads(bytes(names).decode('utf-8')), POINT.iter_unpack(points)))
+        self.layer_size = (width, height)
+        self._index = None
+
+    def index(self):
+        """合并后矩形的空间索引，第一次用到时建立"""
+        if self._index is None:
+            self._index = ObstacleIndex(self.rectangles, self.size)
+        return self._index
+
+    def layer(self):
+        """预渲染的静态图层；Surface 直接引用映射的像素，需要时由调用方 convert()"""
+        import pygame
+        return pygame.image.frombuffer(self._layer, self.layer_size, 'RGB')
+
+
+# ================= 缓存 =================
+_loaded = {}  # 文件名 → CompiledMap，同一进程内只映射一次
+
+
+def artifact_file(name, raw, source, cell, colors, canvas, point_radius):
+    """缓存文件名：<名称>-<源文件哈希>-<绘制参数哈希>.gmap；只有用到的颜色参与哈希"""
+    used = [colors['background'], colors['grid'], colors.get('obstacle', (0, 0, 0))]
+    used += [colors.get(point, (0, 0, 0)) for point in source['points']]
+    style = repr((FORMAT_VERSION, cell, tuple(canvas), point_radius, [tuple(c) for c in used]))
+    source_key = hashlib.sha1(raw).hexdigest()[:12]
+    style_key = hashlib.sha1(style.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(CACHE_DIR, f"{name}-{source_key}-{style_key}.gmap")
+
+
+def _prune(name, current):
+    """删除同一地图由旧源文件编译出的缓存；正被其他进程映射的文件删不掉就留到下次"""
+    prefix = os.path.basename(current).rsplit('-', 1)[0]
+    for filename in glob.glob(os.path.join(CACHE_DIR, f"{glob.escape(name)}-{'?' * 12}-{'?' * 8}.gmap")):
+        if not os.path.basename(filename).startswith(prefix + '-'):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+
+def _write(filename, data):
+    """先写临时文件再改名；另一个进程已经写好同名文件时直接用它的"""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    temp = f"{filename}.{os.getpid()}.tmp"
+    with open(temp, 'wb') as f:
+        f.write(data)
+    try:
+        os.replace(temp, filename)
+    except OSError:
+        os.remove(temp)
+        if not os.path.exists(filename):
+            raise
+
+
+def load(name, cell, colors, canvas, point_radius=8, force=False):
+    """取编译好的地图；源文件或绘制参数变化、缓存缺失或损坏时重新编译，缓存目录不可写时只在内存中编译"""
+    with open(source_file(name), 'rb') as f:
+        raw = f.read()
+    source = parse_source(json.loads(raw.decode('utf-8')))
+    filename = artifact_file(name, raw, source, cell, colors, canvas, point_radius)
+    compiled = None if force else _loaded.get(filename)
+    if compiled is None and not force and os.path.exists(filename):
+        try:
+            compiled = CompiledMap(filename)
+        except (OSError, ValueError) as e:
+            print(f"重新编译 {name}: {e}")
+    if compiled is None:
+        data = compile_map(source, cell, colors, canvas, point_radius)
+        try:
+            _write(filename, data)
+        except OSError as e:
+            print(f"编译缓存不可写，{name} 只在内存中编译: {e}")
+            compiled = CompiledMap(filename, data)
+        else:
+            _prune(name, filename)
+            compiled = CompiledMap(filename)
+    _loaded[filename] = compiled
+    return compiled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列出地图文件及其编译缓存")
+    parser.add_argument('--clean', action='store_true', help="删除全部编译缓存")
+    args = parser.parse_args()
+
+    for filename in sorted(glob.glob(os.path.join(MAP_DIR, '*.json'))):
+        name = os.path.splitext(os.path.basename(filename))[0]
+        source = read_source(name)
+        merged = merge_obstacles(source['obstacles'], source['size'])
+        cached = glob.glob(os.path.join(CACHE_DIR, f"{glob.escape(name)}-{'?' * 12}-{'?' * 8}.gmap"))
+        print(f"{name}: {source['grid_size']}×{source['grid_size']}，{len(source['points'])} 个关键点，"
+              f"{len(source['obstacles'])} 个障碍物 → 合并为 {len(merged)} 个矩形，{len(cached)} 个编译缓存")
+        if args.clean:
+            for cache in cached:
+                os.remove(cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import ast
+import os
+from functools import lru_cache
+
+import map_files
+
+
+# ================= 地图几何信息 =================
+# 离线分析需要各阶段的网格大小、关键点和障碍物，但不希望为此导入 pygame 和阶段脚本
+# 地图几何信息读 map_data/ 下的地图文件；画布尺寸、颜色等绘制常量仍直接解析阶段脚本源码
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 地图名 → (阶段脚本, 地图文件名)；占用网格大小取地图文件里的 size（空地图为 GRID_SIZE + 1）
+MAP_SOURCES = {
+    'empty': ('3.empty.py', 'empty'),
+    'obstacles': ('5.obstacles.py', 'obstacles'),
+    'maze': ('experiment.py', 'empty'),
+    'fifth': ('experiment.py', 'obstacles'),
+}
+LARGE_PREFIX = 'large_'  # 大地图阶段的地图名为 large_<边长>，几何由障碍物地图平铺、放大得到，不对应地图文件
+# 地图名 → 阶段脚本中“障碍物是否挡路”的常量；没有列出的地图没有障碍物，常量缺失时按不挡路处理
+BLOCK_RULES = {
+    'obstacles': ('5.obstacles.py', 'BLOCK_OBSTACLES'),
+    'fifth': ('experiment.py', 'F5_BLOCK_OBSTACLES'),
+    LARGE_PREFIX: ('large_map.py', 'BLOCK_OBSTACLES'),
+}
+
+
+class GameMap:
+    """一张地图的几何信息：size×size 网格、关键点、障碍物矩形，以及游戏中障碍物是否挡路"""
+
+    def __init__(self, name, size, points, obstacles, grid_size=None, block_obstacles=False):
+        self.name = name
+        self.size = size
+        self.grid_size = size if grid_size is None else grid_size  # 阶段脚本中的 GRID_SIZE，屏幕坐标按它翻转 y
+        self.points = dict(points)
+        self.obstacles = tuple(tuple(o) for o in obstacles)
+        self.block_obstacles = block_obstacles  # 最短路等离线指标默认按这条规则计算
+
+    @property
+    def start(self):
+        return self.points['start']
+
+    @property
+    def goals(self):
+        """除起点外的目标点，按定义顺序"""
+        return {name: pos for name, pos in self.points.items() if name != 'start'}
+
+    def goal_at(self, pos):
+        for name, goal in self.goals.items():
+            if goal == tuple(pos):
+                return name
+        return None
+
+    def __repr__(self):
+        return f"GameMap({self.name!r}, size={self.size}, goals={list(self.goals)}, obstacles={len(self.obstacles)})"
+
+
+def _evaluate(node, env):
+    """只支持字面量、已定义常量和 + / * 运算，足够覆盖地图与画布常量"""
+    if isinstance(node, ast.Name):
+        return env[node.id]
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        return _evaluate(node.left, env) + _evaluate(node.right, env)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult):
+        return _evaluate(node.left, env) * _evaluate(node.right, env)
+    return ast.literal_eval(node)
+
+
+@lru_cache(maxsize=None)
+def script_constants(script):
+    """解析脚本中能静态求值的模块级常量"""
+    with open(os.path.join(BASE_DIR, script), encoding='utf-8') as f:
+        tree = ast.parse(f.read(), script)
+    env = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            try:
+                env[node.targets[0].id] = _evaluate(node.value, env)
+            except (ValueError, KeyError, TypeError, SyntaxError):
+                pass
+    return env
+
+
+def tiled_obstacles(size, pattern='obstacles'):
+    """把原阶段的障碍物图案平铺到 size×size，超出地图的部分裁掉"""
+    base = load_map(pattern)
+    obstacles = []
+    for ty in range(0, size, base.size):
+        for tx in range(0, size, base.size):
+            for ox, oy, ow, oh in base.obstacles:
+                x, y = ox + tx, oy + ty
+                w, h = min(ow, size - x), min(oh, size - y)
+                if w > 0 and h > 0:
+                    obstacles.append((x, y, w, h))
+    return obstacles
+
+
+def scaled_points(size, pattern='obstacles'):
+    """原阶段的起点和目标按比例放大"""
+    base = load_map(pattern)
+    scale = (size - 1) / (base.size - 1)
+    return {name: (round(x * scale), round(y * scale)) for name, (x, y) in base.points.items()}
+
+
+def large_map_name(size):
+    return f"{LARGE_PREFIX}{size}"
+
+
+def blocks_obstacles(name):
+    """游戏中这张地图的障碍物是否挡路，取自阶段脚本的 BLOCK_OBSTACLES 常量"""
+    rule = BLOCK_RULES.get(LARGE_PREFIX if name.startswith(LARGE_PREFIX) else name)
+    return bool(rule and script_constants(rule[0]).get(rule[1], False))
+
+
+@lru_cache(maxsize=None)
+def load_map(name):
+    if name.startswith(LARGE_PREFIX):
+        size = int(name[len(LARGE_PREFIX):])
+        return GameMap(name, size, scaled_points(size), tiled_obstacles(size), block_obstacles=blocks_obstacles(name))
+    source = map_files.read_source(MAP_SOURCES[name][1])
+    return GameMap(name, source['size'], source['points'], source['obstacles'], source['grid_size'],
+                   blocks_obstacles(name))
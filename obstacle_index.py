@@ -0,0 +1,226 @@
+import math
+from functools import lru_cache
+
+from occupancy import compile_obstacles
+
+
+# ================= 障碍物合并与空间索引 =================
+# 障碍物大多是 1 格高或 1 格宽的细条，逐条绘制、逐条比较都随条数线性增长
+# merge_obstacles 把它们合并成尽量少的覆盖矩形（矩形可以重叠，并集与原障碍物完全相同）
+# ObstacleIndex 把矩形按固定大小的桶分组，点查询、视线判断和最近障碍物查询都只看附近的桶
+BUCKET_CELLS = 8  # 每个桶的边长（格）
+
+
+# ================= 合并 =================
+def _greedy_cover(grid):
+    """按行扫描，每个未覆盖的格子扩展成一个最大矩形（可以越过已覆盖的格子），再删掉被其他矩形完全覆盖的矩形"""
+    size, cells = grid.size, grid.cells
+    count = bytearray(size * size)  # 每格被几个矩形覆盖
+
+    def occupied(x, y):
+        return cells[y * size + x]
+
+    def grow(x, y, horizontal):
+        w = h = 1
+        if horizontal:
+            while x + w < size and occupied(x + w, y):
+                w += 1
+            while y + h < size and all(occupied(i, y + h) for i in range(x, x + w)):
+                h += 1
+        else:
+            while y + h < size and occupied(x, y + h):
+                h += 1
+            while x + w < size and all(occupied(x + w, j) for j in range(y, y + h)):
+                w += 1
+        return x, y, w, h
+
+    def gain(rect):
+        x, y, w, h = rect
+        return sum(1 for j in range(y, y + h) for i in range(x, x + w) if not count[j * size + i])
+
+    rects = []
+    for y in range(size):
+        for x in range(size):
+            if not occupied(x, y) or count[y * size + x]:
+                continue
+            rect = max(grow(x, y, True), grow(x, y, False), key=gain)
+            rx, ry, w, h = rect
+            for j in range(ry, ry + h):
+                for i in range(rx, rx + w):
+                    count[j * size + i] += 1
+            rects.append(rect)
+    kept = []
+    for rect in reversed(rects):  # 后加的矩形通常是补缝的小块，先检查它们
+        x, y, w, h = rect
+        cells_in = [j * size + i for j in range(y, y + h) for i in range(x, x + w)]
+        if all(count[i] > 1 for i in cells_in):
+            for i in cells_in:
+                count[i] -= 1
+        else:
+            kept.append(rect)
+    return sorted(kept, key=lambda r: (r[1], r[0]))
+
+
+def merge_obstacles(obstacles, size):
+    """障碍物矩形 → 尽量少的覆盖矩形 (x, y, w, h)；在按行/列拼接的不重叠划分和允许重叠的贪心覆盖中取较少的一种"""
+    grid = compile_obstacles(obstacles, size)
+    partition = grid.rectangles()
+    cover = _greedy_cover(grid)
+    return cover if len(cover) < len(partition) else partition
+
+
+# ================= 空间索引 =================
+class ObstacleIndex:
+    """障碍物矩形的均匀分桶索引；坐标都是格子坐标，矩形 (x, y, w, h) 覆盖 x..x+w-1、y..y+h-1"""
+
+    def __init__(self, rects, size, bucket=BUCKET_CELLS):
+        self.rects = [tuple(r) for r in rects]
+        self.size = size
+        self.bucket = bucket
+        self.buckets = {}  # (bx, by) → [矩形下标]
+        for index, (x, y, w, h) in enumerate(self.rects):
+            for key in self.buckets_in(x, y, w, h):
+                self.buckets.setdefault(key, []).append(index)
+
+    def buckets_in(self, x, y, w, h):
+        b = self.bucket
+        return [(bx, by) for by in range(max(y, 0) // b, (y + h - 1) // b + 1)
+                for bx in range(max(x, 0) // b, (x + w - 1) // b + 1)]
+
+    def __len__(self):
+        return len(self.rects)
+
+    # ---------- 点与区域 ----------
+    def hit(self, x, y):
+        """格子 (x, y) 所在的障碍物矩形，不在障碍物上时返回 None"""
+        for index in self.buckets.get((x // self.bucket, y // self.bucket), ()):
+            rx, ry, w, h = self.rects[index]
+            if rx <= x < rx + w and ry <= y < ry + h:
+                return self.rects[index]
+        return None
+
+    def query(self, x, y, w, h):
+        """与区域 (x, y, w, h) 相交的矩形，按原顺序"""
+        found = set()
+        for key in self.buckets_in(x, y, w, h):
+            for index in self.buckets.get(key, ()):
+                rx, ry, rw, rh = self.rects[index]
+                if rx < x + w and x < rx + rw and ry < y + h and y < ry + rh:
+                    found.add(index)
+        return [self.rects[i] for i in sorted(found)]
+
+    # ---------- 视线 ----------
+    def line_of_sight(self, a, b):
+        """两格中心的连线是否不穿过任何障碍物内部；只擦过边或角不算遮挡，起点或终点在障碍物上算遮挡"""
+        ax, ay = a[0] + 0.5, a[1] + 0.5
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        checked = set()
+        for key in self._buckets_along(ax, ay, dx, dy):
+            for index in self.buckets.get(key, ()):
+                if index not in checked:
+                    checked.add(index)
+                    if _segment_hits(ax, ay, dx, dy, self.rects[index]):
+                        return False
+        return True
+
+    def _buckets_along(self, ax, ay, dx, dy):
+        """线段经过的桶（在桶坐标上做 DDA 遍历）"""
+        b = self.bucket
+        bx, by = int(ax // b), int(ay // b)
+        end = (int((ax + dx) // b), int((ay + dy) // b))
+        step_x, step_y = (dx > 0) - (dx < 0), (dy > 0) - (dy < 0)
+        next_x = ((bx + (step_x > 0)) * b - ax) / dx if dx else math.inf
+        next_y = ((by + (step_y > 0)) * b - ay) / dy if dy else math.inf
+        delta_x = abs(b / dx) if dx else math.inf
+        delta_y = abs(b / dy) if dy else math.inf
+        yield bx, by
+        while (bx, by) != end:
+            if next_x < next_y:
+                bx += step_x
+                next_x += delta_x
+            elif next_y < next_x:
+                by += step_y
+                next_y += delta_y
+            else:  # 正好穿过桶的角，相邻的两个桶也要检查
+                yield bx + step_x, by
+                yield bx, by + step_y
+                bx, by = bx + step_x, by + step_y
+                next_x += delta_x
+                next_y += delta_y
+            yield bx, by
+
+    # ---------- 最近障碍物 ----------
+    def nearest(self, x, y):
+        """离格子 (x, y) 最近的障碍物格的欧氏距离（格）和所在矩形；在障碍物上为 0，没有障碍物时为 (inf, None)"""
+        if not self.rects:
+            return math.inf, None
+        b = self.bucket
+        cx, cy = x // b, y // b
+        reach = max(cx, cy, (self.size - 1) // b - cx, (self.size - 1) // b - cy) + 1
+        best, best_rect = math.inf, None
+        for ring in range(reach + 1):
+            # 第 ring 圈的桶离 (x, y) 至少 (ring - 1) * b + 1 格，已找到的更近就不必再往外找
+            if best_rect is not None and best <= (ring - 1) * b + 1:
+                break
+            for key in _ring(cx, cy, ring):
+                for index in self.buckets.get(key, ()):
+                    distance = _cell_distance(x, y, self.rects[index])
+                    if distance < best:
+                        best, best_rect = distance, self.rects[index]
+        return best, best_rect
+
+    def nearest_distances(self, path):
+        """路径每一步到最近障碍物的距离；重复经过的格子只查一次"""
+        cache = {}
+        distances = []
+        for pos in path:
+            pos = tuple(pos)
+            if pos not in cache:
+                cache[pos] = self.nearest(*pos)[0]
+            distances.append(cache[pos])
+        return distances
+
+
+def _ring(cx, cy, ring):
+    if ring == 0:
+        return [(cx, cy)]
+    keys = [(cx + i, cy - ring) for i in range(-ring, ring + 1)]
+    keys += [(cx + i, cy + ring) for i in range(-ring, ring + 1)]
+    keys += [(cx - ring, cy + j) for j in range(-ring + 1, ring)]
+    keys += [(cx + ring, cy + j) for j in range(-ring + 1, ring)]
+    return keys
+
+
+def _cell_distance(x, y, rect):
+    rx, ry, w, h = rect
+    dx = max(rx - x, 0, x - (rx + w - 1))
+    dy = max(ry - y, 0, y - (ry + h - 1))
+    return math.hypot(dx, dy)
+
+
+def _segment_hits(ax, ay, dx, dy, rect):
+    """线段 (ax, ay) → (ax + dx, ay + dy) 是否进入矩形内部（Liang-Barsky 裁剪，边界开区间）"""
+    x, y, w, h = rect
+    low, high = 0.0, 1.0
+    for start, delta, lo, hi in ((ax, dx, x, x + w), (ay, dy, y, y + h)):
+        if delta == 0:
+            if not lo < start < hi:
+                return False
+            continue
+        t1, t2 = (lo - start) / delta, (hi - start) / delta
+        if t1 > t2:
+            t1, t2 = t2, t1
+        low, high = max(low, t1), min(high, t2)
+        if low >= high:
+            return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def _build(obstacles, size):
+    return ObstacleIndex(merge_obstacles(obstacles, size), size)
+
+
+def build_index(obstacles, size):
+    """同一份障碍物列表只合并、建索引一次"""
+    return _build(tuple(tuple(o) for o in obstacles), size)
@@ -0,0 +1,112 @@
+from functools import lru_cache
+
+
+# ================= 障碍物占用网格 =================
+class OccupancyGrid:
+    """把障碍物矩形列表预编译成 size×size 的占用表，碰撞和越界检查都是 O(1)"""
+
+    def __init__(self, obstacles, size):
+        self.size = size
+        self.cells = bytearray(size * size)  # cells[y * size + x] == 1 表示障碍物
+        for ox, oy, w, h in obstacles:
+            x0, x1 = max(ox, 0), min(ox + w, size)
+            if x1 <= x0:
+                continue
+            for y in range(max(oy, 0), min(oy + h, size)):
+                row = y * size
+                self.cells[row + x0:row + x1] = b'\x01' * (x1 - x0)
+
+    @classmethod
+    def from_cells(cls, cells, size):
+        """直接使用已编译好的占用表（如编译地图文件里映射的内存），不复制"""
+        grid = cls.__new__(cls)
+        grid.size = size
+        grid.cells = cells
+        return grid
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    def is_obstructed(self, x, y):
+        """与原先逐个遍历矩形的结果一致：网格外不算障碍物"""
+        return 0 <= x < self.size and 0 <= y < self.size and self.cells[y * self.size + x] == 1
+
+    def is_free(self, x, y):
+        return 0 <= x < self.size and 0 <= y < self.size and self.cells[y * self.size + x] == 0
+
+    def is_valid_move(self, current, new, block_obstacles=True):
+        """相邻一步、不越界，且（需要时）不进入障碍物"""
+        if abs(new[0] - current[0]) + abs(new[1] - current[1]) != 1:
+            return False
+        if not self.in_bounds(*new):
+            return False
+        return not (block_obstacles and self.cells[new[1] * self.size + new[0]])
+
+    def rectangles(self):
+        """把占用格合并成互不重叠的矩形 (x, y, w, h)
+
+        每个四连通块分别按行、按列合并连续段，取矩形较少的一种：横条堆成的块按行合并，竖条堆成的块按列合并
+        """
+        size, cells = self.size, self.cells
+        seen = bytearray(size * size)
+        rects = []
+        for start in range(size * size):
+            if not cells[start] or seen[start]:
+                continue
+            seen[start] = 1
+            block, stack = [], [start]
+            while stack:
+                i = stack.pop()
+                x, y = i % size, i // size
+                block.append((x, y))
+                for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                    j = ny * size + nx
+                    if 0 <= nx < size and 0 <= ny < size and cells[j] and not seen[j]:
+                        seen[j] = 1
+                        stack.append(j)
+            by_row = _merge_runs(block)
+            by_column = [(x, y, w, h) for y, x, h, w in _merge_runs([(y, x) for x, y in block])]
+            rects.extend(by_row if len(by_row) <= len(by_column) else by_column)
+        return sorted(rects, key=lambda r: (r[1], r[0]))
+
+    def to_array(self):
+        """返回 (size, size) 的 NumPy bool 视图，按 [y, x] 索引，不复制数据"""
+        import numpy as np
+        return np.frombuffer(self.cells, dtype=np.uint8).reshape(self.size, self.size).view(bool)
+
+
+def _merge_runs(block):
+    """按行找连续段，相邻行上范围相同的段并成一个矩形"""
+    rows = {}
+    for x, y in block:
+        rows.setdefault(y, []).append(x)
+    rects, open_runs = [], {}  # (x0, x1) → [x, y, w, h]，延伸到上一行的矩形
+    for y in sorted(rows):
+        runs = set()
+        xs = sorted(rows[y])
+        start = xs[0]
+        for a, b in zip(xs, xs[1:] + [None]):
+            if b != a + 1:
+                runs.add((start, a + 1))
+                start = b
+        for key in list(open_runs):
+            rect = open_runs[key]
+            if key not in runs or rect[1] + rect[3] != y:
+                rects.append(tuple(open_runs.pop(key)))
+        for key in runs:
+            if key in open_runs:
+                open_runs[key][3] += 1
+            else:
+                open_runs[key] = [key[0], y, key[1] - key[0], 1]
+    rects.extend(tuple(r) for r in open_runs.values())
+    return rects
+
+
+@lru_cache(maxsize=None)
+def _compile(obstacles, size):
+    return OccupancyGrid(obstacles, size)
+
+
+def compile_obstacles(obstacles, size):
+    """同一份障碍物列表只编译一次，各游戏共享同一个占用网格"""
+    return _compile(tuple(tuple(o) for o in obstacles), size)
@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+
+# ================= 区域选择位掩码 =================
+# 7×7 个区域的选中状态存成一个整数位掩码，第 ry * REGIONS + rx 位对应区域 (rx, ry)，ry 从下往上数
+# 切换、查询都是 O(1)；确认时除了图片还保存 selected_regions_<时间戳>.json，整批分析时一次性解码成数组
+# 用法：python regions.py selected_regions [--stage obstacles] [--out masks.npy]
+REGIONS = 7  # 每边的区域数（49 格 / 每区域 7 格）
+SELECTION_VERSION = 1
+
+
+class RegionMask:
+    """选中区域集合；迭代按位序给出 (rx, ry)，可直接替换原来的列表用于绘制"""
+
+    def __init__(self, bits=0, regions=REGIONS):
+        self.bits = int(bits)
+        self.regions = regions
+
+    def _bit(self, rx, ry):
+        if not (0 <= rx < self.regions and 0 <= ry < self.regions):
+            raise ValueError(f"区域 ({rx}, {ry}) 超出 {self.regions}×{self.regions} 范围")
+        return 1 << (ry * self.regions + rx)
+
+    def toggle(self, rx, ry):
+        """切换选中状态，返回切换后是否选中"""
+        self.bits ^= self._bit(rx, ry)
+        return bool(self.bits & self._bit(rx, ry))
+
+    def clear(self):
+        self.bits = 0
+
+    def __contains__(self, region):
+        rx, ry = region
+        return 0 <= rx < self.regions and 0 <= ry < self.regions and bool(self.bits & self._bit(rx, ry))
+
+    def __iter__(self):
+        bits, index = self.bits, 0
+        while bits:
+            if bits & 1:
+                yield index % self.regions, index // self.regions
+            bits >>= 1
+            index += 1
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __repr__(self):
+        return f"RegionMask({self.bits:#x}, {list(self)})"
+
+
+def region_at(x, y, region_pixels, grid_pixels):
+    """屏幕像素 → 区域坐标 (rx, ry)；ry 从下往上数，与 RegionMask 一致"""
+    return x // region_pixels, (grid_pixels - y - 1) // region_pixels
+
+
+def region_rect(rx, ry, region_pixels, grid_pixels):
+    """区域坐标 → 屏幕矩形 (x, y, w, h)"""
+    return (rx * region_pixels, grid_pixels - (ry + 1) * region_pixels, region_pixels, region_pixels)
+
+
+def save_selection(filename, mask, stage, timestamp=None):
+    """把选择写成 JSON（先写临时文件再改名）"""
+    data = {
+        'version': SELECTION_VERSION,
+        'stage': stage,
+        'timestamp': timestamp,
+        'regions': mask.regions,
+        'mask': mask.bits,
+        'selected': [list(r) for r in mask],  # 冗余的可读列表，分析时只用 mask
+    }
+    temp = filename + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp, filename)
+
+
+def discover_selections(root):
+    found = []
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if name.startswith('selected_regions_') and name.endswith('.json'):
+                found.append(os.path.join(folder, name))
+    return sorted(found)
+
+
+def load_selections(root, stage=None):
+    """读取 root 下所有选择文件，返回 (文件列表, 阶段列表, (N, REGIONS, REGIONS) 布尔数组，按 [ry, rx] 索引)"""
+    import numpy as np
+    files, stages, bits = [], [], []
+    for filename in discover_selections(root):
+        try:
+            with open(filename, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"跳过 {filename}: {e}")
+            continue
+        if data.get('regions') != REGIONS or (stage and data.get('stage') != stage):
+            continue
+        files.append(filename)
+        stages.append(data.get('stage'))
+        bits.append(data['mask'])
+    masks = np.array(bits, dtype=np.uint64).reshape(-1, 1)
+    shifts = np.arange(REGIONS * REGIONS, dtype=np.uint64)
+    decoded = ((masks >> shifts) & np.uint64(1)).astype(bool)
+    return files, stages, decoded.reshape(-1, REGIONS, REGIONS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="汇总所有参与者的区域选择")
+    parser.add_argument('root', nargs='?', default='selected_regions', help="选择文件所在目录（递归查找）")
+    parser.add_argument('--stage', help="只统计某个阶段：empty, obstacles, maze, full_maze")
+    parser.add_argument('--out', help="把 (N, 7, 7) 掩码数组保存为 .npy")
+    args = parser.parse_args()
+
+    files, stages, masks = load_selections(args.root, args.stage)
+    if not files:
+        print(f"{args.root} 下没有找到选择文件")
+        return
+    print(f"{len(files)} 份选择（{', '.join(sorted(set(s or '?' for s in stages)))}），每个区域被选中的比例：")
+    frequency = masks.mean(axis=0)
+    for ry in reversed(range(REGIONS)):  # 上方的区域先打印，与屏幕一致
+        print(' '.join(f"{frequency[ry, rx]:5.2f}" for rx in range(REGIONS)))
+    if args.out:
+        import numpy as np
+        np.save(args.out, masks)
+        print(f"保存成功: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import pygame
+
+
+# ================= 静态图层缓存 =================
+class StaticLayer:
+    """缓存网格、障碍物、关键点等不变内容的背景图层"""
+
+    def __init__(self, size, draw_fn):
+        self.size = size
+        self.draw_fn = draw_fn  # draw_fn(surface) 负责把静态内容画到给定表面上
+        self.surface = None
+
+    def get(self):
+        if self.surface is None:
+            self.rebuild()
+        return self.surface
+
+    def rebuild(self):
+        surface = pygame.Surface(self.size)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()  # 与屏幕像素格式一致，blit 更快
+        self.draw_fn(surface)
+        self.surface = surface
+
+    def invalidate(self):
+        self.surface = None
+
+
+_shared_layers = {}  # key -> StaticLayer，同一进程内的各阶段共用
+
+
+def shared_layer(key, size, draw_fn):
+    """按 key 取进程内共享的静态图层；阶段重新创建游戏对象时不必重画背景"""
+    layer = _shared_layers.get(key)
+    if layer is None or layer.size != size:
+        layer = _shared_layers[key] = StaticLayer(size, draw_fn)
+    return layer
+
+
+# ================= 脏矩形渲染 =================
+class DirtyRenderer:
+    """只重绘发生变化的区域，并只把这些矩形提交给 display.update"""
+
+    def __init__(self, screen, layer):
+        self.screen = screen
+        self.layer = layer
+        self.dirty = []
+        self.full_redraw = True
+
+    def invalidate(self):
+        """下一帧整屏重绘（首帧、窗口切换、撤回等）"""
+        self.full_redraw = True
+
+    def reset(self):
+        """把整张背景贴回屏幕"""
+        self.screen.blit(self.layer.get(), (0, 0))
+
+    def restore(self, rect, redraw=None):
+        """用背景恢复指定区域，redraw 在裁剪区内补画动态内容（如路径）"""
+        rect = pygame.Rect(rect).clip(self.screen.get_rect())
+        if not rect.width or not rect.height:
+            return rect
+        self.screen.blit(self.layer.get(), rect, rect)
+        if redraw is not None:
+            previous_clip = self.screen.get_clip()
+            self.screen.set_clip(rect)
+            redraw()
+            self.screen.set_clip(previous_clip)
+        self.dirty.append(rect)
+        return rect
+
+    def mark(self, rect):
+        self.dirty.append(pygame.Rect(rect))
+
+    def present(self):
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        elif self.dirty:
+            pygame.display.update(self.dirty)
+        self.dirty = []
+
+
+def circle_rect(center, radius, padding=2):
+    """圆形标记的包围矩形（含线宽余量）"""
+    size = 2 * (radius + padding) + 1
+    return pygame.Rect(center[0] - radius - padding, center[1] - radius - padding, size, size)
+
+
+# ================= 路径变化跟踪 =================
+class PathTracker:
+    """记住上一帧路径末尾的若干点，找出本帧新增或撤回的点"""
+
+    def __init__(self, depth=32):
+        self.depth = depth
+        self.length = None
+        self.tail = []
+
+    def reset(self, path):
+        self.length = len(path)
+        self.tail = list(path[-self.depth:])
+
+    def changes(self, path):
+        """返回需要重绘的路径点（含衔接点）；变化超出记录范围时返回 None"""
+        old_length, old_tail = self.length, self.tail
+        self.reset(path)
+        if old_length is None:
+            return None
+        start = old_length - len(old_tail)  # old_tail[0] 在旧路径中的下标
+        # 在记录窗口内找出新旧路径的公共前缀长度
+        common = start
+        overlap = min(old_length, len(path))
+        while common < overlap and path[common] == old_tail[common - start]:
+            common += 1
+        if common == start and start > 0:
+            return None
+        if common == old_length == len(path):
+            return []
+        lo = max(common - 1, 0)
+        return old_tail[max(lo - start, 0):] + list(path[lo:])
+
+
+# ================= 增量路径图层 =================
+class PathLayer:
+    """持久化的路径图层：每走一步只画一段线，撤回时从检查点恢复
+
+    最近 max_checkpoints 个检查点间隔 checkpoint_every 个点，更早的检查点间隔按距离成倍放宽，
+    检查点总数只随路径长度对数增长；撤回越过密集区后，从较早的检查点重画时顺带补上新的检查点
+    """
+
+    COLORKEY = (255, 0, 255)  # 透明色，路径以外的像素不参与 blit
+
+    def __init__(self, size, convert, color, width, checkpoint_every=128, max_checkpoints=8, window=32):
+        self.size = size
+        self.convert = convert  # 逻辑坐标 → 屏幕坐标
+        self.color = color
+        self.width = width
+        self.checkpoint_every = checkpoint_every
+        self.max_checkpoints = max_checkpoints
+        self.window = window  # 每次同步时比对的路径末尾长度
+        self.surface = pygame.Surface(size)
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+        self.surface.set_colorkey(self.COLORKEY)
+        self.points = []
+        self.checkpoints = []  # [(已绘制点数, 图层快照)]
+        self.clear()
+
+    def get(self):
+        return self.surface
+
+    def clear(self):
+        self.surface.fill(self.COLORKEY)
+        self.points = []
+        self.checkpoints = []
+
+    def sync(self, path):
+        """让图层与 path 一致：只补画新增的线段，撤回的部分从检查点恢复"""
+        points = self.points
+        common = min(len(points), len(path))
+        for i in range(max(common - self.window, 0), common):
+            if points[i] != path[i]:
+                common = i
+                break
+        if common < len(points):
+            self.truncate(common)
+        for i in range(len(points), len(path)):
+            self.append(path[i])
+
+    def append(self, point):
+        points = self.points
+        points.append(tuple(point))
+        if len(points) > 1:
+            pygame.draw.line(self.surface, self.color,
+                             self.convert(*points[-2]), self.convert(*points[-1]), self.width)
+        if len(points) % self.checkpoint_every == 0:
+            self.checkpoint(len(points))
+
+    def checkpoint(self, length):
+        """保存前 length 个点的快照，并按距离稀疏化更早的检查点"""
+        self.checkpoints.append((length, self.surface.copy()))
+        self.checkpoints = [(drawn, snapshot) for drawn, snapshot in self.checkpoints
+                            if drawn % self.stride(length - drawn) == 0]
+
+    def stride(self, age):
+        """离末端 age 个点处的检查点间隔：每远 max_checkpoints 个间隔，间隔加倍"""
+        stride = self.checkpoint_every
+        while age > stride * self.max_checkpoints:
+            stride *= 2
+        return stride
+
+    def truncate(self, length):
+        """撤回到只剩前 length 个点"""
+        while self.checkpoints and self.checkpoints[-1][0] > length:
+            self.checkpoints.pop()
+        self.surface.fill(self.COLORKEY)
+        if self.checkpoints:
+            drawn, snapshot = self.checkpoints[-1]
+            self.surface.blit(snapshot, (0, 0))
+        else:
+            drawn = min(length, 1)  # 还没有检查点（路径很短）时从头重画
+        for i in range(max(drawn, 1), length):
+            pygame.draw.line(self.surface, self.color,
+                             self.convert(*self.points[i - 1]), self.convert(*self.points[i]), self.width)
+            if (i + 1) % self.checkpoint_every == 0:
+                self.checkpoint(i + 1)  # 重画经过的位置补上检查点，后续撤回不再重画这一段
+        del self.points[length:]
+
+    def draw(self, surface):
+        surface.blit(self.surface, (0, 0))
@@ -0,0 +1,197 @@
+import argparse
+import os
+import time
+
+import pygame
+from pygame.locals import QUIT, KEYDOWN, K_ESCAPE, K_SPACE, K_EQUALS, K_PLUS, K_MINUS, K_KP_PLUS, K_KP_MINUS
+
+import maps
+from analyze_archives import MAP_NAMES, archive_map, matching_sidecars
+from archive_writer import get_writer
+from controller import load_stage
+from headless import STAGES
+from trajectory import Trajectory, read_archive
+
+# ================= 会话回放 =================
+# 读取 .traj 或 archive_* 存档，用游戏自己的渲染（缓存背景 + 增量路径图层 + 脏矩形）逐步重现路径
+# 有逐步时间时按原始节奏播放，可设倍速或 max（不等待）；--export 时不开窗口，批量导出编号帧
+# 用法：python replay.py archive_xxx.traj [--speed 4 | --speed max] [--export frames/] [--fps 30]
+DEFAULT_STEP_MS = 200  # 没有逐步时间的旧存档按固定间隔回放
+SPEED_STEPS = (0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+
+def load_session(filename, map_name=None):
+    """返回 (地图名, 路径点列表, 逐步毫秒时间或 None)
+
+    .traj 文件：map_name 覆盖文件头中的地图；存档：地图与逐步时间取自与存档一致的 .traj，没有时用 map_name"""
+    if filename.endswith('.traj'):
+        trajectory = Trajectory(filename)
+        path = list(zip(trajectory.x.tolist(), trajectory.y.tolist()))
+        times = trajectory.t.tolist() if trajectory.has_times else None
+        name = map_name or MAP_NAMES.get(trajectory.map_id)
+        if not name or name == 'unknown':
+            raise ValueError(f"{filename} 没有记录地图，请用 --map 指定")
+        if name == 'large':
+            raise ValueError(f"{filename} 是大地图轨迹，边长记录在存档 meta 中，请读取对应的存档")
+        return name, path, times
+    path, meta = read_archive(filename)
+    name = archive_map(filename, map_name, path, meta)
+    recorded = 'large' if name.startswith(maps.LARGE_PREFIX) else name
+    for trajectory in matching_sidecars(filename, path):
+        if MAP_NAMES.get(trajectory.map_id) in (recorded, 'unknown') and trajectory.has_times:
+            return name, path, trajectory.t.tolist()
+    return name, path, None
+
+
+class Replay:
+    """驱动一个游戏实例的状态与渲染；frame(i) 把画面推进到第 i 步"""
+
+    def __init__(self, map_name, path, times=None):
+        script, class_name = STAGES[map_name][:2]
+        self.game = getattr(load_stage(script), class_name)()
+        self.game.game_started = True
+        self.path = [tuple(p) for p in path]
+        if times is None:
+            times = [i * DEFAULT_STEP_MS for i in range(len(self.path))]
+        self.times = times
+        self.index = -1
+
+    @property
+    def duration_ms(self):
+        return self.times[-1] if self.times else 0
+
+    def step_at(self, t_ms):
+        """t_ms 时刻应显示的步数下标"""
+        lo, hi = 0, len(self.times) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.times[mid] <= t_ms:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def seek(self, index):
+        """推进游戏状态；向后跳转时从头重建（转弯计数规则与游戏一致）"""
+        game = self.game
+        if index < self.index:
+            self.index = -1
+        if self.index < 0:
+            game.path = [self.path[0]]
+            game.turn_count = 0
+            game.previous_direction = None
+            self.index = 0
+        for i in range(self.index + 1, index + 1):
+            new = self.path[i]
+            direction = (new[0] - game.path[-1][0], new[1] - game.path[-1][1])
+            if len(game.path) > 1:
+                angle = game.calculate_angle(game.path[-2], game.path[-1], new)
+                if angle >= 25 and game.previous_direction != direction:
+                    game.turn_count += 1
+            game.path.append(new)
+            game.previous_direction = direction
+        game.current_pos = list(game.path[-1])
+        self.index = index
+
+    def frame(self, index):
+        self.seek(index)
+        if self.game.dirty_rendering:
+            self.game.render_dirty()
+        else:
+            self.game.render_full()
+
+    def present(self):
+        if self.game.dirty_rendering:
+            self.game.renderer.present()
+        else:
+            pygame.display.flip()
+
+    def play(self, speed=1.0):
+        """窗口播放；空格暂停，+/- 调整倍速，Esc 退出；speed 为 None 表示不等待"""
+        clock = pygame.time.Clock()
+        elapsed = 0.0
+        paused = False
+        last = time.perf_counter()
+        index = 0
+        while True:
+            for event in pygame.event.get():
+                if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+                    return
+                if event.type == KEYDOWN and event.key == K_SPACE:
+                    paused = not paused
+                if event.type == KEYDOWN and speed and event.key in (K_PLUS, K_EQUALS, K_KP_PLUS, K_MINUS, K_KP_MINUS):
+                    faster = event.key in (K_PLUS, K_EQUALS, K_KP_PLUS)
+                    options = [s for s in SPEED_STEPS if (s > speed if faster else s < speed)]
+                    speed = (min(options) if faster else max(options)) if options else speed
+                    pygame.display.set_caption(f"回放 ×{speed}")
+            now = time.perf_counter()
+            if not paused:
+                elapsed += (now - last) * 1000 * (speed or 1)
+            last = now
+            if speed is None:
+                index = min(index + 1, len(self.path) - 1)
+            elif not paused:
+                index = self.step_at(elapsed)
+            self.frame(index)
+            self.present()
+            if index == len(self.path) - 1 and (speed is None or elapsed >= self.duration_ms):
+                return
+            clock.tick(0 if speed is None else 60)
+
+    def export(self, folder, every=1, fps=None, speed=1.0, image_format='png'):
+        """批量导出编号图片：fps 为空时每 every 步一帧，否则按原始时间每秒 fps 帧"""
+        os.makedirs(folder, exist_ok=True)
+        writer = get_writer()
+        if fps:
+            count = int(self.duration_ms / speed / 1000 * fps) + 1
+            indices = [self.step_at(k * 1000 / fps * speed) for k in range(count)]
+        else:
+            indices = list(range(0, len(self.path), every))
+            if indices[-1] != len(self.path) - 1:
+                indices.append(len(self.path) - 1)
+        for n, index in enumerate(indices):
+            self.frame(index)
+            # 图片编码交给后台线程，主线程继续渲染下一帧
+            writer.submit(pygame.image.save, self.game.screen.copy(),
+                          os.path.join(folder, f"frame_{n:05d}.{image_format}"))
+        writer.flush()
+        return len(indices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放 .traj / archive_* 存档，或批量导出帧序列")
+    parser.add_argument('file')
+    parser.add_argument('--map', choices=sorted(STAGES), help="存档未记录地图时使用")
+    parser.add_argument('--speed', default='1', help="倍速，或 max 表示不等待")
+    parser.add_argument('--export', help="不开窗口，把帧导出到该目录")
+    parser.add_argument('--every', type=int, default=1, help="导出时每隔几步取一帧")
+    parser.add_argument('--fps', type=float, help="导出时按原始时间每秒取几帧（乘以倍速）")
+    parser.add_argument('--format', default='png', choices=('png', 'bmp', 'tga', 'jpg'),
+                        help="导出图片格式；渲染每帧约 1ms，PNG 压缩约 18ms，bmp/tga 约 3ms")
+    parser.add_argument('--font', help="覆盖阶段脚本中的 FONT_PATH")
+    args = parser.parse_args()
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    if args.export:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    map_name, path, times = load_session(args.file, args.map)
+    pygame.init()
+    module = load_stage(STAGES[map_name][0])
+    if args.font:
+        module.FONT_PATH = args.font
+    if module.FONT_PATH and not os.path.exists(module.FONT_PATH):
+        module.FONT_PATH = None  # 找不到阶段配置的字体时退回 pygame 默认字体
+    replay = Replay(map_name, path, times)
+    start = time.perf_counter()
+    if args.export:
+        count = replay.export(args.export, args.every, args.fps, speed or 1.0, args.format)
+        print(f"导出 {count} 帧到 {args.export}，用时 {time.perf_counter() - start:.2f}s"
+              f"（会话时长 {replay.duration_ms / 1000:.1f}s{'' if times else '，无逐步时间'}）")
+    else:
+        pygame.display.set_caption(f"回放 ×{args.speed}")
+        replay.play(speed)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
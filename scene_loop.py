@@ -0,0 +1,58 @@
+import asyncio
+import sys
+import time
+
+import pygame
+
+from archive_writer import get_writer
+
+# ================= 场景主循环 =================
+# 各阶段的场景只实现 frame()（取事件、更新、绘制一帧，不调用 tick）和 running 属性，可选 close()
+# 桌面版用 run(scene)：阻塞循环，clock.tick(FPS) 限帧
+# 网页版（pygbag）用 await run_async(scene)：每帧 await asyncio.sleep(0) 把控制权交回浏览器，
+# 帧节奏由 requestAnimationFrame 决定；阶段切换、等待存档写完也都是可 await 的，浏览器标签页始终能响应
+# 用法：在 pygbag 的入口里 asyncio.run(experiment.main_async()) 或 asyncio.run(controller.main_async())
+FPS = 30
+IS_WEB = sys.platform == 'emscripten'  # pygbag / WebAssembly
+
+
+def run(scene, fps=FPS):
+    """阻塞运行一个场景直到 running 变为 False"""
+    while scene.running:
+        scene.frame()
+        scene.clock.tick(fps)  # 每帧重新取 clock：F3 计时开启时会被替换成计时包装
+    close(scene)
+
+
+async def run_async(scene, fps=FPS):
+    """协作式运行一个场景；每帧之后让出控制权，期间后台的存档任务和浏览器事件得以执行"""
+    if getattr(scene, 'idle', None) is not None:
+        scene.idle.enabled = False  # 空闲渲染会阻塞在 event.wait，协作式循环里不能用
+    frame_seconds = 1 / fps
+    next_frame = time.perf_counter()
+    while scene.running:
+        scene.frame()
+        if IS_WEB:
+            scene.clock.tick()  # 只计时不限帧，节奏交给 requestAnimationFrame
+            await asyncio.sleep(0)
+        else:
+            next_frame = max(next_frame + frame_seconds, time.perf_counter())
+            await asyncio.sleep(next_frame - time.perf_counter())
+            scene.clock.tick()
+    close(scene)
+
+
+def close(scene):
+    if hasattr(scene, 'close'):
+        scene.close()
+
+
+async def transition():
+    """阶段之间：丢弃上一阶段残留的输入，并让出一帧，让新窗口尺寸先生效"""
+    pygame.event.clear()
+    await asyncio.sleep(0)
+
+
+async def wait_writes():
+    """等待已提交的存档写完，期间不阻塞事件循环"""
+    await get_writer().join()
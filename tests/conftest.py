@@ -0,0 +1,9 @@
+import os
+import sys
+
+# 测试在无窗口环境下运行；脚本都在仓库根目录，按脚本方式导入
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
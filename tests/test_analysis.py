@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+import analyze_archives
+import distance_fields
+import maps
+from trajectory import MAP_IDS, save_sidecar
+
+
+@pytest.fixture(autouse=True)
+def no_disk_cache(monkeypatch):
+    monkeypatch.setattr(distance_fields, 'DISK_CACHE', False)
+
+
+def manhattan_path(start, goal):
+    """先横后竖的直线路径，游戏中允许穿过障碍物时就是一条最短路"""
+    (x, y), path = start, [start]
+    while x != goal[0]:
+        x += 1 if goal[0] > x else -1
+        path.append((x, y))
+    while y != goal[1]:
+        y += 1 if goal[1] > y else -1
+        path.append((x, y))
+    return path
+
+
+def write_archive(folder, name, map_name, path, meta):
+    filename = str(folder / name)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'path': path}, f)
+    save_sidecar(filename, path, list(range(len(path))), MAP_IDS[map_name], path[-1])
+    return filename
+
+
+def test_shortest_path_follows_game_rule(tmp_path):
+    game_map = maps.load_map('obstacles')
+    assert not game_map.block_obstacles  # 障碍物阶段允许穿过障碍物
+    path = manhattan_path(game_map.start, game_map.points['far1'])
+    filename = write_archive(tmp_path, 'archive_20260101_000000_2.json', 'obstacles', path, {'turns': 1})
+
+    row = analyze_archives.analyze_file((filename, None, None))
+    assert row['error'] is None
+    assert row['map'] == 'obstacles' and row['goal'] == 'far1'
+    assert row['shortest'] == row['steps'] and row['efficiency'] == 1.0
+    assert row['timestamp'] == '20260101_000000'  # 去掉同一秒保存时加的序号
+
+    blocked = analyze_archives.analyze_file((filename, None, True))
+    assert blocked['shortest'] > row['shortest']  # 按绕开障碍物计算时效率会超过 1
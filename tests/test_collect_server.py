@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import pytest
+
+from collect_server import SESSION_TTL, CollectServer, HttpError, read_sessions
+
+
+def batch(seq, final=False):
+    return json.dumps({'seq': seq, 'stage': 'obstacles', 'moves': [[seq, 0, seq * 10]], 'final': final}).encode()
+
+
+async def post(port, path, body):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                 + body)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, payload = raw.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(payload)
+
+
+def test_duplicates_are_written_once(tmp_path):
+    async def run():
+        server = await CollectServer(str(tmp_path), port=0).start()
+        try:
+            replies = await asyncio.gather(*(post(server.port, '/sessions/s1/batches', batch(1)) for _ in range(5)))
+            replies.append(await post(server.port, '/sessions/s1/batches', batch(2, final=True)))
+            bad = await post(server.port, '/sessions/s1/batches', b'{"seq": "x"}')
+        finally:
+            await server.close()
+        return server, replies, bad
+
+    server, replies, bad = asyncio.run(run())
+    assert all(status == 200 for status, _ in replies)
+    assert sorted(reply['duplicate'] for _, reply in replies[:5]) == [False, True, True, True, True]
+    assert bad[0] == 400
+    stored = read_sessions(server.appender.filename)
+    assert [r['seq'] for r in stored['s1']] == [1, 2]
+
+
+def test_failed_write_is_not_acknowledged(tmp_path):
+    async def run():
+        server = await CollectServer(str(tmp_path), port=0).start()
+        append, calls = server.appender.append, []
+
+        async def flaky(line):
+            calls.append(line)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise OSError('disk full')
+            await append(line)
+        server.appender.append = flaky
+
+        async def accept():
+            try:
+                return await server.accept('s1', batch(1))
+            except HttpError as e:
+                return e.status
+        try:
+            first = await asyncio.gather(accept(), accept())
+            second = await asyncio.gather(accept(), accept())
+        finally:
+            await server.close()
+        return server, first, second
+
+    server, first, second = asyncio.run(run())
+    assert first == [500, 500]  # 第一次写入失败，等待它的重发也不能确认
+    assert sorted(reply['duplicate'] for reply in second) == [False, True]
+    assert len(read_sessions(server.appender.filename)['s1']) == 1
+
+
+def test_acknowledged_seqs_collapse_to_a_mark(tmp_path):
+    async def run():
+        server = await CollectServer(str(tmp_path), port=0).start()
+        try:
+            for seq in (0, 1, 3):
+                await server.accept('s1', batch(seq))
+            idle = server.sessions['s1']
+            kept = sorted(idle.writes)
+            server.collapse_idle(now=idle.last_seen + SESSION_TTL + 1)  # 0、1 相连，3 前面缺 2
+            after_ttl = (idle.floor, idle.mark, sorted(idle.writes))
+            await server.accept('s1', batch(2))
+            await server.accept('s1', batch(4, final=True))
+            resent = [await server.accept('s1', batch(seq)) for seq in (1, 4)]
+        finally:
+            await server.close()
+        return server, kept, after_ttl, resent
+
+    server, kept, after_ttl, resent = asyncio.run(run())
+    assert kept == [0, 1, 3]
+    assert after_ttl == (0, 1, [3])
+    state = server.sessions['s1']
+    assert (state.floor, state.mark, state.writes) == (0, 4, {})
+    assert all(reply['duplicate'] for reply in resent)
+    assert [r['seq'] for r in read_sessions(server.appender.filename)['s1']] == [0, 1, 2, 3, 4]
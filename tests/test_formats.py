@@ -0,0 +1,167 @@
+import os
+
+import pytest
+
+import event_log
+import map_files
+import trajectory
+from occupancy import compile_obstacles
+
+
+class SyncWriter:
+    """与 ArchiveWriter 接口相同，但在当前线程里立即执行"""
+
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+# ================= .traj =================
+def test_trajectory_round_trip(tmp_path):
+    path = [(0, 0), (1, 0), (1, 1), (2, 1)]
+    times = [0, 120, 250, 4000000000]
+    filename = str(tmp_path / 'archive_maze_20260101_000000.traj')
+    trajectory.save_trajectory(filename, path, times, trajectory.MAP_IDS['maze'], (2, 1), 'archive_20260101_000000')
+
+    t = trajectory.Trajectory(filename)
+    assert t.version == trajectory.SCHEMA_VERSION
+    assert t.map_id == trajectory.MAP_IDS['maze']
+    assert t.archive == 'archive_20260101_000000'
+    assert t.start == (0, 0) and t.goal == (2, 1) and t.reached and t.has_times
+    assert list(zip(t.x.tolist(), t.y.tolist())) == path
+    assert t.t.tolist() == times
+
+
+def test_trajectory_without_times_or_goal(tmp_path):
+    filename = str(tmp_path / 'a.traj')
+    trajectory.save_trajectory(filename, [(3, 4), (3, 5)])
+    t = trajectory.Trajectory(filename)
+    assert not t.has_times and not t.reached and t.goal is None and t.archive is None
+    assert len(t) == 2
+
+
+def test_trajectory_ignores_partial_record(tmp_path):
+    filename = str(tmp_path / 'a.traj')
+    trajectory.save_trajectory(filename, [(0, 0), (0, 1)], [0, 10], archive='archive_x')
+    with open(filename, 'ab') as f:
+        f.write(b'\x01\x02\x03')  # 写到一半中断
+    assert len(trajectory.Trajectory(filename)) == 2
+
+
+def test_trajectory_version_1(tmp_path):
+    filename = str(tmp_path / 'archive_20260101_000000.traj')
+    with open(filename, 'wb') as f:
+        f.write(trajectory.HEADER.pack(trajectory.MAGIC, 1, 2, 0, 5, 6, -1, -1, 0))
+        f.write(trajectory.STEP.pack(5, 6, 0) + trajectory.STEP.pack(5, 7, 9))
+    t = trajectory.Trajectory(filename)
+    assert t.archive is None and t.map_id == 2
+    assert t.y.tolist() == [6, 7]
+    assert trajectory.find_sidecars(str(tmp_path / 'archive_20260101_000000.json')) == [filename]
+
+
+def test_sidecars_are_unique_per_archive(tmp_path):
+    first = trajectory.unique_path(str(tmp_path / 'archive_20260101_000000.xlsx'), trajectory.ARCHIVE_EXTENSIONS)
+    open(first, 'w').close()
+    second = trajectory.unique_path(str(tmp_path / 'archive_20260101_000000.json'), trajectory.ARCHIVE_EXTENSIONS)
+    assert os.path.basename(second) == 'archive_20260101_000000_2.json'
+    a = trajectory.save_sidecar(first, [(0, 0)], [0], trajectory.MAP_IDS['empty'])
+    b = trajectory.save_sidecar(second, [(1, 1)], [0], trajectory.MAP_IDS['obstacles'])
+    assert trajectory.find_sidecars(first) == [a]
+    assert trajectory.find_sidecars(second) == [b]
+    assert os.path.basename(trajectory.image_path(second)) == 'path_20260101_000000_2.png'
+
+
+def test_not_a_trajectory(tmp_path):
+    filename = tmp_path / 'bad.traj'
+    filename.write_bytes(b'nope')
+    with pytest.raises(ValueError):
+        trajectory.Trajectory(str(filename))
+
+
+# ================= .evlog =================
+def test_event_log_round_trip(tmp_path):
+    filename = str(tmp_path / 'events_maze_20260101_000000.evlog')
+    log = event_log.EventLog(capacity=8, batch=3, writer=SyncWriter())
+    log.record(event_log.MOVE, 9, 9)  # open 之前的记录不写入
+    assert log.open(filename, trajectory.MAP_IDS['maze']) == filename
+    records = [(event_log.START, 0, 0)] + [(event_log.MOVE, i, -i) for i in range(1, 12)] + [(event_log.FINISH, 11, -11)]
+    for record in records:
+        log.record(*record)
+    log.close()
+    archive = str(tmp_path / 'archive_20260101_000000_2.xlsx')
+    log.link(archive)  # 存档在关闭之后才写出
+
+    header, events = event_log.read_events(filename)
+    assert header['version'] == event_log.SCHEMA_VERSION
+    assert header['map_id'] == trajectory.MAP_IDS['maze']
+    assert header['archive'] == 'archive_20260101_000000_2'
+    assert [(int(e['kind']), int(e['x']), int(e['y'])) for e in events] == records
+    assert (events['t_ns'][1:] >= events['t_ns'][:-1]).all()
+    assert events['t_ns'][0] >= header['t0_ns']
+    assert event_log.find_events(archive) == [filename]
+
+
+def test_event_logs_never_overwrite(tmp_path):
+    filename = str(tmp_path / 'events_empty_20260101_000000.evlog')
+    first, second = event_log.EventLog(writer=SyncWriter()), event_log.EventLog(writer=SyncWriter())
+    assert first.open(filename) == filename
+    first.record(event_log.START, 1, 1)
+    first.close()
+    assert second.open(filename) == str(tmp_path / 'events_empty_20260101_000000_2.evlog')
+    assert len(event_log.read_events(filename)[1]) == 1
+
+
+def test_event_log_version_1(tmp_path):
+    filename = tmp_path / 'events.evlog'
+    filename.write_bytes(event_log.HEADER_V1.pack(event_log.MAGIC, 1, 100, 200)
+                         + event_log.RECORD.pack(150, event_log.START, 2, 3))
+    header, events = event_log.read_events(str(filename))
+    assert (header['map_id'], header['archive'], header['t0_ns']) == (0, None, 100)
+    assert events['x'].tolist() == [2] and events['y'].tolist() == [3]
+
+
+def test_not_an_event_log(tmp_path):
+    filename = tmp_path / 'bad.evlog'
+    filename.write_bytes(b'MTRJ' + bytes(40))
+    with pytest.raises(ValueError):
+        event_log.read_events(str(filename))
+
+
+# ================= .gmap =================
+COLORS = {'background': (255, 255, 255), 'grid': (200, 200, 200), 'obstacle': (0, 0, 0), 'start': (0, 255, 0)}
+
+
+@pytest.fixture
+def map_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(map_files, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(map_files, '_loaded', {})
+    return tmp_path
+
+
+def test_compiled_map_round_trip(map_cache):
+    source = map_files.read_source('obstacles')
+    compiled = map_files.load('obstacles', 10, COLORS, (400, 400))
+    assert compiled.filename.startswith(str(map_cache))
+    assert compiled.size == source['size'] and compiled.grid_size == source['grid_size']
+    assert compiled.obstacles == source['obstacles']
+    assert compiled.points == source['points']
+    assert bytes(compiled.occupancy.cells) == bytes(compile_obstacles(source['obstacles'], source['size']).cells)
+    assert compile_obstacles(compiled.rectangles, compiled.size).cells == compiled.occupancy.cells
+    assert compiled.layer().get_size() == (400, 400)
+
+    map_files._loaded.clear()
+    reopened = map_files.load('obstacles', 10, COLORS, (400, 400))
+    assert reopened is not compiled and reopened.filename == compiled.filename
+    assert bytes(reopened._layer) == bytes(compiled._layer)
+
+
+def test_truncated_compiled_map_is_rebuilt(map_cache):
+    compiled = map_files.load('obstacles', 10, COLORS, (400, 400))
+    data = open(compiled.filename, 'rb').read()
+    map_files._loaded.clear()
+    with open(compiled.filename + '.tmp', 'wb') as f:
+        f.write(data[:len(data) // 2])
+    os.replace(compiled.filename + '.tmp', compiled.filename)  # 新文件，已映射的旧内容不受影响
+    with pytest.raises(ValueError):
+        map_files.CompiledMap(compiled.filename)
+    assert map_files.load('obstacles', 10, COLORS, (400, 400)).occupancy.cells == compile_obstacles(
+        map_files.read_source('obstacles')['obstacles'], compiled.size).cells
@@ -0,0 +1,71 @@
+import math
+import random
+
+import pytest
+
+from obstacle_index import ObstacleIndex, _segment_hits, build_index, merge_obstacles
+from occupancy import compile_obstacles
+
+
+def random_obstacles(rng, size, count):
+    """细条为主，夹杂少量块状障碍物，与实验地图的形状相近"""
+    obstacles = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            w, h = (rng.randint(1, 8), 1) if rng.random() < 0.5 else (1, rng.randint(1, 8))
+        else:
+            w, h = rng.randint(2, 5), rng.randint(2, 5)
+        obstacles.append((rng.randrange(size), rng.randrange(size), w, h))
+    return obstacles
+
+
+def cells_of(obstacles, size):
+    grid = compile_obstacles(obstacles, size)
+    return [(i % size, i // size) for i, v in enumerate(grid.cells) if v]
+
+
+CASES = [(seed, size, count) for seed, (size, count) in enumerate([(16, 10), (24, 40), (40, 120), (33, 0)])]
+
+
+@pytest.mark.parametrize('seed,size,count', CASES)
+def test_merge_keeps_union(seed, size, count):
+    obstacles = random_obstacles(random.Random(seed), size, count)
+    merged = merge_obstacles(obstacles, size)
+    assert compile_obstacles(merged, size).cells == compile_obstacles(obstacles, size).cells
+    assert len(merged) <= max(len(obstacles), 1)
+
+
+@pytest.mark.parametrize('seed,size,count', CASES)
+def test_index_matches_brute_force(seed, size, count):
+    rng = random.Random(100 + seed)
+    obstacles = random_obstacles(rng, size, count)
+    occupied = set(cells_of(obstacles, size))
+    index = build_index(obstacles, size)
+    unit = [(x, y, 1, 1) for x, y in occupied]
+
+    for x in range(size):
+        for y in range(size):
+            assert (index.hit(x, y) is not None) == ((x, y) in occupied)
+            expected = min((math.hypot(x - ox, y - oy) for ox, oy in occupied), default=math.inf)
+            assert index.nearest(x, y)[0] == pytest.approx(expected)
+
+    for _ in range(300):
+        a = (rng.randrange(size), rng.randrange(size))
+        b = (rng.randrange(size), rng.randrange(size))
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        blocked = any(_segment_hits(a[0] + 0.5, a[1] + 0.5, dx, dy, rect) for rect in unit)
+        assert index.line_of_sight(a, b) == (not blocked)
+
+        x, y, w, h = rng.randrange(size), rng.randrange(size), rng.randint(1, 6), rng.randint(1, 6)
+        region = {(i, j) for i in range(x, x + w) for j in range(y, y + h)}
+        found = index.query(x, y, w, h)
+        covered = {c for rx, ry, rw, rh in found for c in region
+                   if rx <= c[0] < rx + rw and ry <= c[1] < ry + rh}
+        assert covered == region & occupied
+
+
+def test_empty_index():
+    index = ObstacleIndex([], 10)
+    assert index.hit(3, 3) is None
+    assert index.nearest(3, 3) == (math.inf, None)
+    assert index.line_of_sight((0, 0), (9, 9))
@@ -0,0 +1,82 @@
+import random
+
+import pygame
+import pytest
+
+from render_cache import PathLayer, PathTracker
+
+SIZE = (200, 200)
+
+
+def convert(x, y):
+    return 4 + 8 * x, SIZE[1] - 4 - 8 * y
+
+
+def random_walk(rng, length):
+    x, y, path = 10, 10, [(10, 10)]
+    for _ in range(length - 1):
+        dx, dy = rng.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
+        x, y = min(max(x + dx, 0), 23), min(max(y + dy, 0), 23)
+        path.append((x, y))
+    return path
+
+
+def pixels(layer):
+    return pygame.image.tobytes(layer.get(), 'RGB')
+
+
+def repainted(path, **options):
+    layer = PathLayer(SIZE, convert, (255, 0, 0), 3, **options)
+    layer.sync(path)
+    return layer
+
+
+@pytest.mark.parametrize('options', [{}, {'checkpoint_every': 4, 'max_checkpoints': 2}])
+def test_undo_redo_matches_full_repaint(options):
+    rng = random.Random(1)
+    layer = PathLayer(SIZE, convert, (255, 0, 0), 3, **options)
+    full = random_walk(rng, 600)
+    path = []
+    for _ in range(400):
+        if path and rng.random() < 0.35:
+            del path[-rng.randint(1, 40):]  # 撤回若干步
+        else:
+            path.extend(full[len(path):len(path) + rng.randint(1, 30)])
+        layer.sync(path)
+        assert layer.points == path
+        if rng.random() < 0.1:
+            assert pixels(layer) == pixels(repainted(path, **options))
+    layer.sync([])
+    assert pixels(layer) == pixels(repainted([], **options))
+
+
+def test_path_tracker_changes():
+    tracker = PathTracker(depth=4)
+    assert tracker.changes([(0, 0)]) is None  # 第一帧整屏重绘
+    assert tracker.changes([(0, 0), (1, 0)]) == [(0, 0), (0, 0), (1, 0)]
+    assert tracker.changes([(0, 0), (1, 0)]) == []
+    assert tracker.changes([(0, 0)]) == [(0, 0), (1, 0), (0, 0)]
+    long = [(i, 0) for i in range(10)]
+    tracker.changes(long)
+    assert tracker.changes([(0, 1)] + long[1:3]) is None  # 变化早于记录窗口
+
+
+def test_undo_past_checkpoint_window_stays_bounded(monkeypatch):
+    every, window = 16, 4
+    path = random_walk(random.Random(2), 5000)
+    layer = PathLayer(SIZE, convert, (255, 0, 0), 3, checkpoint_every=every, max_checkpoints=window)
+    layer.sync(path)
+    assert len(layer.checkpoints) < 40  # 检查点个数随路径长度对数增长
+
+    drawn = []
+    line = pygame.draw.line
+    monkeypatch.setattr(pygame.draw, 'line', lambda *args: drawn.append(1) or line(*args))
+    costs = []
+    for length in range(len(path) - 1, len(path) - 3000, -1):  # 逐步撤回，远远越过最近的检查点
+        del drawn[:]
+        layer.sync(path[:length])
+        costs.append(len(drawn))
+    # 越过密集区时从较早的检查点重画一段（不超过离末端距离的一小部分），之后的撤回又只画几段
+    assert max(costs) <= len(path) // window
+    assert sum(costs) / len(costs) <= 2 * every
+    assert pixels(layer) == pixels(repainted(path[:length], checkpoint_every=every, max_checkpoints=window))
@@ -0,0 +1,263 @@
+import argparse
+import glob
+import json
+import os
+import re
+import struct
+
+
+# ================= 二进制轨迹格式 =================
+# 文件 = 32 字节文件头 + 若干 8 字节步记录，只追加写入，步数由文件大小推出
+# 文件头（小端）：魔数 'MTRJ'、版本、地图编号、标志位、起点 x/y、到达的目标 x/y（未到达为 -1）、存档名长度
+# 版本 2 起文件头之后是所属存档的文件名主干（UTF-8，补齐到 8 字节），版本 1 没有这一段
+# 步记录（小端）：int16 x、int16 y、uint32 相对开始时刻的毫秒数
+# 存档旁的轨迹文件名为 archive_<地图>_<时间戳>.traj：同一秒保存的不同阶段存档不会共用一个轨迹文件
+MAGIC = b'MTRJ'
+SCHEMA_VERSION = 2
+HEADER = struct.Struct('<4sHHHhhhhH12x')
+STEP = struct.Struct('<hhI')
+HEADER_SIZE = HEADER.size  # 32
+STEP_SIZE = STEP.size  # 8
+
+FLAG_REACHED = 0x1  # 到达了某个目标点
+FLAG_NO_TIMES = 0x2  # 由旧存档转换而来，没有逐步时间
+
+# 地图编号，0 表示未知
+MAP_IDS = {'unknown': 0, 'empty': 1, 'obstacles': 2, 'maze': 3, 'fifth': 4, 'large': 5}  # large 的边长见存档 meta.size
+MAP_NAMES = {map_id: name for name, map_id in MAP_IDS.items()}
+ARCHIVE_EXTENSIONS = ('.json', '.xlsx')
+ARCHIVE_NAME = re.compile(r'^archive_(\d{8}_\d{6})(?:_\d+)?$')  # 同一秒保存的存档带 _2、_3 … 序号
+
+
+def step_dtype():
+    """与 STEP 对应的 NumPy 结构化类型"""
+    import numpy as np
+    return np.dtype([('x', '<i2'), ('y', '<i2'), ('t', '<u4')])
+
+
+# ================= 写入 =================
+class TrajectoryWriter:
+    """逐步追加写入轨迹文件；close 时回写文件头中的到达目标与标志位"""
+
+    def __init__(self, filename, map_id=0, start=(0, 0), flags=0, archive=None):
+        self.filename = filename
+        self.map_id = map_id
+        self.start = tuple(start)
+        self.flags = flags
+        self.archive = archive.encode('utf-8') if archive else b''
+        self.goal = (-1, -1)
+        self.file = open(filename, 'wb')
+        self.write_header()
+
+    def write_header(self):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, SCHEMA_VERSION, self.map_id, self.flags,
+                                    self.start[0], self.start[1], self.goal[0], self.goal[1], len(self.archive)))
+        self.file.write(self.archive.ljust(_padded(len(self.archive)), b'\0'))
+
+    def append(self, x, y, t_ms=0):
+        self.file.write(STEP.pack(x, y, t_ms))
+
+    def extend(self, points, times=None):
+        times = times if times is not None else [0] * len(points)
+        self.file.write(b''.join(STEP.pack(x, y, t) for (x, y), t in zip(points, times)))
+
+    def close(self, goal=None):
+        if goal is not None:
+            self.goal = tuple(goal)
+            self.flags |= FLAG_REACHED
+        self.write_header()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if not self.file.closed:
+            self.close()
+
+
+def _padded(length):
+    return (length + 7) // 8 * 8
+
+
+def save_trajectory(filename, path, times=None, map_id=0, goal=None, archive=None):
+    """一次性写出整条路径；times 为每步的毫秒偏移，缺省时标记为无时间；archive 为所属存档的文件名主干"""
+    flags = 0 if times is not None else FLAG_NO_TIMES
+    writer = TrajectoryWriter(filename, map_id, path[0] if path else (0, 0), flags, archive)
+    writer.extend(path, times)
+    writer.close(goal)
+    return filename
+
+
+def archive_stem(archive):
+    return os.path.splitext(os.path.basename(archive))[0]
+
+
+def archive_timestamp(archive):
+    """存档名中的时间戳（去掉 unique_path 加的序号）；不是 archive_<时间戳> 形式时返回 None"""
+    match = ARCHIVE_NAME.match(archive_stem(archive))
+    return match.group(1) if match else None
+
+
+def unique_path(filename, extensions=None, taken=()):
+    """文件已存在时在主干后加序号（_2、_3 …），同一秒内保存的多份存档不会互相覆盖
+    extensions 给出时，主干相同、扩展名为其中之一的文件也算占用（存档 .json 与 .xlsx 共用主干命名空间）
+    taken 中的文件名也算占用（已分配给后台写入、还没建出来的文件）"""
+    base, ext = os.path.splitext(filename)
+    stem, n = base, 1
+    while any(os.path.exists(stem + e) or stem + e in taken for e in extensions or (ext,)):
+        n += 1
+        stem = f"{base}_{n}"
+    return stem + ext
+
+
+def sidecar_path(archive, map_id):
+    """存档旁的轨迹文件名 archive_<地图>_<时间戳>.traj；同名文件已存在时加序号，不覆盖"""
+    stamp = archive_stem(archive)[len('archive_'):]
+    return unique_path(os.path.join(os.path.dirname(archive), f"archive_{MAP_NAMES.get(map_id, 'unknown')}_{stamp}.traj"))
+
+
+def image_path(archive, ext='.png'):
+    """存档对应的路径图 path_<存档名主干去掉 archive_>.png，与存档同目录；存档名已唯一，图片不会互相覆盖，与 render_paths 的命名一致"""
+    stamp = archive_stem(archive)[len('archive_'):]
+    return os.path.join(os.path.dirname(archive), f"path_{stamp}{ext}")
+
+
+def save_sidecar(archive, path, times=None, map_id=0, goal=None):
+    """为存档写出轨迹文件，文件中记录存档名主干，返回轨迹文件名"""
+    return save_trajectory(sidecar_path(archive, map_id), path, times, map_id, goal, archive_stem(archive))
+
+
+# ================= 读取 =================
+class Trajectory:
+    """内存映射读取轨迹文件，x / y / t 都是文件数据上的 NumPy 视图，不复制"""
+
+    def __init__(self, filename):
+        import numpy as np
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            raw = f.read(HEADER_SIZE)
+            if len(raw) < HEADER_SIZE or raw[:4] != MAGIC:
+                raise ValueError(f"不是轨迹文件: {filename}")
+            (_, self.version, self.map_id, self.flags,
+             sx, sy, gx, gy, archive_len) = HEADER.unpack(raw)
+            if self.version > SCHEMA_VERSION:
+                raise ValueError(f"不支持的轨迹版本 {self.version}: {filename}")
+            if self.version < 2:
+                archive_len = 0  # 版本 1 的这两个字节是填充
+            self.archive = f.read(archive_len).decode('utf-8') if archive_len else None
+        self.start = (sx, sy)
+        self.goal = (gx, gy) if self.flags & FLAG_REACHED else None
+        # 追加写入中途中断时忽略末尾不完整的记录
+        offset = HEADER_SIZE + _padded(archive_len)
+        count = max(os.path.getsize(filename) - offset, 0) // STEP_SIZE
+        if count:
+            self.steps = np.memmap(filename, dtype=step_dtype(), mode='r',
+                                   offset=offset, shape=(count,))
+        else:
+            self.steps = np.zeros(0, dtype=step_dtype())
+
+    @property
+    def x(self):
+        return self.steps['x']
+
+    @property
+    def y(self):
+        return self.steps['y']
+
+    @property
+    def t(self):
+        return self.steps['t']
+
+    @property
+    def reached(self):
+        return bool(self.flags & FLAG_REACHED)
+
+    @property
+    def has_times(self):
+        return not self.flags & FLAG_NO_TIMES
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return (f"Trajectory({self.filename!r}, map_id={self.map_id}, steps={len(self)}, "
+                f"start={self.start}, goal={self.goal}, archive={self.archive!r})")
+
+
+def open_trajectory(filename):
+    return Trajectory(filename)
+
+
+def find_sidecars(archive):
+    """存档旁所有记录了该存档的轨迹文件，以及旧版（版本 1）与存档同名的 .traj"""
+    stem = archive_stem(archive)
+    folder = os.path.dirname(archive)
+    found = []
+    legacy = os.path.join(folder, stem + '.traj')
+    if os.path.exists(legacy):
+        found.append(legacy)
+    pattern = os.path.join(glob.escape(folder), f"archive_*_{glob.escape(stem[len('archive_'):])}*.traj")
+    for filename in sorted(glob.glob(pattern)):
+        if filename != legacy and Trajectory(filename).archive == stem:
+            found.append(filename)
+    return found
+
+
+# ================= 旧存档转换 =================
+def read_archive(filename):
+    """读取 archive_*.json 或 archive_*.xlsx，返回 (路径点列表, meta)；meta 含 duration / steps / turns"""
+    if filename.endswith('.json'):
+        with open(filename, encoding='utf-8') as f:
+            data = json.load(f)
+        return [tuple(p) for p in data['path']], data.get('meta', {})
+    if filename.endswith('.xlsx'):
+        import pandas as pd
+        sheets = pd.read_excel(filename, sheet_name=None)
+        path = [(int(x), int(y)) for x, y in sheets['Path'][['x', 'y']].itertuples(index=False)]
+        meta = {}
+        summary = sheets.get('Summary')
+        if summary is not None and len(summary):
+            row = summary.iloc[0]
+            for key, column in (('duration', 'Total Duration (Seconds)'), ('steps', 'Total Steps'),
+                                ('turns', 'Total Turns')):
+                if column in row:
+                    meta[key] = row[column].item()
+        return path, meta
+    raise ValueError(f"不支持的存档类型: {filename}")
+
+
+def convert_archive(filename, output=None, map_id=0):
+    """把旧存档转换为 .traj；存档只在到达目标时写出，因此路径终点即到达的目标"""
+    path, _ = read_archive(filename)
+    output = output or sidecar_path(filename, map_id)
+    return save_trajectory(output, path, None, map_id, path[-1] if path else None, archive_stem(filename))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="二进制轨迹文件：转换旧存档 / 查看文件信息")
+    sub = parser.add_subparsers(dest='command', required=True)
+    convert = sub.add_parser('convert', help="把 archive_*.json / archive_*.xlsx 转换为 .traj")
+    convert.add_argument('archives', nargs='+', help="存档文件或通配符")
+    convert.add_argument('--map', default='unknown', choices=sorted(MAP_IDS), help="地图名称")
+    convert.add_argument('--out-dir', help="输出目录，默认与存档同目录")
+    info = sub.add_parser('info', help="打印 .traj 文件头与步数")
+    info.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        for pattern in args.archives:
+            for filename in sorted(glob.glob(pattern)) or [pattern]:
+                output = None
+                if args.out_dir:
+                    os.makedirs(args.out_dir, exist_ok=True)
+                    output = sidecar_path(os.path.join(args.out_dir, os.path.basename(filename)), MAP_IDS[args.map])
+                print(f"{filename} -> {convert_archive(filename, output, MAP_IDS[args.map])}")
+    else:
+        for filename in args.files:
+            print(open_trajectory(filename))
+
+
+if __name__ == "__main__":
+    main()
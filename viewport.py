@@ -0,0 +1,211 @@
+from collections import OrderedDict
+
+import pygame
+
+
+# ================= 跟随视口 =================
+class Camera:
+    """视口左上角在世界像素坐标中的位置；目标离开视口中间区域时才平移，并限制在地图范围内"""
+
+    def __init__(self, view_size, world_size, margin=0.3):
+        self.view_w, self.view_h = view_size
+        self.world_w, self.world_h = world_size
+        self.margin = margin  # 目标距视口边缘小于该比例时开始平移
+        self.x = 0
+        self.y = 0
+
+    def clamp(self):
+        self.x = max(0, min(self.x, self.world_w - self.view_w))
+        self.y = max(0, min(self.y, self.world_h - self.view_h))
+
+    def center_on(self, pos):
+        self.x = pos[0] - self.view_w // 2
+        self.y = pos[1] - self.view_h // 2
+        self.clamp()
+
+    def follow(self, pos):
+        mx, my = int(self.view_w * self.margin), int(self.view_h * self.margin)
+        if pos[0] < self.x + mx:
+            self.x = pos[0] - mx
+        elif pos[0] > self.x + self.view_w - mx:
+            self.x = pos[0] - self.view_w + mx
+        if pos[1] < self.y + my:
+            self.y = pos[1] - my
+        elif pos[1] > self.y + self.view_h - my:
+            self.y = pos[1] - self.view_h + my
+        self.clamp()
+
+    def to_screen(self, pos):
+        return pos[0] - self.x, pos[1] - self.y
+
+    @property
+    def rect(self):
+        """当前可见的世界像素区域"""
+        return pygame.Rect(self.x, self.y, self.view_w, self.view_h)
+
+
+# ================= 分块预渲染地图 =================
+CHUNK_CELLS = 32  # 每块的边长（格）
+MAX_CHUNKS = 48  # 最多缓存的块数；15 像素格子时每块约 0.9MB，总内存与地图大小无关
+
+
+class ChunkedLayer:
+    """把网格、障碍物、关键点和路径预渲染到固定大小的块里
+
+    每帧只贴视口覆盖的块（数量只取决于视口大小）；路径每走一步只在缓存中的相关块上补画一段，
+    撤回时只让受影响的块失效；块按最近使用淘汰，被淘汰的块下次可见时从分桶数据重新绘制
+    """
+
+    def __init__(self, size, cell, colors, obstacles, points, path_color=(0, 0, 0), path_width=3,
+                 point_radius=8, chunk_cells=CHUNK_CELLS, max_chunks=MAX_CHUNKS, window=32):
+        self.size = size
+        self.cell = cell
+        self.colors = colors
+        self.path_color = path_color
+        self.path_width = path_width
+        self.point_radius = point_radius
+        self.chunk_px = chunk_cells * cell
+        self.max_chunks = max_chunks
+        self.window = window  # 每次同步时比对的路径末尾长度
+        self.world_size = (size * cell + 1, size * cell + 1)  # 含最后一条网格线
+        self.chunks = OrderedDict()  # (cx, cy) → Surface，按最近使用排序
+        self.obstacle_buckets = {}  # (cx, cy) → [世界像素矩形]
+        self.point_buckets = {}  # (cx, cy) → [(名称, 世界像素坐标)]
+        self.segment_buckets = {}  # (cx, cy) → [线段下标 i，即 points[i-1] → points[i]]
+        self.points = []
+        self.stats = {'rendered': 0, 'evicted': 0, 'invalidated': 0}
+        for ox, oy, ow, oh in obstacles:
+            rect = pygame.Rect(ox * cell, (size - oy - oh) * cell, ow * cell, oh * cell)
+            for key in self.chunks_in(rect):
+                self.obstacle_buckets.setdefault(key, []).append(rect)
+        for name, (x, y) in points.items():
+            pos = self.convert(x, y)
+            r = point_radius
+            for key in self.chunks_in(pygame.Rect(pos[0] - r, pos[1] - r, 2 * r + 1, 2 * r + 1)):
+                self.point_buckets.setdefault(key, []).append((name, pos))
+
+    def convert(self, x, y):
+        """逻辑坐标 → 世界像素坐标（与各阶段的 convert_coords 相同，点位于网格交点）"""
+        return x * self.cell, (self.size - y) * self.cell
+
+    def chunks_in(self, rect):
+        rect = pygame.Rect(rect).clip(pygame.Rect((0, 0), self.world_size))
+        if not rect.width or not rect.height:
+            return []
+        c = self.chunk_px
+        return [(cx, cy) for cy in range(rect.top // c, (rect.bottom - 1) // c + 1)
+                for cx in range(rect.left // c, (rect.right - 1) // c + 1)]
+
+    def segment_rect(self, i):
+        (ax, ay), (bx, by) = self.convert(*self.points[i - 1]), self.convert(*self.points[i])
+        pad = self.path_width
+        return pygame.Rect(min(ax, bx) - pad, min(ay, by) - pad, abs(ax - bx) + 2 * pad + 1, abs(ay - by) + 2 * pad + 1)
+
+    # ---------- 块缓存 ----------
+    def chunk(self, key):
+        surface = self.chunks.get(key)
+        if surface is None:
+            surface = self.chunks[key] = self.render_chunk(key)
+            while len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False)
+                self.stats['evicted'] += 1
+        else:
+            self.chunks.move_to_end(key)
+        return surface
+
+    def render_chunk(self, key):
+        cx, cy = key
+        c, cell = self.chunk_px, self.cell
+        ox, oy = cx * c, cy * c
+        surface = pygame.Surface((c, c))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()  # 与屏幕像素格式一致，blit 更快
+        surface.fill(self.colors['background'])
+        right = min(c, self.world_size[0] - 1 - ox)
+        bottom = min(c, self.world_size[1] - 1 - oy)
+        for i in range(0, c + 1, cell):
+            if i <= right:
+                pygame.draw.line(surface, self.colors['grid'], (i, 0), (i, bottom))
+            if i <= bottom:
+                pygame.draw.line(surface, self.colors['grid'], (0, i), (right, i))
+        for rect in self.obstacle_buckets.get(key, ()):
+            pygame.draw.rect(surface, self.colors['obstacle'], rect.move(-ox, -oy))
+        for i in self.segment_buckets.get(key, ()):
+            self.draw_segment(surface, i, ox, oy)
+        for name, (px, py) in self.point_buckets.get(key, ()):
+            pygame.draw.circle(surface, self.colors.get(name, (0, 0, 0)), (px - ox, py - oy), self.point_radius)
+        self.stats['rendered'] += 1
+        return surface
+
+    def draw_segment(self, surface, i, ox, oy):
+        (ax, ay), (bx, by) = self.convert(*self.points[i - 1]), self.convert(*self.points[i])
+        pygame.draw.line(surface, self.path_color, (ax - ox, ay - oy), (bx - ox, by - oy), self.path_width)
+
+    def invalidate(self, key=None):
+        """让一个块（缺省为全部）下次可见时重新绘制"""
+        if key is None:
+            self.stats['invalidated'] += len(self.chunks)
+            self.chunks.clear()
+        elif self.chunks.pop(key, None) is not None:
+            self.stats['invalidated'] += 1
+
+    # ---------- 路径 ----------
+    def sync(self, path):
+        """与 PathLayer.sync 相同：只补画新增的线段，撤回的部分让相关块失效"""
+        points = self.points
+        common = min(len(points), len(path))
+        for i in range(max(common - self.window, 0), common):
+            if points[i] != path[i]:
+                common = i
+                break
+        if common < len(points):
+            self.truncate(common)
+        for i in range(len(points), len(path)):
+            self.append(path[i])
+
+    def append(self, point):
+        self.points.append(tuple(point))
+        i = len(self.points) - 1
+        if i == 0:
+            return
+        for key in self.chunks_in(self.segment_rect(i)):
+            self.segment_buckets.setdefault(key, []).append(i)
+            surface = self.chunks.get(key)
+            if surface is not None:  # 未缓存的块下次绘制时会从分桶里画出这一段
+                self.draw_segment(surface, i, key[0] * self.chunk_px, key[1] * self.chunk_px)
+                # 线段盖住了关键点，补画一次保持与重新绘制的结果一致
+                for name, (px, py) in self.point_buckets.get(key, ()):
+                    pygame.draw.circle(surface, self.colors.get(name, (0, 0, 0)),
+                                       (px - key[0] * self.chunk_px, py - key[1] * self.chunk_px), self.point_radius)
+
+    def truncate(self, length):
+        """撤回到只剩前 length 个点"""
+        for i in range(len(self.points) - 1, max(length, 1) - 1, -1):
+            for key in self.chunks_in(self.segment_rect(i)):
+                bucket = self.segment_buckets[key]
+                if bucket and bucket[-1] == i:  # 线段按顺序追加，被撤回的总在末尾
+                    bucket.pop()
+                self.invalidate(key)
+        del self.points[length:]
+
+    def clear(self):
+        self.points = []
+        self.segment_buckets = {}
+        self.invalidate()
+
+    # ---------- 绘制 ----------
+    def draw(self, screen, camera, dest=(0, 0)):
+        """只贴视口覆盖的块，返回贴了多少块"""
+        view = camera.rect
+        clip = screen.get_clip()
+        screen.set_clip(pygame.Rect(dest, (camera.view_w, camera.view_h)))
+        screen.fill(self.colors['background'], screen.get_clip())
+        keys = self.chunks_in(view)
+        for key in keys:
+            screen.blit(self.chunk(key), (dest[0] + key[0] * self.chunk_px - view.x,
+                                          dest[1] + key[1] * self.chunk_px - view.y))
+        screen.set_clip(clip)
+        return len(keys)
+
+    def memory_bytes(self):
+        return sum(s.get_bytesize() * s.get_width() * s.get_height() for s in self.chunks.values())